@@ -0,0 +1,67 @@
+import logging
+import os
+import shutil
+
+
+class ArchiveMover:
+    """
+    打印成功后把文件移动到备份目录，并删除变空的源目录
+    每个目录剩余的文件数记在内存里，目录处理完后才判断一次是否删除，
+    不再每移动一个文件就 os.listdir 一次（N 个文件的目录从 O(N²) 变成 O(N)）
+    和原来一样只删除移走过文件的目录：本来就是空的目录、只有子目录的目录保留不动
+    """
+
+    def __init__(self, src_root, target_root):
+        self.src_root = src_root
+        self.target_root = target_root
+        self._remaining = {}
+        self._removed = set()
+        self._created = set()
+        # 移走过文件的目录
+        self._moved = set()
+
+    def begin_directory(self, src_dir, dirs, files):
+        """
+        登记一个目录（参数就是 os.walk 返回的 root, dirs, files）
+        和原来的判断一致：~$ 临时文件不算，子目录算
+        """
+        count = sum(1 for name in files if not name.startswith("~$"))
+        count += sum(1 for name in dirs if os.path.join(src_dir, name) not in self._removed)
+        self._remaining[src_dir] = count
+
+    def move(self, src_file):
+        rel_path = os.path.relpath(src_file, self.src_root)
+        dest_file = os.path.join(self.target_root, rel_path)
+        dest_dir = os.path.dirname(dest_file)
+        if dest_dir not in self._created:
+            os.makedirs(dest_dir, exist_ok=True)
+            self._created.add(dest_dir)
+        shutil.move(src_file, dest_file)
+        logging.info(f"📁 已移动文件: {dest_file}")
+
+        src_dir = os.path.dirname(src_file)
+        if src_dir in self._remaining:
+            self._remaining[src_dir] -= 1
+        self._moved.add(src_dir)
+        return dest_file
+
+    def finish_directory(self, src_dir):
+        """目录处理完后调用：移走过文件、而且已经没有剩余文件时删除（源目录本身不删除）"""
+        remaining = self._remaining.pop(src_dir, None)
+        moved = src_dir in self._moved
+        self._moved.discard(src_dir)
+        if src_dir == self.src_root or remaining is None or remaining > 0 or not moved:
+            return False
+        try:
+            os.rmdir(src_dir)
+            logging.info(f"🗑️ 删除空目录: {src_dir}")
+        except Exception as e:
+            logging.warning(f"⚠️ 删除目录失败: {src_dir} - {e}")
+            return False
+
+        self._removed.add(src_dir)
+        # 父目录已经登记过（自顶向下遍历）时，同步减少它的剩余数量
+        parent = os.path.dirname(src_dir)
+        if parent in self._remaining:
+            self._remaining[parent] -= 1
+        return True
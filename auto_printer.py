@@ -1,21 +1,36 @@
 import os
 import sys
-import time
+import asyncio
+import logging
+import configparser
 import win32api
 import win32print
-import win32com.client
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-import pythoncom
-
-# 获取监听目录（来自命令行参数）
-if len(sys.argv) < 2:
-    print("❌ 用法错误：请指定要监听的文件夹路径")
-    print("✅ 示例：python auto_printer.py \"C:\\ToPrint\"")
-    sys.exit(1)
-
-WATCH_FOLDER = sys.argv[1]
+from excel_session import get_excel_session, close_excel_session
+from watch_pipeline import WatchPipeline
+from watch_snapshot import format_catch_up
+from watch_roots import WatchRoot, WatchRoots, watch_roots_from_config
+from directory_poller import DirectoryPollingObserver
+from printer_catalog import PrinterCatalog, Win32PrinterBackend
+from print_daemon import PrintDaemon
+
+# 获取监听目录（来自命令行参数）；不指定目录时读取 config.ini 的 [watch:名称]，一个进程监听多个目录
+BASE_DIR = os.path.dirname(os.path.abspath(sys.argv[0]))
+CONFIG_PATH = os.path.join(BASE_DIR, "config.ini")
+ARGS = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+WATCH_FOLDER = ARGS[0] if ARGS else None
+DAEMON_MODE = "--daemon" in sys.argv[1:]
+# 网络共享（SMB）上 watchdog 的原生通知不可靠，改用轮询：只重新列出修改时间变了的目录
+POLL_MODE = "--poll" in sys.argv[1:]
+# 已处理文件的快照和程序放在一起，停机期间放进来的文件下次启动时补打
+SNAPSHOT_DB = os.path.join(BASE_DIR, "watch_snapshot.db")
+# 打印跟不上时排队的文件超出内存上限后写在这里，停止时没打印的也在这里，下次启动接着打印
+SPILL_DB = os.path.join(BASE_DIR, "watch_spill.db")
 PRINTER_NAME = win32print.GetDefaultPrinter()
+PRINTER_CATALOG = PrinterCatalog(Win32PrinterBackend())
+# 监听的目录和各自的规则（main 里设置）
+WATCH_ROOTS = None
 
 # # 获取打印机支持的纸张数量
 # try:
@@ -28,89 +43,207 @@ PRINTER_NAME = win32print.GetDefaultPrinter()
 # except Exception as e:
 #     print(f"获取纸张大小时出错: {e}")
 
-def print_pdf(file_path):
+def print_pdf(file_path, printer=None):
+    """返回是否成功交给打印程序；失败时返回 False，流水线不会把文件记为已处理"""
+    printer = printer or PRINTER_NAME
     print(f"🖨️ 正在打印 PDF 文件: {file_path}")
-    win32api.ShellExecute(
-        0,
-        "print",
-        file_path,
-        f'/d:"{PRINTER_NAME}"',
-        ".",
-        0
-    )
-
-def print_excel(file_path):
-    print(f"📊 正在打印 Excel 文件: {file_path}")
-    pythoncom.CoInitialize()  # 初始化当前线程的 COM 环境
-    excel = win32com.client.Dispatch("Excel.Application")
-    excel.Visible = False
-    workbook = None
     try:
-        workbook = excel.Workbooks.Open(file_path)
-
-        for sheet in workbook.Sheets:
-            # 设置打印纸张为 A4（枚举值 9），其他常见值见下方
-            sheet.PageSetup.PaperSize = 132  # A4
-            # 设置为缩放：1 页宽，1 页高（即适应一页打印）
-            sheet.PageSetup.Zoom = 75
-            sheet.PageSetup.FitToPagesWide = 1
-            sheet.PageSetup.FitToPagesTall = 1
+        win32api.ShellExecute(
+            0,
+            "print",
+            file_path,
+            f'/d:"{printer}"',
+            ".",
+            0
+        )
+    except Exception as e:
+        print(f"❌ PDF 打印失败: {e}")
+        return False
+    return True
 
-        workbook.PrintOut()
+def print_excel(file_path, printer=None):
+    """返回是否打印成功；失败时返回 False，流水线不会把文件记为已处理"""
+    print(f"📊 正在打印 Excel 文件: {file_path}")
+    # 监听线程里常驻一个 Excel 实例，工作簿用完即关，Excel 本身不退出
+    session = get_excel_session()
+    try:
+        with session.workbook(file_path, read_only=False) as workbook:
+            for sheet in workbook.Sheets:
+                # 设置打印纸张为 A4（枚举值 9），其他常见值见下方
+                sheet.PageSetup.PaperSize = 132  # A4
+                # 设置为缩放：1 页宽，1 页高（即适应一页打印）
+                sheet.PageSetup.Zoom = 75
+                sheet.PageSetup.FitToPagesWide = 1
+                sheet.PageSetup.FitToPagesTall = 1
+
+            if printer:
+                workbook.PrintOut(ActivePrinter=PRINTER_CATALOG.excel_name(printer))
+            else:
+                workbook.PrintOut()
         print("✅ Excel 打印成功")
+        return True
     except Exception as e:
         print(f"❌ Excel 打印失败: {e}")
-    finally:
-        # 关闭工作簿（忽略可能的错误）
-        try:
-            if workbook:
-                workbook.Close(False)
-        except Exception as e:
-            print(f"⚠️ 无法关闭工作簿: {e}")
-        # 关闭 Excel 实例
-        try:
-            excel.Quit()
-        except Exception as e:
-            print(f"⚠️ 无法退出 Excel 应用程序: {e}")
-        pythoncom.CoUninitialize()  # 清理 COM 环境
+        return False
+
+def printer_for(file_path):
+    """文件所属监听目录配置的打印机（完整名称），没有配置或找不到时返回 None（用默认打印机）"""
+    root = WATCH_ROOTS.find(file_path) if WATCH_ROOTS else None
+    if root is None or not root.printer:
+        return None
+    printer = PRINTER_CATALOG.find(root.printer)
+    if printer is None:
+        print(f"⚠️ 找不到打印机 {root.printer}（{root.name}），使用默认打印机")
+    return printer
+
+def print_file(file_path, kind):
+    """在打印线程池里执行，Excel 实例常驻在打印线程里；返回 False 表示打印失败"""
+    printer = printer_for(file_path)
+    if kind == "pdf":
+        return print_pdf(file_path, printer)
+    if kind == "excel":
+        return print_excel(file_path, printer)
+    return False
+
 
 class AutoPrintHandler(FileSystemEventHandler):
+    """所有监听目录共用一个处理器，按路径找到所属目录"""
+
+    def __init__(self, pipeline, roots):
+        super().__init__()
+        self.pipeline = pipeline
+        self.roots = roots
+
     def on_created(self, event):
         if event.is_directory:
             return
-        filepath = event.src_path.lower()
+        # 只把事件交给 asyncio 流水线，过滤、等待写入完成、打印都不在监听线程里做
+        self.pipeline.submit_threadsafe(event.src_path)
+
+    def on_deleted(self, event):
+        root = self.roots.find(event.src_path)
+        if root is not None:
+            root.snapshot.discard(event.src_path, directory=event.is_directory)
+
+    def on_moved(self, event):
+        # 已经处理过的文件改名 / 移动只更新快照；还没处理过的文件（例如下载完成后改名）按新文件处理
+        src_root = self.roots.find(event.src_path)
+        dest_root = self.roots.find(event.dest_path)
+        moved = False
+        if src_root is not None and src_root is dest_root:
+            moved = src_root.snapshot.move(event.src_path, event.dest_path, directory=event.is_directory)
+        elif src_root is not None:
+            # 移到了另一个监听目录或者监听范围以外
+            src_root.snapshot.discard(event.src_path, directory=event.is_directory)
+        if (not moved and not event.is_directory and dest_root is not None
+                and not dest_root.snapshot.known(event.dest_path)):
+            self.pipeline.submit_threadsafe(event.dest_path)
+
+
+def load_watch_roots():
+    """命令行指定了目录时只监听这一个目录，否则读取 config.ini 的 [watch:名称]；都没有时返回 None"""
+    if WATCH_FOLDER:
+        return WatchRoots([WatchRoot(WATCH_FOLDER, WATCH_FOLDER, poll=POLL_MODE)])
+    config = configparser.ConfigParser()
+    config.read(CONFIG_PATH, encoding="utf-8")
+    return watch_roots_from_config(config, default_poll=POLL_MODE)
+
+
+async def main(roots):
+    roots.open_snapshots(SNAPSHOT_DB)
+    # 所有目录共用一个打印线程池，各目录轮流打印
+    pipeline = WatchPipeline(print_file, accept=roots.accept, classify=roots.classify,
+                             print_concurrency=roots.workers, worker_exit=close_excel_session,
+                             on_done=roots.record, source=roots.source, source_weight=roots.weight,
+                             spill_path=SPILL_DB)
+    await pipeline.start()
+
+    event_handler = AutoPrintHandler(pipeline, roots)
+    observers = []
+    watch_points = roots.watch_points()
+    if watch_points:
+        observer = Observer()
+        for path, recursive in watch_points:
+            observer.schedule(event_handler, path=path, recursive=recursive)
+        observers.append(observer)
+    polled = [root for root in roots if root.poll]
+    if polled:
+        observer = DirectoryPollingObserver()
+        for root in polled:
+            observer.schedule(event_handler, path=root.path, recursive=root.recursive)
+        observers.append(observer)
+    for observer in observers:
+        # 轮询模式启动时要先列出整个目录树作为基准，放到线程里
+        await asyncio.to_thread(observer.start)
+
+    # 先开始监听再比对快照，比对期间新建的文件不会漏掉（重复提交会被流水线合并）
+    for root in roots:
+        new_files = await asyncio.to_thread(root.snapshot.catch_up)
+        stats = root.snapshot.last_catch_up
+        if stats["new"] or stats["baseline"] or len(roots) == 1:
+            print(format_catch_up(stats, root.path))
+        for path in new_files:
+            if not root.snapshot.known(path):
+                pipeline.submit(path)
 
-        # 跳过 Excel 临时文件
-        filename = os.path.basename(filepath)
-        if filename.startswith("~$"):
-            # print(f"⚠️ 忽略临时文件: {filename}")
-            return
+    try:
+        await pipeline.wait_closed()
+    finally:
+        # Ctrl+C：先停止监听，再把已经在队列里的文件打印完
+        print("🛑 正在停止，等待队列中的文件打印完成...")
+        for observer in observers:
+            observer.stop()
+        for observer in observers:
+            await asyncio.to_thread(observer.join)
+        await pipeline.shutdown()
+        roots.close()
+        print(f"✅ 已停止，本次共打印 {pipeline.printed} 个文件")
+
+
+def serve_daemon():
+    """常驻模式：不监听目录，等待 print_daemon.py 客户端提交任务；Excel 实例常驻在打印线程里"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    print(f"🖨️ 默认打印机：{PRINTER_NAME}")
+    daemon = PrintDaemon(print_file, worker_exit=close_excel_session)
+    try:
+        # Ctrl+C 时 serve_forever 会先把已经排队的任务打印完再退出
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
 
-        # 延迟确保文件写入完成
-        time.sleep(8)
 
-        if filepath.endswith(".pdf"):
-            print_pdf(event.src_path)
-        elif filepath.endswith(".xls") or filepath.endswith(".xlsx"):
-            print_excel(event.src_path)
+if __name__ == "__main__":
+    if DAEMON_MODE:
+        serve_daemon()
+        sys.exit(0)
 
+    try:
+        WATCH_ROOTS = load_watch_roots()
+    except (ValueError, KeyError) as e:
+        print(f"❌ config.ini 的监听目录配置有误：{e}")
+        sys.exit(1)
+    if WATCH_ROOTS is None:
+        print("❌ 用法错误：请指定要监听的文件夹路径")
+        print("✅ 示例：python auto_printer.py \"C:\\ToPrint\"")
+        print("✅ 多个目录：在 config.ini 里配置 [watch:名称]，直接运行 python auto_printer.py")
+        print("✅ 常驻服务：python auto_printer.py --daemon，再用 print_daemon.py submit 提交文件")
+        print("✅ 网络共享目录：python auto_printer.py \"\\\\server\\ToPrint\" --poll（轮询，不依赖文件系统通知）")
+        sys.exit(1)
 
-if __name__ == "__main__":
-    if not os.path.exists(WATCH_FOLDER):
-        print(f"❌ 目录不存在：{WATCH_FOLDER}")
+    missing = [root for root in WATCH_ROOTS if not os.path.exists(root.path)]
+    for root in missing:
+        print(f"❌ 目录不存在：{root.path}")
+    if missing:
         sys.exit(1)
 
-    print(f"📂 正在监听目录：{WATCH_FOLDER}")
+    if WATCH_FOLDER:
+        print(f"📂 正在监听目录：{WATCH_FOLDER}" + ("（轮询模式）" if POLL_MODE else ""))
+    else:
+        polled = sum(1 for root in WATCH_ROOTS if root.poll)
+        print(f"📂 正在监听 {len(WATCH_ROOTS)} 个目录（轮询 {polled} 个），打印线程 {WATCH_ROOTS.workers} 个")
     print(f"🖨️ 默认打印机：{PRINTER_NAME}")
 
-    event_handler = AutoPrintHandler()
-    observer = Observer()
-    observer.schedule(event_handler, path=WATCH_FOLDER, recursive=False)
-    observer.start()
-
     try:
-        while True:
-            time.sleep(1)
+        asyncio.run(main(WATCH_ROOTS))
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+        pass
@@ -1,9 +1,11 @@
 import os
 import sys
-import time
+import asyncio
 import subprocess
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from watch_pipeline import WatchPipeline
+from watch_snapshot import SnapshotIndex, format_catch_up
 
 # 获取监听目录（来自命令行参数）
 if len(sys.argv) < 2:
@@ -12,6 +14,9 @@ if len(sys.argv) < 2:
     sys.exit(1)
 
 WATCH_FOLDER = sys.argv[1]
+# 已处理文件的快照和程序放在一起，停机期间放进来的文件下次启动时补打
+SNAPSHOT_DB = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), "watch_snapshot.db")
+SPILL_DB = os.path.join(os.path.dirname(SNAPSHOT_DB), "watch_spill.db")
 
 def print_pdf(file_path):
     print(f"🖨️ 打印文件: {file_path}")
@@ -19,17 +24,61 @@ def print_pdf(file_path):
         # 使用系统的 lp 命令进行打印
         subprocess.run(["lp", file_path], check=True)
         print("✅ 打印成功")
-    except subprocess.CalledProcessError as e:
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
         print(f"❌ 打印失败: {e}")
+        return False
+
+def is_pdf(file_path):
+    return not os.path.basename(file_path).startswith("~$") and file_path.lower().endswith(".pdf")
 
 class PDFHandler(FileSystemEventHandler):
+    def __init__(self, pipeline, snapshot):
+        super().__init__()
+        self.pipeline = pipeline
+        self.snapshot = snapshot
+
     def on_created(self, event):
         if event.is_directory:
             return
-        filepath = event.src_path
-        if filepath.lower().endswith(".pdf"):
-            time.sleep(15)
-            print_pdf(filepath)
+        # 不再固定等待 15 秒，交给流水线，文件写入完成后立即打印
+        self.pipeline.submit_threadsafe(event.src_path)
+
+    def on_deleted(self, event):
+        self.snapshot.discard(event.src_path, directory=event.is_directory)
+
+    def on_moved(self, event):
+        # 已经处理过的文件改名 / 移动只更新快照；还没处理过的文件（例如下载完成后改名）按新文件处理
+        moved = self.snapshot.move(event.src_path, event.dest_path, directory=event.is_directory)
+        if not moved and not event.is_directory and not self.snapshot.known(event.dest_path):
+            self.pipeline.submit_threadsafe(event.dest_path)
+
+async def main():
+    snapshot = SnapshotIndex(WATCH_FOLDER, SNAPSHOT_DB)
+    pipeline = WatchPipeline(lambda file_path, kind: print_pdf(file_path), accept=is_pdf, on_done=snapshot.record,
+                             spill_path=SPILL_DB)
+    await pipeline.start()
+
+    event_handler = PDFHandler(pipeline, snapshot)
+    observer = Observer()
+    observer.schedule(event_handler, path=snapshot.root, recursive=True)
+    observer.start()
+
+    # 先开始监听再比对快照，比对期间新建的文件不会漏掉（重复提交会被流水线合并）
+    new_files = await asyncio.to_thread(snapshot.catch_up)
+    print(format_catch_up(snapshot.last_catch_up, snapshot.root))
+    for path in new_files:
+        if not snapshot.known(path):
+            pipeline.submit(path)
+
+    try:
+        await pipeline.wait_closed()
+    finally:
+        print("🛑 正在停止，等待队列中的文件打印完成...")
+        observer.stop()
+        await asyncio.to_thread(observer.join)
+        await pipeline.shutdown()
+        snapshot.close()
 
 if __name__ == "__main__":
     if not os.path.exists(WATCH_FOLDER):
@@ -39,14 +88,7 @@ if __name__ == "__main__":
     print(f"📂 正在监听目录：{WATCH_FOLDER}")
     print(f"🖨️ 使用系统默认打印机")
 
-    event_handler = PDFHandler()
-    observer = Observer()
-    observer.schedule(event_handler, path=WATCH_FOLDER, recursive=False)
-    observer.start()
-
     try:
-        while True:
-            time.sleep(1)
+        asyncio.run(main())
     except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+        pass
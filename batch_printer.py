@@ -2,26 +2,76 @@ import os
 import sys
 import time
 import shutil
-import win32api
-import win32print
-import pythoncom
-import win32com.client
 import logging
 from datetime import datetime
 import configparser
 import ctypes  # 顶部添加此模块
 import ctypes.wintypes
+from excel_session import get_excel_session, close_excel_session, configure_excel_session, DEFAULT_MAX_JOBS
+from excel_pipeline import ExcelPrintPipeline
+from spooler import SpoolerTracker, Win32SpoolerBackend, DEFAULT_HIGH_WATER
+from job_ledger import JobLedger, SUBMITTED, PRINTED, ARCHIVED, FAILED
+from dedupe_index import DedupeIndex, find_archive_folders
+from archive_mover import ArchiveMover
+from print_plan import build_plan, estimate_duration, save_plan, format_duration, group_by_paper
+from merge_print import build_directory_document, export_excel_pdf, reset_merge_dir
+from printer_catalog import PrinterCatalog, Win32PrinterBackend
+from stage_metrics import configure_metrics, close_metrics, stage, file_done
+from rate_scheduler import rate_scheduler_from_config
+from page_count import PageCounter
+from page_setup import PageSetupCache
+from print_daemon import PrintDaemon, DaemonClient, DONE
 
 # 省略 imports，与你一致
 
 # 全局变量
-DEFAULT_PRINTER = win32print.GetDefaultPrinter()
+# 默认打印机，main 里从 PRINTER_CATALOG 读取（pywin32 在用到时才导入，模块在 Linux 上也能导入）
+DEFAULT_PRINTER = None
 MONTHLY_PRINTER_NAME = ""
 DEFAULT_PAPER_SIZE = 132
 DEFAULT_PAPER_ZOOM = 75
 DELAY_SECONDS = 5
 ENABLE_WAIT_PROMPT = True
 WAIT_PROMPT_SLEEP = 30
+EXCEL_MAX_JOBS = DEFAULT_MAX_JOBS
+SPOOLER_TRACKING = True
+QUEUE_HIGH_WATER = DEFAULT_HIGH_WATER
+# 重复文件处理：skip = 跳过打印直接归档，flag = 记录警告但照常打印，print = 不检查
+DUPLICATE_ACTION = "flag"
+# 是否把一个目录的所有文件合并成一个打印任务
+MERGE_DIRECTORY = False
+# 是否记录每个文件各阶段的耗时（logs/metrics_*.jsonl）
+STAGE_METRICS = False
+# 按每台打印机每分钟页数限速（config.ini 的 [printer_rates]），None 表示使用固定打印间隔
+RATE_SCHEDULER = None
+# 打印前是否统计每个文件的页数（用于限速和预计耗时），配置了限速时自动开启
+COUNT_PAGES = False
+# 按纸张分组打印：none = 保持目录顺序，clinic = 每个目录内分组，run = 目录之间也衔接同一种纸
+PAPER_GROUPING = "none"
+# 是否把文件交给常驻打印服务（batch_printer.exe --daemon）打印，服务没有运行时在本进程打印
+PRINT_DAEMON = False
+# 每个文件最多等常驻打印服务多少秒，超时按打印失败处理，0 表示一直等
+DAEMON_JOB_TIMEOUT = 600
+# 常驻打印服务的客户端（main 里连接），None 表示在本进程打印
+PRINT_CLIENT = None
+DAEMON_NAME = "batch_printer"
+# 打印机、端口、纸张只枚举一次，之后直接查缓存
+PRINTER_CATALOG = PrinterCatalog(Win32PrinterBackend())
+# 页面设置批量写入，同一模板只算一次要改哪些属性
+PAGE_SETUP = PageSetupCache()
+
+
+class ShellExecutePdfBackend:
+    """用系统关联的 PDF 阅读器打印（ShellExecute "print"）"""
+
+    def print_file(self, printer, path):
+        import win32api
+        win32api.ShellExecute(0, "print", path, f'/d:"{printer}"', ".", 0)
+        return True
+
+
+# PDF 打印后端，压测时换成 fake_backends.FakePrinterBackend
+PDF_BACKEND = ShellExecutePdfBackend()
 
 
 def is_monthly_file(filename):
@@ -51,7 +101,9 @@ def read_config(config_path):
     config = configparser.ConfigParser()
     config.read(config_path, encoding="utf-8")
 
-    global MONTHLY_PRINTER_NAME, DEFAULT_PAPER_SIZE, DEFAULT_PAPER_ZOOM, DELAY_SECONDS, ENABLE_WAIT_PROMPT, WAIT_PROMPT_SLEEP
+    global MONTHLY_PRINTER_NAME, DEFAULT_PAPER_SIZE, DEFAULT_PAPER_ZOOM, DELAY_SECONDS, ENABLE_WAIT_PROMPT, WAIT_PROMPT_SLEEP, EXCEL_MAX_JOBS
+    global SPOOLER_TRACKING, QUEUE_HIGH_WATER, DUPLICATE_ACTION, MERGE_DIRECTORY, STAGE_METRICS, RATE_SCHEDULER
+    global COUNT_PAGES, PAPER_GROUPING, PRINT_DAEMON, DAEMON_JOB_TIMEOUT
 
     source = config.get("settings", "source_dir")
     # target = config.get("settings", "target_dir")
@@ -65,6 +117,18 @@ def read_config(config_path):
     DELAY_SECONDS = float(config.get("settings", "delay_seconds"))
     ENABLE_WAIT_PROMPT = config.getboolean("settings", "enable_wait_prompt", fallback=True)
     WAIT_PROMPT_SLEEP = float(config.get("settings", "wait_prompt_sleep"))
+    EXCEL_MAX_JOBS = config.getint("settings", "excel_max_jobs", fallback=DEFAULT_MAX_JOBS)
+    configure_excel_session(max_jobs=EXCEL_MAX_JOBS)
+    SPOOLER_TRACKING = config.getboolean("settings", "spooler_tracking", fallback=True)
+    QUEUE_HIGH_WATER = config.getint("settings", "queue_high_water", fallback=DEFAULT_HIGH_WATER)
+    DUPLICATE_ACTION = config.get("settings", "duplicate_action", fallback="flag").strip().lower()
+    MERGE_DIRECTORY = config.getboolean("settings", "merge_directory", fallback=False)
+    STAGE_METRICS = config.getboolean("settings", "stage_metrics", fallback=False)
+    RATE_SCHEDULER = rate_scheduler_from_config(config)
+    COUNT_PAGES = config.getboolean("settings", "count_pages", fallback=False) or RATE_SCHEDULER is not None
+    PAPER_GROUPING = config.get("settings", "paper_grouping", fallback="none").strip().lower()
+    PRINT_DAEMON = config.getboolean("settings", "print_daemon", fallback=False)
+    DAEMON_JOB_TIMEOUT = config.getfloat("settings", "daemon_job_timeout", fallback=600)
 
     logging.info(f"-------------------------")
     logging.info(f"⚙️ 配置文件信息:")
@@ -75,6 +139,16 @@ def read_config(config_path):
     logging.info(f"📄 针式打印机打印缩放比例: {DEFAULT_PAPER_ZOOM}")
     logging.info(f"📄 打印间隔: {DELAY_SECONDS}")
     logging.info(f"🔔 打印完目录是否弹窗并等待: {ENABLE_WAIT_PROMPT}")
+    logging.info(f"📊 Excel 实例重启前最多打印文件数: {EXCEL_MAX_JOBS}")
+    logging.info(f"🧾 跟踪打印队列: {SPOOLER_TRACKING} (队列上限: {QUEUE_HIGH_WATER})")
+    logging.info(f"🔁 重复文件处理方式: {DUPLICATE_ACTION}")
+    logging.info(f"📚 按目录合并打印: {MERGE_DIRECTORY}")
+    logging.info(f"⏱️ 记录阶段耗时: {STAGE_METRICS}")
+    logging.info(f"📄 统计页数: {COUNT_PAGES}")
+    logging.info(f"🧻 按纸张分组打印: {PAPER_GROUPING}")
+    logging.info(f"🛰️ 使用常驻打印服务: {PRINT_DAEMON} (每个文件最多等待: {DAEMON_JOB_TIMEOUT} 秒)")
+    if RATE_SCHEDULER:
+        logging.info(f"🚦 打印机限速(每分钟页数, 突发页数): {RATE_SCHEDULER.rates} 默认: {RATE_SCHEDULER.default}")
     logging.info(f"-------------------------")
 
     return source, target
@@ -87,8 +161,16 @@ def print_pdf(path, use_alt=False):
     logging.info(f"📄 打印 PDF: {path}")
     logging.info(f"🖨️ 打印机: {printer}")
 
+    if PRINT_CLIENT is not None:
+        success = print_via_daemon(path, use_alt)
+        if success is not None:
+            return success
+    return send_pdf(path, printer)
+
+
+def send_pdf(path, printer):
     try:
-        win32api.ShellExecute(0, "print", path, f'/d:"{printer}"', ".", 0)
+        PDF_BACKEND.print_file(printer, path)
         logging.info(f"✅ 打印成功 (PDF)")
         return True
     except Exception as e:
@@ -96,6 +178,67 @@ def print_pdf(path, use_alt=False):
         return False
 
 
+def prepare_excel(path, use_alt=False, export_path=None):
+    """准备阶段（在 Excel 流水线线程里执行）：打开工作簿并设置每个工作表的页面"""
+    # 复用当前线程常驻的 Excel 实例，不再每个文件都启动/退出 Excel
+    session = get_excel_session()
+    with stage("excel_start", path):
+        session.get_excel()
+    with stage("excel_open", path):
+        wb = session.open_workbook(path)
+    try:
+        with stage("page_setup", path):
+            _apply_page_setup(session.get_excel(), wb, path, use_alt)
+    except Exception:
+        session.finish_workbook(wb)
+        raise
+    return session, wb
+
+
+def _apply_page_setup(excel, wb, path, use_alt):
+    """按打印机类型设置每个工作表的页面；打印机不支持 132 列纸时 PAGE_SETUP 自动改用 A4"""
+    if use_alt:
+        targets = {
+            "PaperSize": 9,  # A4
+            "Zoom": False,
+            "FitToPagesWide": 1,
+            "FitToPagesTall": 1,
+            "Orientation": 1,
+        }
+    else:
+        targets = {
+            "PaperSize": DEFAULT_PAPER_SIZE,  # 132列纸
+            "Zoom": DEFAULT_PAPER_ZOOM,
+            "FitToPagesWide": False,
+            "FitToPagesTall": False,
+            "Orientation": 1,
+        }
+    PAGE_SETUP.apply(excel, wb, path, DEFAULT_PRINTER, targets)
+
+
+def print_prepared_excel(prepared, path, use_alt=False, export_path=None):
+    """打印阶段：工作簿已经准备好，直接打印；合并打印时改为导出成 PDF"""
+    # printer = MONTHLY_PRINTER_NAME if use_alt else DEFAULT_PRINTER
+    printer = DEFAULT_PRINTER
+    _, wb = prepared
+    if export_path:
+        with stage("excel_export", path):
+            export_excel_pdf(wb, export_path)
+    else:
+        with stage("printout", path):
+            wb.PrintOut(From=1, To=1, ActivePrinter=printer)
+    return True
+
+
+def release_excel(prepared):
+    session, wb = prepared
+    session.finish_workbook(wb)
+
+
+# 打印第 N 个 Excel 时提前准备第 N+1 个（main 里创建）
+EXCEL_PIPELINE = None
+
+
 def print_excel(path, use_alt=False):
     # printer = MONTHLY_PRINTER_NAME if use_alt else DEFAULT_PRINTER
     printer = DEFAULT_PRINTER
@@ -106,65 +249,218 @@ def print_excel(path, use_alt=False):
     logging.info(f"📊 打印 Excel: {path}")
     logging.info(f"🖨️ 打印机: {printer}")
 
-    pythoncom.CoInitialize()
-    excel = win32com.client.Dispatch("Excel.Application")
-    excel.Visible = False
-    excel.DisplayAlerts = False
+    if PRINT_CLIENT is not None:
+        success = print_via_daemon(path, use_alt)
+        if success is not None:
+            return success
 
     try:
-        wb = excel.Workbooks.Open(path, ReadOnly=True)
-        for sheet in wb.Sheets:
-            if use_alt:
-                sheet.PageSetup.PaperSize = 9  # A4
-                sheet.PageSetup.Zoom = False
-                sheet.PageSetup.FitToPagesWide = 1
-                sheet.PageSetup.FitToPagesTall = 1
-                sheet.PageSetup.Orientation = 1
-            else:
-                try:
-                    sheet.PageSetup.PaperSize = DEFAULT_PAPER_SIZE  # 132列纸
-                except:
-                    sheet.PageSetup.PaperSize = 9  # A4
-                sheet.PageSetup.Zoom = DEFAULT_PAPER_ZOOM
-                sheet.PageSetup.FitToPagesWide = False
-                sheet.PageSetup.FitToPagesTall = False
-                sheet.PageSetup.Orientation = 1
-
-        wb.PrintOut(From=1, To=1, ActivePrinter=printer)
+        EXCEL_PIPELINE.run(path, path, use_alt)
         logging.info(f"✅ 打印成功 (Excel)")
         return True
     except Exception as e:
         logging.error(f"❌ 打印失败 (Excel): {e}")
         return False
-    finally:
+
+
+def print_via_daemon(path, use_alt=False):
+    """
+    交给常驻打印服务打印并等待结果，返回是否打印成功
+    提交失败（服务已经停止）时返回 None，之后的文件都在本进程打印；已经提交后连接中断按打印失败处理，不重复打印
+    超过 DAEMON_JOB_TIMEOUT 秒没有结果时取消任务，按打印失败处理
+    """
+    global PRINT_CLIENT
+    try:
+        ids = PRINT_CLIENT.submit([path], {"monthly": use_alt})
+    except (OSError, ValueError) as e:
+        logging.warning(f"⚠️ 打印服务连接中断，改为本进程打印: {e}")
+        close_print_client()
+        return None
+    if not ids:
+        logging.error(f"❌ 打印服务不接受这个文件: {path}")
+        return False
+    try:
+        jobs = PRINT_CLIENT.wait(ids, timeout=DAEMON_JOB_TIMEOUT or None)
+        if jobs is None:
+            cancelled = PRINT_CLIENT.cancel(ids[0])
+    except (OSError, ValueError) as e:
+        logging.error(f"❌ 等待打印服务结果时连接中断: {e}")
+        close_print_client()
+        return False
+    if jobs is None:
+        if cancelled:
+            logging.error(f"❌ 打印服务 {DAEMON_JOB_TIMEOUT} 秒没有开始打印，已取消任务")
+        else:
+            logging.error(f"❌ 打印服务 {DAEMON_JOB_TIMEOUT} 秒没有打印完（任务已经开始，可能稍后还会打印出来）")
+        return False
+    job = jobs[ids[0]]
+    if job["state"] != DONE:
+        logging.error(f"❌ 打印服务打印失败: {job['error'] or job['state']}")
+        return False
+    return True
+
+
+def connect_print_client():
+    """配置了 print_daemon 时连接常驻打印服务，连不上时在本进程打印"""
+    global PRINT_CLIENT
+    if not PRINT_DAEMON:
+        return
+    try:
+        PRINT_CLIENT = DaemonClient(DAEMON_NAME)
+        logging.info("🛰️ 已连接常驻打印服务")
+    except OSError as e:
+        logging.warning(f"⚠️ 常驻打印服务没有运行（{e}），在本进程打印")
+
+
+def close_print_client():
+    global PRINT_CLIENT
+    if PRINT_CLIENT is not None:
         try:
-            wb.Close(False)
-        except:
+            PRINT_CLIENT.close()
+        except OSError:
             pass
+        PRINT_CLIENT = None
+
+
+def daemon_print(path, kind, monthly=False):
+    """常驻打印服务的打印线程：PDF 直接打印，Excel 在这个线程常驻的 Excel 实例里设置页面后打印"""
+    if kind == "pdf":
+        logging.info(f"📄 打印 PDF: {path}")
+        return send_pdf(path, DEFAULT_PRINTER)
+    logging.info(f"📊 打印 Excel: {path}")
+    try:
+        prepared = prepare_excel(path, monthly)
         try:
-            excel.Quit()
-        except:
-            pass
-        pythoncom.CoUninitialize()
+            print_prepared_excel(prepared, path, monthly)
+        finally:
+            release_excel(prepared)
+        logging.info(f"✅ 打印成功 (Excel)")
+        return True
+    except Exception as e:
+        logging.error(f"❌ 打印失败 (Excel): {e}")
+        return False
 
 
-def move_and_cleanup(src_file, src_root, target_root):
-    rel_path = os.path.relpath(src_file, src_root)
-    dest_file = os.path.join(target_root, rel_path)
-    os.makedirs(os.path.dirname(dest_file), exist_ok=True)
-    shutil.move(src_file, dest_file)
-    logging.info(f"📁 已移动文件: {dest_file}")
+def convert_excel(path, use_alt, pdf_path):
+    """合并打印时把 Excel 按打印时的页面设置转成 PDF"""
+    logging.info(f"📊 转换 Excel: {path}")
+    EXCEL_PIPELINE.run(pdf_path, path, use_alt, pdf_path)
+
+
+def check_before_print(full_path, ledger, mover, dedupe, archive_folder):
+    """
+    打印前检查：上次已打印但未归档的文件、设置为跳过的重复文件，直接归档
+    返回 (是否需要打印, 内容哈希)
+    """
+    status = ledger.status(full_path)
+    if status == PRINTED:
+        logging.info(f"⏭️ 上次已打印但未归档，直接归档: {full_path}")
+        mover.move(full_path)
+        ledger.mark(full_path, ARCHIVED)
+        return False, None
+    if status == SUBMITTED:
+        logging.warning(f"⚠️ 上次提交打印后中断，无法确认是否打印完成，重新打印: {full_path}")
+
+    content_hash = None
+    if dedupe:
+        duplicate, content_hash = dedupe.find_duplicate(full_path)
+        if duplicate and DUPLICATE_ACTION == "skip":
+            logging.info(f"⏭️ 重复文件，跳过打印直接归档: {full_path} (与 {duplicate} 相同)")
+            EXCEL_PIPELINE.discard(full_path)
+            dest_file = mover.move(full_path)
+            ledger.mark(full_path, ARCHIVED)
+            dedupe.add(dest_file, archive_folder, content_hash)
+            return False, None
+        if duplicate:
+            logging.warning(f"⚠️ 重复文件: {full_path} (与 {duplicate} 相同)，继续打印")
+    return True, content_hash
+
+
+def archive_printed(full_path, ledger, mover, dedupe, archive_folder, content_hash):
+    ledger.mark(full_path, PRINTED)
+    with stage("move", full_path):
+        dest_file = mover.move(full_path)
+    ledger.mark(full_path, ARCHIVED)
+    if dedupe:
+        dedupe.add(dest_file, archive_folder, content_hash)
+    file_done()
+
+
+def print_directory_merged(directory, index, ledger, mover, dedupe, archive_folder, tracker, merge_dir):
+    """
+    合并打印：把一个目录里要打印的文件按原来的顺序合并成一个 PDF，作为一个打印任务提交
+    合并的任务打印成功后，才归档目录里的每个源文件
+    """
+    root = directory["path"]
+    pending = []
+    for job in directory["files"]:
+        full_path = os.path.join(root, job["name"])
+        need_print, content_hash = check_before_print(full_path, ledger, mover, dedupe, archive_folder)
+        if need_print:
+            pending.append((full_path, job, content_hash))
+    if not pending:
+        return True
+
+    for full_path, _, _ in pending:
+        ledger.mark(full_path, SUBMITTED)
+
+    before = tracker.snapshot() if tracker else None
+    try:
+        merged_path, pages = build_directory_document(
+            [(full_path, job["kind"], job["monthly"]) for full_path, job, _ in pending],
+            merge_dir, f"{index:04d}_{directory['name']}", convert_excel)
+        admit_job(pages)
+        with stage("print_pdf", merged_path):
+            success = print_pdf(merged_path)
+    except Exception as e:
+        logging.error(f"❌ 合并打印失败: {root} - {e}")
+        success = False
+
+    if not success:
+        for full_path, _, _ in pending:
+            ledger.mark(full_path, FAILED)
+        return False
+
+    for full_path, _, content_hash in pending:
+        archive_printed(full_path, ledger, mover, dedupe, archive_folder, content_hash)
+    wait_for_printer(tracker, before)
+    return True
+
+
+def plan_page_count(counter):
+    """生成 build_plan 用的页数函数，Excel 的页面设置和 prepare_excel 一致"""
+    def page_count(path, kind, monthly):
+        if kind != "excel":
+            return counter.count(path)
+        if monthly:
+            pages = counter.count(path, paper_size=9, fit_to_page=True)
+        else:
+            pages = counter.count(path, paper_size=DEFAULT_PAPER_SIZE, zoom=DEFAULT_PAPER_ZOOM)
+        # Excel 只打印第一页（PrintOut From=1 To=1）
+        return min(pages, 1) if pages is not None else None
+    return page_count
+
+
+def admit_job(pages=1):
+    """提交打印前按打印机的每分钟页数限速，没有配置 [printer_rates] 时不等待"""
+    if RATE_SCHEDULER is None:
+        return
+    with stage("rate_wait"):
+        RATE_SCHEDULER.acquire(DEFAULT_PRINTER, pages)
 
-    src_dir = os.path.dirname(src_file)
 
-    # 删除空目录，根目录（源目录）不删除
-    if src_dir != src_root:
-        if not any(f for f in os.listdir(src_dir) if not f.startswith("~$")):
-            try:
-                os.rmdir(src_dir)
-                logging.info(f"🗑️ 删除空目录: {src_dir}")
-            except Exception as e:
-                logging.warning(f"⚠️ 删除目录失败: {src_dir} - {e}")
+def wait_for_printer(tracker, before):
+    """
+    文件提交后的等待：开启队列跟踪时，打印队列低于上限就放行下一个文件
+    配置了限速时在提交前等待（admit_job），这里不再固定等待
+    否则和以前一样固定等待 DELAY_SECONDS
+    """
+    with stage("printer_wait"):
+        if tracker is None:
+            if RATE_SCHEDULER is None:
+                time.sleep(DELAY_SECONDS)
+            return
+        tracker.track(before, DELAY_SECONDS)
 
 
 def show_message_box_with_timeout(text, caption, timeout_ms):
@@ -195,24 +491,53 @@ def show_message_box_with_timeout(text, caption, timeout_ms):
 
 
 def find_printer_name(target_name: str):
-    printers = win32print.EnumPrinters(win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS)
-    for printer in printers:
-        name = printer[2]
-        if target_name.lower() in name.lower():
-            handle = win32print.OpenPrinter(name)
-            info = win32print.GetPrinter(handle, 2)
-            port = info["pPortName"]
-            win32print.ClosePrinter(handle)
-            return f"{name} on {port}:"
-    return None
-
-
-def main():
+    return PRINTER_CATALOG.excel_name(target_name)
+
+
+def finish_run(ledger, dedupe):
+    # 已归档的记录不再需要，下次启动只读取没处理完的文件
+    ledger.prune()
+    ledger.close()
+    if dedupe:
+        dedupe.close()
+    EXCEL_PIPELINE.close()
+    close_print_client()
+    close_metrics()
+
+
+def serve_daemon(base_dir=None):
+    """
+    常驻模式（batch_printer.exe --daemon）：读取同一个 config.ini，Excel 实例和打印机信息一直保持热状态
+    config.ini 设置 print_daemon = true 后，batch_printer.exe 把文件交给这个服务打印，账本、查重、限速和归档仍在 batch_printer.exe 里
+    """
+    global DEFAULT_PRINTER
+    base_dir = base_dir or os.path.dirname(os.path.abspath(sys.argv[0]))
+    config_path = os.path.join(base_dir, "config.ini")
+    if not os.path.exists(config_path):
+        print(f"❌ 配置文件不存在: {config_path}")
+        return
+    setup_logging(os.path.join(base_dir, "logs"))
+    read_config(config_path)
+    if DEFAULT_PRINTER is None:
+        DEFAULT_PRINTER = PRINTER_CATALOG.default_printer()
+    logging.info(f"🖨️ 默认打印机：{DEFAULT_PRINTER}")
+    daemon = PrintDaemon(daemon_print, name=DAEMON_NAME, worker_exit=close_excel_session)
+    try:
+        # Ctrl+C 时 serve_forever 会先把已经排队的任务打印完再退出
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main(base_dir=None):
+    """base_dir 是 config.ini、日志和各数据库所在的目录，默认是程序所在目录"""
+    global EXCEL_PIPELINE, DEFAULT_PRINTER
+
     # printer = find_printer_name("A4print")
     # print(f"{printer}")
     # return
 
-    base_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
+    base_dir = base_dir or os.path.dirname(os.path.abspath(sys.argv[0]))
     config_path = os.path.join(base_dir, "config.ini")
     log_dir = os.path.join(base_dir, "logs")
 
@@ -223,38 +548,125 @@ def main():
     setup_logging(log_dir)
 
     source_root, target_root = read_config(config_path)
+    if DEFAULT_PRINTER is None:
+        DEFAULT_PRINTER = PRINTER_CATALOG.default_printer()
+    connect_print_client()
     logging.info(f"📂 监听目录: {source_root}")
     logging.info(f"📁 目标目录: {target_root}")
+    configure_metrics(log_dir, STAGE_METRICS)
+
+    tracker = None
+    if SPOOLER_TRACKING:
+        tracker = SpoolerTracker(Win32SpoolerBackend(DEFAULT_PRINTER), high_water=QUEUE_HIGH_WATER)
+
+    # 打印进度账本：崩溃重启后，已打印未归档的文件只归档，不重复打印
+    ledger = JobLedger(os.path.join(base_dir, "job_ledger.db"))
+    pending = len(ledger.pending())
+    if pending:
+        logging.info(f"🧾 上次运行有 {pending} 个文件未完成，继续处理")
+
+    # 已归档文件的内容索引，用来发现重复导出的文件
+    dedupe = None
+    if DUPLICATE_ACTION != "print":
+        dedupe = DedupeIndex(os.path.join(base_dir, "dedupe_index.db"))
+        dedupe.refresh(find_archive_folders(source_root))
+    archive_folder = os.path.abspath(target_root)
+
+    mover = ArchiveMover(source_root, target_root)
+
+    # Excel 双缓冲：打印当前 Excel 的同时，另一个线程 / Excel 实例提前打开并设置下一个
+    EXCEL_PIPELINE = ExcelPrintPipeline(prepare_excel, print_prepared_excel, release_excel,
+                                        worker_exit=close_excel_session)
+
+    # 打印前先扫描整个源目录，生成打印计划（顺序与原来 os.walk topdown=False 一致：从里往外）
+    # 页数按 (路径, 大小, 修改时间) 缓存，文件没变时重复运行不用重新读取
+    page_counter = PageCounter(os.path.join(base_dir, "page_count.db")) if COUNT_PAGES else None
+    plan = build_plan(source_root, topdown=False, page_count=plan_page_count(page_counter) if page_counter else None)
+    if page_counter:
+        page_counter.close()
+    if PAPER_GROUPING in ("clinic", "run"):
+        switches = group_by_paper(plan, PAPER_GROUPING)
+        logging.info(f"🧻 换纸次数: 原顺序 {switches['before']} 次, 分组后 {switches['after']} 次 "
+                     f"(减少 {switches['saved']} 次)")
+    if RATE_SCHEDULER:
+        # 限速时不再有固定打印间隔，耗时按页数和打印机速度估算
+        estimate_duration(plan, seconds_per_page=RATE_SCHEDULER.seconds_per_page(DEFAULT_PRINTER),
+                          seconds_per_clinic=WAIT_PROMPT_SLEEP if ENABLE_WAIT_PROMPT else 0)
+    else:
+        estimate_duration(plan, delay_seconds=DELAY_SECONDS,
+                          seconds_per_clinic=WAIT_PROMPT_SLEEP if ENABLE_WAIT_PROMPT else 0)
+    save_plan(plan, os.path.join(log_dir, datetime.now().strftime("plan_%Y-%m-%d_%H-%M-%S.json")))
+    totals = plan["totals"]
+    logging.info(f"🗂️ 打印计划: {len(plan['directories'])} 个目录, {totals['files']} 个文件 "
+                 f"(PDF {totals['pdf']}, Excel {totals['excel']}, 月结单 {totals['monthly']})")
+    if "pages" in totals:
+        logging.info(f"📄 预计打印 {totals['pages']} 页")
+    logging.info(f"⏱️ 预计耗时: {format_duration(plan['estimated_seconds'])} (扫描用时 {plan['scan_seconds']} 秒)")
+
+    merge_dir = os.path.join(base_dir, "merged")
+    if MERGE_DIRECTORY:
+        reset_merge_dir(merge_dir)
+
+    for dir_index, directory in enumerate(plan["directories"]):
+        root = directory["path"]
+        jobs = directory["files"]
+
+        mover.begin_directory(root, directory["dirs"], [job["name"] for job in jobs])
+        ledger.plan(os.path.join(root, job["name"]) for job in jobs)
+
+        if MERGE_DIRECTORY and jobs:
+            if not print_directory_merged(directory, dir_index, ledger, mover, dedupe, archive_folder,
+                                          tracker, merge_dir):
+                finish_run(ledger, dedupe)
+                sys.exit(1)
+            jobs = []
 
-    # 遍历根目录，topdown=False 从里往外层遍历
-    for root, _, files in os.walk(source_root, topdown=False):
-
-        for name in files:
-            if name.startswith("~$"):
-                continue
+        for index, job in enumerate(jobs):
+            name = job["name"]
             full_path = os.path.join(root, name)
-            is_monthly = is_monthly_file(name)
+            is_monthly = job["monthly"]
 
             # if is_monthly:
             #     logging.info(f"⏭️ 跳过月结单文件: {full_path}")
             #     continue  # ✅ 跳过打印
 
+            need_print, content_hash = check_before_print(full_path, ledger, mover, dedupe, archive_folder)
+            if not need_print:
+                continue
+
+            # 同一目录的下一个文件如果是 Excel，趁当前文件打印时提前准备（交给常驻服务打印时由服务准备）
+            if PRINT_CLIENT is None and index + 1 < len(jobs):
+                next_job = jobs[index + 1]
+                next_path = os.path.join(root, next_job["name"])
+                if next_job["kind"] == "excel" and ledger.status(next_path) != PRINTED:
+                    EXCEL_PIPELINE.prefetch(next_path, next_path, next_job["monthly"])
+
             success = False
+            admit_job(job.get("pages") or 1)
+            before = tracker.snapshot() if tracker else None
+            ledger.mark(full_path, SUBMITTED)
 
-            if name.lower().endswith(".pdf"):
-                success = print_pdf(full_path, use_alt=is_monthly)
-            elif name.lower().endswith((".xls", ".xlsx")):
-                success = print_excel(full_path, use_alt=is_monthly)
+            if job["kind"] == "pdf":
+                with stage("print_pdf", full_path):
+                    success = print_pdf(full_path, use_alt=is_monthly)
+            elif job["kind"] == "excel":
+                with stage("print_excel", full_path):
+                    success = print_excel(full_path, use_alt=is_monthly)
 
             if success:
-                move_and_cleanup(full_path, source_root, target_root)
+                archive_printed(full_path, ledger, mover, dedupe, archive_folder, content_hash)
             else:
+                ledger.mark(full_path, FAILED)
+                finish_run(ledger, dedupe)
                 sys.exit(1)
 
-            time.sleep(DELAY_SECONDS)
+            wait_for_printer(tracker, before)
 
-        # 如果诊所目录文件全部打印完后，提示用户等待30秒
-        if os.path.basename(root).isdigit():
+        # 目录里的文件全部归档后，一次性判断是否删除空目录（从里往外）
+        mover.finish_directory(root)
+
+        # 如果诊所目录文件全部打印完后，提示用户等待30秒（enable_wait_prompt = false 时不提示）
+        if ENABLE_WAIT_PROMPT and directory["name"].isdigit():
             msg = (
                 f"📁 当前诊所打印完成: {os.path.basename(root)}\n📢 将在 {WAIT_PROMPT_SLEEP} 秒后继续打印下一个诊所...\n"
                 "\n"
@@ -264,11 +676,12 @@ def main():
             logging.info(f"📢 将在 {WAIT_PROMPT_SLEEP} 秒后继续打印下一个诊所...")
 
             # 0x04 = MB_YESNO + MB_ICONQUESTION
-            response = show_message_box_with_timeout(
-                msg,
-                "📢 打印完成",
-                int(WAIT_PROMPT_SLEEP * 1000)  # 30秒
-            )
+            with stage("prompt", root):
+                response = show_message_box_with_timeout(
+                    msg,
+                    "📢 打印完成",
+                    int(WAIT_PROMPT_SLEEP * 1000)  # 30秒
+                )
 
             # if response == 6:  # IDYES
             #     logging.info(f"✅ 用户选择等待，等待 {WAIT_PROMPT_SLEEP} 秒...")
@@ -288,8 +701,12 @@ def main():
     # except Exception as e:
     #     logging.warning(f"⚠️ 无法删除源目录: {source_root} - {e}")
 
+    finish_run(ledger, dedupe)
     logging.info("✅ 所有文件打印完成")
 
 
 if __name__ == "__main__":
-    main()
+    if "--daemon" in sys.argv[1:]:
+        serve_daemon()
+    else:
+        main()
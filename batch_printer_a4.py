@@ -11,6 +11,13 @@ from datetime import datetime
 import configparser
 import ctypes  # 顶部添加此模块
 import ctypes.wintypes
+from excel_session import get_excel_session, close_excel_session, configure_excel_session, DEFAULT_MAX_JOBS
+from dispatcher import PrinterDispatcher
+from archive_mover import ArchiveMover
+from printer_catalog import PrinterCatalog, Win32PrinterBackend, INVALID_EXCEL_PORTS
+from rate_scheduler import rate_scheduler_from_config
+from page_count import PageCounter
+from page_setup import PageSetupCache
 
 # 省略 imports，与你一致
 
@@ -22,6 +29,15 @@ DEFAULT_PAPER_ZOOM = 75
 DELAY_SECONDS = 5
 ENABLE_WAIT_PROMPT = True
 WAIT_PROMPT_SLEEP = 30
+EXCEL_MAX_JOBS = DEFAULT_MAX_JOBS
+# 打印机、端口、纸张只枚举一次，之后直接查缓存
+PRINTER_CATALOG = PrinterCatalog(Win32PrinterBackend())
+# 页面设置批量写入，同一模板只算一次要改哪些属性
+PAGE_SETUP = PageSetupCache()
+# 按每台打印机每分钟页数限速（config.ini 的 [printer_rates]），None 表示使用固定打印间隔
+RATE_SCHEDULER = None
+# 限速时按页数扣令牌，页数按 (路径, 大小, 修改时间) 缓存（main 里创建）
+PAGE_COUNTER = None
 
 
 def is_monthly_file(filename):
@@ -51,7 +67,8 @@ def read_config(config_path):
     config = configparser.ConfigParser()
     config.read(config_path, encoding="utf-8")
 
-    global MONTHLY_PRINTER_NAME, DEFAULT_PAPER_SIZE, DEFAULT_PAPER_ZOOM, DELAY_SECONDS, ENABLE_WAIT_PROMPT, WAIT_PROMPT_SLEEP
+    global MONTHLY_PRINTER_NAME, DEFAULT_PAPER_SIZE, DEFAULT_PAPER_ZOOM, DELAY_SECONDS, ENABLE_WAIT_PROMPT, WAIT_PROMPT_SLEEP, EXCEL_MAX_JOBS
+    global RATE_SCHEDULER
 
     source = config.get("settings", "source_dir")
     target = config.get("settings", "target_dir")
@@ -68,6 +85,9 @@ def read_config(config_path):
     DELAY_SECONDS = float(config.get("settings", "delay_seconds"))
     ENABLE_WAIT_PROMPT = config.getboolean("settings", "enable_wait_prompt", fallback=True)
     WAIT_PROMPT_SLEEP = float(config.get("settings", "wait_prompt_sleep"))
+    EXCEL_MAX_JOBS = config.getint("settings", "excel_max_jobs", fallback=DEFAULT_MAX_JOBS)
+    configure_excel_session(max_jobs=EXCEL_MAX_JOBS)
+    RATE_SCHEDULER = rate_scheduler_from_config(config)
 
     logging.info(f"--------------------------------------------------")
     logging.info(f"⚙️ 配置文件信息:")
@@ -78,6 +98,9 @@ def read_config(config_path):
     logging.info(f"📄 针式打印机打印缩放比例: {DEFAULT_PAPER_ZOOM}")
     logging.info(f"📄 打印间隔: {DELAY_SECONDS}")
     logging.info(f"🔔 打印完目录是否弹窗并等待: {ENABLE_WAIT_PROMPT}")
+    logging.info(f"📊 Excel 实例重启前最多打印文件数: {EXCEL_MAX_JOBS}")
+    if RATE_SCHEDULER:
+        logging.info(f"🚦 打印机限速(每分钟页数, 突发页数): {RATE_SCHEDULER.rates} 默认: {RATE_SCHEDULER.default}")
     logging.info(f"--------------------------------------------------")
 
     return source, target
@@ -103,27 +126,22 @@ def get_excel_printer_name(target_name: str):
     查找指定打印机名对应的 Excel 可识别的打印机格式，例如 "A4Print on Ne01:"
     忽略掉如 PORTPROMPT:、NUL: 这样的无效端口
     """
-    printers = win32print.EnumPrinters(win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS)
-    for printer in printers:
-        name = printer[2]
-        if target_name.lower() in name.lower():
-            try:
-                handle = win32print.OpenPrinter(name)
-                info = win32print.GetPrinter(handle, 2)
-                port = info["pPortName"]
-                win32print.ClosePrinter(handle)
-
-                # Excel 不接受一些特殊端口
-                if port.upper() in ["PORTPROMPT:", "NUL:"]:
-                    logging.warning(f"⚠️ 打印机 '{name}' 的端口 '{port}' 不适用于 Excel 打印")
-                    return None
-
-                return f"{name} on {port}:"
-            except Exception as e:
-                logging.error(f"❌ 获取打印机端口失败: {name} - {e}")
-                return None
-    logging.error(f"❌ 未找到匹配的打印机: {target_name}")
-    return None
+    name = PRINTER_CATALOG.find(target_name)
+    if name is None:
+        logging.error(f"❌ 未找到匹配的打印机: {target_name}")
+        return None
+
+    port = PRINTER_CATALOG.port(name)
+    if port is None:
+        logging.error(f"❌ 获取打印机端口失败: {name}")
+        return None
+
+    # Excel 不接受一些特殊端口
+    if port.upper() in INVALID_EXCEL_PORTS:
+        logging.warning(f"⚠️ 打印机 '{name}' 的端口 '{port}' 不适用于 Excel 打印")
+        return None
+
+    return f"{name} on {port}:"
 
 
 def print_excel(path, use_alt=False):
@@ -137,33 +155,24 @@ def print_excel(path, use_alt=False):
     logging.info(f"📊 打印 Excel: {path}")
     logging.info(f"🖨️ 打印机: {excel_printer}")
 
-    pythoncom.CoInitialize()
-    excel = win32com.client.Dispatch("Excel.Application")
-    excel.Visible = False
-    excel.DisplayAlerts = False
+    # 复用当前线程常驻的 Excel 实例，不再每个文件都启动/退出 Excel
+    session = get_excel_session()
 
     try:
+        excel = session.get_excel()
         excel.ActivePrinter = excel_printer
-        wb = excel.Workbooks.Open(path, ReadOnly=True)
-
-        for sheet in wb.Sheets:
-            if use_alt:
-                # 月结单（用 A4 打印机）
-                sheet.PageSetup.PaperSize = 9  # A4
-                sheet.PageSetup.Zoom = False
-                sheet.PageSetup.FitToPagesWide = 1
-                sheet.PageSetup.FitToPagesTall = 1
-            else:
-                # 默认针式打印
-                try:
-                    sheet.PageSetup.PaperSize = DEFAULT_PAPER_SIZE  # 132列纸
-                except Exception:
-                    sheet.PageSetup.PaperSize = 9  # A4
-                sheet.PageSetup.Zoom = DEFAULT_PAPER_ZOOM
-                sheet.PageSetup.FitToPagesWide = False
-                sheet.PageSetup.FitToPagesTall = False
-
-        wb.PrintOut()
+
+        if use_alt:
+            # 月结单（用 A4 打印机）
+            targets = {"PaperSize": 9, "Zoom": False, "FitToPagesWide": 1, "FitToPagesTall": 1}  # A4
+        else:
+            # 默认针式打印，打印机不支持 132 列纸时 PAGE_SETUP 自动改用 A4
+            targets = {"PaperSize": DEFAULT_PAPER_SIZE, "Zoom": DEFAULT_PAPER_ZOOM,
+                       "FitToPagesWide": False, "FitToPagesTall": False}
+
+        with session.workbook(path) as wb:
+            PAGE_SETUP.apply(excel, wb, path, excel_printer, targets)
+            wb.PrintOut()
         logging.info(f"✅ 打印成功 (Excel)")
         return True
 
@@ -171,36 +180,33 @@ def print_excel(path, use_alt=False):
         logging.error(f"❌ 打印失败 (Excel): {e}")
         return False
 
-    finally:
-        try:
-            wb.Close(False)
-        except:
-            pass
-        try:
-            excel.Quit()
-        except:
-            pass
-        pythoncom.CoUninitialize()
-
-
-def move_and_cleanup(src_file, src_root, target_root):
-    rel_path = os.path.relpath(src_file, src_root)
-    dest_file = os.path.join(target_root, rel_path)
-    os.makedirs(os.path.dirname(dest_file), exist_ok=True)
-    shutil.move(src_file, dest_file)
-    logging.info(f"📁 已移动文件: {src_file}")
-
-    # 删除空目录
-    src_dir = os.path.dirname(src_file)
-    if not any(f for f in os.listdir(src_dir) if not f.startswith("~$")):
-        try:
-            os.rmdir(src_dir)
-            logging.info(f"🗑️ 删除空目录: {src_dir}")
-        except Exception as e:
-            logging.warning(f"⚠️ 删除目录失败: {src_dir} - {e}")
-
-    # 打印一个空行
-    logging.warning(f"")
+
+def job_pages(full_path, is_monthly):
+    """打印页数，Excel 按 print_excel 的页面设置估算（整个工作簿都打印）"""
+    if PAGE_COUNTER is None:
+        return None
+    if is_monthly:
+        return PAGE_COUNTER.count(full_path, paper_size=9, fit_to_page=True)
+    return PAGE_COUNTER.count(full_path, paper_size=DEFAULT_PAPER_SIZE, zoom=DEFAULT_PAPER_ZOOM)
+
+
+def print_job(printer, job):
+    """打印机工作线程里执行的单个任务，job = (完整路径, 文件名, 是否月结单)"""
+    full_path, name, is_monthly = job
+    success = False
+
+    # 每台打印机有自己的令牌桶，激光打印机不会被针式打印机的速度拖慢
+    if RATE_SCHEDULER:
+        RATE_SCHEDULER.acquire(printer, job_pages(full_path, is_monthly) or 1)
+
+    if name.lower().endswith(".pdf"):
+        success = print_pdf(full_path, use_alt=is_monthly)
+    elif name.lower().endswith((".xls", ".xlsx")):
+        success = print_excel(full_path, use_alt=is_monthly)
+
+    if not RATE_SCHEDULER:
+        time.sleep(DELAY_SECONDS)
+    return success
 
 
 def show_message_box_with_timeout(text, caption, timeout_ms):
@@ -231,16 +237,7 @@ def show_message_box_with_timeout(text, caption, timeout_ms):
 
 
 def find_printer_name(target_name: str):
-    printers = win32print.EnumPrinters(win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS)
-    for printer in printers:
-        name = printer[2]
-        if target_name.lower() in name.lower():
-            handle = win32print.OpenPrinter(name)
-            info = win32print.GetPrinter(handle, 2)
-            port = info["pPortName"]
-            win32print.ClosePrinter(handle)
-            return f"{name} on {port}:"
-    return None
+    return PRINTER_CATALOG.excel_name(target_name)
 
 
 def list_excel_printers():
@@ -252,6 +249,8 @@ def list_excel_printers():
 
 
 def main():
+    global PAGE_COUNTER
+
     # printer = find_printer_name("A4print")
     # print(f"{printer}")
     # return
@@ -268,14 +267,28 @@ def main():
         return
 
     setup_logging(log_dir)
+    # 打印机列表保存到磁盘，有效期内再次启动不用重新枚举
+    PRINTER_CATALOG.cache_path = os.path.join(base_dir, "printer_catalog.json")
 
     source_root, target_root = read_config(config_path)
     logging.info(f"📂 监听目录: {source_root}")
     logging.info(f"📁 目标目录: {target_root}")
 
-    for root, _, files in os.walk(source_root):
+    if RATE_SCHEDULER:
+        PAGE_COUNTER = PageCounter(os.path.join(base_dir, "page_count.db"))
+
+    # 每台打印机一个工作线程，A4 激光打印机和针式打印机同时打印
+    mover = ArchiveMover(source_root, target_root)
+    dispatcher = PrinterDispatcher(
+        print_job,
+        on_success=lambda job: mover.move(job[0]),
+        worker_exit=close_excel_session,
+    )
+
+    for root, dirs, files in os.walk(source_root):
 
         any_printed = False
+        mover.begin_directory(root, dirs, files)
 
         for name in files:
             if name.startswith("~$"):
@@ -287,20 +300,15 @@ def main():
             #     logging.info(f"⏭️ 跳过月结单文件: {full_path}")
             #     continue  # ✅ 跳过打印
 
-            success = False
-
-            if name.lower().endswith(".pdf"):
-                success = print_pdf(full_path, use_alt=is_monthly)
-            elif name.lower().endswith((".xls", ".xlsx")):
-                success = print_excel(full_path, use_alt=is_monthly)
+            printer = MONTHLY_PRINTER_NAME if is_monthly else DEFAULT_PRINTER
+            dispatcher.submit(printer, (full_path, name, is_monthly))
+            any_printed = True
 
-            time.sleep(DELAY_SECONDS)
-
-            if success:
-                move_and_cleanup(full_path, source_root, target_root)
-                any_printed = True
-            else:
-                sys.exit(1)
+        # 当前目录的文件全部打印并归档后，才继续下一个目录（保证目录之间的顺序和提示）
+        if not dispatcher.wait():
+            dispatcher.close()
+            sys.exit(1)
+        mover.finish_directory(root)
 
         if any_printed:
             msg = f"📁 当前目录打印完成: \n{root}\n\n📢 将在 {WAIT_PROMPT_SLEEP} 秒后继续打印下一个目录..."
@@ -320,6 +328,9 @@ def main():
             else:
                 logging.info("⏩ 用户选择跳过等待")
 
+    dispatcher.close()
+    if PAGE_COUNTER:
+        PAGE_COUNTER.close()
     logging.info("✅ 所有文件打印完成")
 
     try:
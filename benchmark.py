@@ -0,0 +1,908 @@
+"""
+性能测试，不需要真实打印机：
+    python benchmark.py            运行全部
+    python benchmark.py spooler    只运行指定项目
+    python benchmark.py batch --param clinics=50 --param xlsx_ratio=0.5 --output results.json
+        --param 修改测试参数（参数名就是 bench_* 函数的参数），--output 把结果保存成 JSON，方便不同版本之间对比
+        元组参数用逗号分隔，例如 --param pages=1,2,8 或 --param sizes=(400,150),(2480,930)
+"""
+import argparse
+import ast
+import inspect
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from archive_mover import ArchiveMover
+from directory_poller import DirectoryPoller, DirectoryPollingObserver
+from dispatcher import PrinterDispatcher
+from excel_pipeline import ExcelPrintPipeline
+from excel_session import ExcelSession
+from print_plan import build_plan, group_by_paper
+from printer_catalog import PrinterCatalog
+from page_setup import PageSetupCache
+from rate_scheduler import RateScheduler
+from fake_backends import (VirtualClock, SimulatedSpoolerBackend, FakePrinterBackend, FakeExcelBackend,
+                           FakePrinterEnumBackend, write_blank_pdf)
+from spooler import SpoolerTracker
+from watch_snapshot import SnapshotIndex
+from watch_roots import WatchRoot, WatchRoots
+from watch_pipeline import FairQueue, WatchPipeline
+
+
+def bench_spooler(files=100, pages=(1, 1, 2, 8), seconds_per_page=0.8, delay_seconds=4, high_water=2):
+    """固定 sleep(DELAY_SECONDS) 和跟踪打印队列两种节奏下，打完一批文件的总耗时（虚拟时间）"""
+    page_list = [pages[i % len(pages)] for i in range(files)]
+
+    # 旧逻辑：每个文件后固定等待
+    clock = VirtualClock()
+    backend = SimulatedSpoolerBackend(seconds_per_page, spool_delay=0.3, clock=clock)
+    for n in page_list:
+        backend.submit(pages=n)
+        clock.sleep(delay_seconds)
+    fixed_total = max(clock(), backend.finished_at())
+    fixed_peak = _peak_depth(backend)
+
+    # 新逻辑：按队列深度放行
+    clock = VirtualClock()
+    backend = SimulatedSpoolerBackend(seconds_per_page, spool_delay=0.3, clock=clock)
+    tracker = SpoolerTracker(backend, high_water=high_water, poll_interval=0.1, clock=clock, sleep=clock.sleep)
+    for n in page_list:
+        before = tracker.snapshot()
+        backend.submit(pages=n)
+        job_id = tracker.find_new_job(before, delay_seconds)
+        tracker.wait_for_slot(job_id)
+    tracked_total = max(clock(), backend.finished_at())
+    tracked_peak = _peak_depth(backend)
+
+    print(f"spooler: {files} 个文件, 每页 {seconds_per_page} 秒")
+    print(f"  固定延迟 {delay_seconds} 秒: 总耗时 {fixed_total:.1f} 秒, 队列峰值 {fixed_peak}")
+    print(f"  队列跟踪 上限 {high_water}: 总耗时 {tracked_total:.1f} 秒, 队列峰值 {tracked_peak}")
+    return {"fixed": fixed_total, "tracked": tracked_total}
+
+
+def _peak_depth(backend):
+    events = []
+    for _, appear, end in backend.jobs:
+        events.append((appear, 1))
+        events.append((end, -1))
+    depth = peak = 0
+    for _, delta in sorted(events, key=lambda e: (e[0], e[1])):
+        depth += delta
+        peak = max(peak, depth)
+    return peak
+
+
+def bench_dispatch(dirs=5, files_per_dir=10, monthly_every=2, laser=0.02, dot_matrix=0.02):
+    """月结单（A4 激光）和其他文件（针式）串行打印 vs 每台打印机一个线程并行打印"""
+    latencies = {"A4print": laser, "DotMatrix": dot_matrix}
+    jobs = []
+    for d in range(dirs):
+        for f in range(files_per_dir):
+            printer = "A4print" if f % monthly_every == 0 else "DotMatrix"
+            jobs.append((d, printer, f"clinic{d}/file{f}"))
+
+    backend = FakePrinterBackend(latencies)
+    start = time.perf_counter()
+    for _, printer, path in jobs:
+        backend.print_file(printer, path)
+    serial = time.perf_counter() - start
+
+    backend = FakePrinterBackend(latencies)
+    archived = []
+    dispatcher = PrinterDispatcher(lambda printer, path: backend.print_file(printer, path),
+                                   on_success=archived.append)
+    start = time.perf_counter()
+    for d in range(dirs):
+        for job_dir, printer, path in jobs:
+            if job_dir == d:
+                dispatcher.submit(printer, path)
+        dispatcher.wait()
+    parallel = time.perf_counter() - start
+    dispatcher.close()
+
+    assert len(archived) == len(jobs)
+    print(f"dispatch: {dirs} 个目录 x {files_per_dir} 个文件")
+    print(f"  串行: {serial:.2f} 秒")
+    print(f"  每台打印机并行: {parallel:.2f} 秒 (加速 {serial / parallel:.2f}x)")
+    return {"serial": serial, "parallel": parallel}
+
+
+def _wave_distort_loop(img, magnitude=5):
+    """handwriting.py 原来的逐像素实现，作为对照"""
+    import numpy as np
+    h, w = img.shape[:2]
+    distorted = np.zeros_like(img)
+    for i in range(h):
+        offset = int(magnitude * np.sin(2 * np.pi * i / 50))
+        for j in range(w):
+            if 0 <= j + offset < w:
+                distorted[i, j] = img[i, (j + offset) % w]
+    return distorted
+
+
+def bench_wave(sizes=((400, 150), (2480, 930)), seed=42):
+    """波浪扭曲：原来的 Python 双重循环 vs 预计算坐标映射 + 一次 remap（签名尺寸和 300dpi A4 宽度）"""
+    import random
+    import cv2
+    import numpy as np
+    from handwriting import distort_array, wave_distort
+
+    results = {}
+    for w, h in sizes:
+        rs = np.random.RandomState(seed)
+        img = rs.randint(0, 256, (h, w, 3), dtype=np.uint8)
+
+        start = time.perf_counter()
+        expected = _wave_distort_loop(img)
+        loop_time = time.perf_counter() - start
+
+        wave_distort(img)  # 预热坐标映射缓存
+        start = time.perf_counter()
+        actual = wave_distort(img)
+        remap_time = time.perf_counter() - start
+        assert np.array_equal(expected, actual), "向量化结果与原实现不一致"
+
+        # 完整流程（旋转 + 模糊 + 扭曲）在相同 seed 下与原实现逐像素一致
+        random.seed(seed)
+        angle = random.uniform(-5, 5)
+        M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1)
+        reference = _wave_distort_loop(cv2.GaussianBlur(
+            cv2.warpAffine(img, M, (w, h), borderValue=(255, 255, 255)), (3, 3), 0))
+        assert np.array_equal(reference, distort_array(img, seed)), "完整流程结果与原实现不一致"
+
+        print(f"wave: {w}x{h}  循环 {loop_time * 1000:.1f} ms, remap {remap_time * 1000:.2f} ms "
+              f"(加速 {loop_time / remap_time:.0f}x)，结果一致")
+        results[f"{w}x{h}"] = {"loop": loop_time, "remap": remap_time}
+    return results
+
+
+class SyscallCounter:
+    """统计 os 模块文件系统调用次数（listdir 同时统计读到的目录项数量）"""
+
+    NAMES = ("listdir", "scandir", "stat", "mkdir", "rmdir", "rename", "replace")
+
+    def __init__(self):
+        self.counts = {}
+        self.entries = 0
+        self._saved = {}
+
+    def __enter__(self):
+        for name in self.NAMES:
+            original = getattr(os, name)
+            self._saved[name] = original
+            setattr(os, name, self._wrap(name, original))
+        return self
+
+    def _wrap(self, name, original):
+        def wrapper(*args, **kwargs):
+            self.counts[name] = self.counts.get(name, 0) + 1
+            result = original(*args, **kwargs)
+            if name == "listdir":
+                self.entries += len(result)
+            return result
+        return wrapper
+
+    def __exit__(self, *exc):
+        for name, original in self._saved.items():
+            setattr(os, name, original)
+
+    def total(self):
+        return sum(self.counts.values())
+
+
+def make_tree(root, clinics, files_per_clinic, monthly_ratio=0.0, xlsx_ratio=0.0, size=64, real_pdf=False):
+    """生成模拟的诊所目录树：root/<诊所编号>/<文件>；real_pdf 时 PDF 是能被 pypdf 读取的一页空白文档"""
+    paths = []
+    for c in range(clinics):
+        clinic_dir = os.path.join(root, f"{1000 + c}")
+        os.makedirs(clinic_dir, exist_ok=True)
+        for f in range(files_per_clinic):
+            monthly = monthly_ratio and (f % max(1, round(1 / monthly_ratio)) == 0)
+            ext = ".xlsx" if xlsx_ratio and (f % max(1, round(1 / xlsx_ratio)) == 1) else ".pdf"
+            name = f"{'月结单_' if monthly else ''}{f:05d}{ext}"
+            path = os.path.join(clinic_dir, name)
+            if real_pdf and ext == ".pdf":
+                write_blank_pdf(path, path)
+                paths.append(path)
+                continue
+            with open(path, "wb") as fp:
+                # 每个文件内容都不同，避免被查重当成重复文件
+                fp.write(b"%PDF-1.4\n" + path.encode("utf-8") + b"\n" + b"0" * size)
+            paths.append(path)
+    return paths
+
+
+def _legacy_move_and_cleanup(src_file, src_root, target_root):
+    """batch_printer.py 原来的归档逻辑：每移动一个文件就 listdir 一次源目录"""
+    rel_path = os.path.relpath(src_file, src_root)
+    dest_file = os.path.join(target_root, rel_path)
+    os.makedirs(os.path.dirname(dest_file), exist_ok=True)
+    shutil.move(src_file, dest_file)
+    src_dir = os.path.dirname(src_file)
+    if src_dir != src_root:
+        if not any(f for f in os.listdir(src_dir) if not f.startswith("~$")):
+            os.rmdir(src_dir)
+
+
+def bench_archive(clinics=10, files_per_clinic=1000):
+    """归档移动：原来每个文件 listdir 一次 vs ArchiveMover 按目录一次性清理（统计系统调用）"""
+    logging.disable(logging.INFO)
+    results = {}
+    for label in ("legacy", "mover"):
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src")
+            dst = os.path.join(tmp, "dst")
+            make_tree(src, clinics, files_per_clinic)
+            mover = ArchiveMover(src, dst)
+
+            start = time.perf_counter()
+            with SyscallCounter() as counter:
+                for root, dirs, files in os.walk(src, topdown=False):
+                    mover.begin_directory(root, dirs, files)
+                    for name in files:
+                        path = os.path.join(root, name)
+                        if label == "legacy":
+                            _legacy_move_and_cleanup(path, src, dst)
+                        else:
+                            mover.move(path)
+                    if label == "mover":
+                        mover.finish_directory(root)
+            elapsed = time.perf_counter() - start
+            assert os.listdir(src) == []
+
+        results[label] = {"seconds": elapsed, "syscalls": counter.total(), "listdir_entries": counter.entries,
+                          "calls": dict(counter.counts)}
+    logging.disable(logging.NOTSET)
+
+    total = clinics * files_per_clinic
+    print(f"archive: {clinics} 个目录共 {total} 个文件")
+    for label, r in results.items():
+        print(f"  {label:6s}: {r['seconds']:.2f} 秒, 系统调用 {r['syscalls']}, listdir 读取目录项 {r['listdir_entries']}")
+    return results
+
+
+def bench_plan(clinics=100, files_per_clinic=500):
+    """打印前扫描：build_plan 生成完整计划的耗时，并确认顺序与 os.walk(topdown=False) 一致"""
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src")
+        make_tree(src, clinics, files_per_clinic, monthly_ratio=0.1, xlsx_ratio=0.3, size=0)
+
+        start = time.perf_counter()
+        walked = [(root, sorted(dirs), [n for n in files if not n.startswith("~$")])
+                  for root, dirs, files in os.walk(src, topdown=False)]
+        walk_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        plan = build_plan(src)
+        plan_time = time.perf_counter() - start
+
+        planned = [(d["path"], sorted(d["dirs"]), [f["name"] for f in d["files"]]) for d in plan["directories"]]
+        assert planned == walked, "计划顺序与 os.walk 不一致"
+
+    print(f"plan: {plan['totals']['files']} 个文件, os.walk {walk_time:.3f} 秒, build_plan {plan_time:.3f} 秒 (含分类和大小)")
+    return {"files": plan["totals"]["files"], "walk": walk_time, "plan": plan_time}
+
+
+def bench_excel_pipeline(files=20, open_delay=0.05, print_delay=0.05):
+    """Excel 打印：准备（打开 + PageSetup）和打印串行执行 vs 双缓冲流水线"""
+    logging.disable(logging.INFO)
+    backend = FakeExcelBackend(sheet_count=3, open_delay=open_delay, print_delay=print_delay)
+    paths = [f"book{i}.xlsx" for i in range(files)]
+
+    session = ExcelSession(backend)
+    start = time.perf_counter()
+    for path in paths:
+        with session.workbook(path) as wb:
+            for sheet in wb.Sheets:
+                sheet.PageSetup.Zoom = 75
+            wb.PrintOut()
+    serial = time.perf_counter() - start
+    session.close()
+
+    local = threading.local()
+
+    def prepare(path):
+        if not hasattr(local, "session"):
+            local.session = ExcelSession(backend)
+        wb = local.session.open_workbook(path)
+        for sheet in wb.Sheets:
+            sheet.PageSetup.Zoom = 75
+        return local.session, wb
+
+    def release(prepared):
+        prepared[0].finish_workbook(prepared[1])
+
+    pipeline = ExcelPrintPipeline(prepare, lambda prepared, path: prepared[1].PrintOut() or True, release)
+    start = time.perf_counter()
+    for i, path in enumerate(paths):
+        if i + 1 < len(paths):
+            pipeline.prefetch(paths[i + 1], paths[i + 1])
+        pipeline.run(path, path)
+    pipelined = time.perf_counter() - start
+    pipeline.close()
+    logging.disable(logging.NOTSET)
+
+    print(f"excel_pipeline: {files} 个工作簿, 准备 {open_delay} 秒 + 打印 {print_delay} 秒")
+    print(f"  串行: {serial:.2f} 秒 (每个 {serial / files * 1000:.0f} ms)")
+    print(f"  双缓冲: {pipelined:.2f} 秒 (每个 {pipelined / files * 1000:.0f} ms)")
+    return {"serial": serial, "pipelined": pipelined}
+
+
+def bench_catalog(printers=30, lookups=2000):
+    """查找月结单打印机：每次都枚举全部打印机 vs PrinterCatalog 缓存（统计枚举次数）"""
+    backend = FakePrinterEnumBackend({f"Printer-{i:02d}": (f"USB{i:03d}", []) for i in range(printers)})
+    target = f"printer-{printers - 1:02d}"
+
+    # 旧逻辑：每个文件都 EnumPrinters 一遍，逐个比较名称
+    start = time.perf_counter()
+    for _ in range(lookups):
+        for name, port in backend.list_printers():
+            if target in name.lower():
+                result = f"{name} on {port}:"
+                break
+    legacy = time.perf_counter() - start
+    legacy_calls = backend.list_calls
+
+    backend.list_calls = 0
+    catalog = PrinterCatalog(backend)
+    start = time.perf_counter()
+    for _ in range(lookups):
+        assert catalog.excel_name(target) == result
+    cached = time.perf_counter() - start
+
+    print(f"catalog: {printers} 台打印机, 查找 {lookups} 次")
+    print(f"  每次枚举: {legacy * 1000:.1f} ms, 枚举 {legacy_calls} 次")
+    print(f"  目录缓存: {cached * 1000:.1f} ms, 枚举 {backend.list_calls} 次")
+    return {"legacy": legacy, "cached": cached, "legacy_calls": legacy_calls, "cached_calls": backend.list_calls}
+
+
+def bench_rate(files=100, pages=(1, 1, 2, 8), delay_seconds=4, pages_per_minute=30, burst=4):
+    """打印节奏（虚拟时间）：每个文件固定等待 delay_seconds vs 按每分钟页数的令牌桶，统计总耗时和最大突发页数"""
+    page_list = [pages[i % len(pages)] for i in range(files)]
+    fixed_total = files * delay_seconds
+
+    clock = VirtualClock()
+    scheduler = RateScheduler({"epson": (pages_per_minute, burst)}, clock=clock, sleep=clock.sleep)
+    for n in page_list:
+        scheduler.acquire("EPSON LQ-630K", n)
+    # 最后一个任务的页数也要打完
+    bucket_total = clock() + page_list[-1] * 60 / pages_per_minute
+    # 打印机恒速出纸时，按固定间隔提交会积压多少页
+    backlog = max(0.0, sum(page_list) * 60 / pages_per_minute - fixed_total)
+
+    print(f"rate: {files} 个文件共 {sum(page_list)} 页, 打印机每分钟 {pages_per_minute} 页")
+    print(f"  固定间隔 {delay_seconds} 秒: 提交用时 {fixed_total:.0f} 秒, 打印机仍需 {backlog:.0f} 秒打完积压")
+    print(f"  令牌桶 (突发 {burst} 页): {bucket_total:.0f} 秒, 放行 {len(scheduler.decisions)} 次")
+    return {"fixed": fixed_total, "fixed_backlog": backlog, "bucket": bucket_total}
+
+
+def bench_paper(clinics=50, files_per_clinic=40, monthly_ratio=0.25):
+    """换纸次数：原来的目录顺序 vs 每个目录内按纸张分组 vs 目录之间也衔接同一种纸"""
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src")
+        make_tree(src, clinics, files_per_clinic, monthly_ratio=monthly_ratio, xlsx_ratio=0.3, size=0)
+        results = {}
+        for scope in ("clinic", "run"):
+            plan = build_plan(src)
+            start = time.perf_counter()
+            results[scope] = group_by_paper(plan, scope)
+            results[scope]["seconds"] = time.perf_counter() - start
+
+    print(f"paper: {clinics} 个目录 x {files_per_clinic} 个文件, 月结单比例 {monthly_ratio}")
+    print(f"  原顺序换纸 {results['clinic']['before']} 次")
+    for scope, r in results.items():
+        print(f"  {scope:6s}: 换纸 {r['after']} 次 (减少 {r['saved']} 次), 排序用时 {r['seconds'] * 1000:.1f} ms")
+    return results
+
+
+def bench_page_setup(files=200, sheets=3, paper_size=132, zoom=75, monthly_every=4, unsupported=True):
+    """页面设置：每个工作表逐个写属性（132 列纸靠异常回退 A4）vs PageSetupCache 批量写，统计 COM 读写和驱动调用次数"""
+    unsupported_papers = {paper_size} if unsupported else ()
+    monthly = {"PaperSize": 9, "Zoom": False, "FitToPagesWide": 1, "FitToPagesTall": 1, "Orientation": 1}
+    default = {"PaperSize": paper_size, "Zoom": zoom, "FitToPagesWide": False, "FitToPagesTall": False, "Orientation": 1}
+    jobs = [(f"file{i}.xlsx", i % monthly_every == 0) for i in range(files)]
+
+    # 旧逻辑：和原来的 _apply_page_setup 一样，每个工作表每个属性都写一次
+    app = FakeExcelBackend(sheets, unsupported_papers=unsupported_papers).launch()
+    start = time.perf_counter()
+    for path, is_monthly in jobs:
+        wb = app.Workbooks.Open(path)
+        for sheet in wb.Sheets:
+            targets = monthly if is_monthly else default
+            for name, value in targets.items():
+                try:
+                    setattr(sheet.PageSetup, name, value)
+                except RuntimeError:
+                    sheet.PageSetup.PaperSize = 9
+        wb.Close()
+    legacy_seconds = time.perf_counter() - start
+    legacy = {"com_reads": app.com_reads, "com_writes": app.com_writes, "driver_calls": app.driver_calls}
+
+    # 假工作簿都来自同一个模板
+    app = FakeExcelBackend(sheets, unsupported_papers=unsupported_papers).launch()
+    cache = PageSetupCache(fingerprint=lambda path: "template")
+    start = time.perf_counter()
+    for path, is_monthly in jobs:
+        wb = app.Workbooks.Open(path)
+        cache.apply(app, wb, path, "EPSON LQ-630K", monthly if is_monthly else default)
+        wb.Close()
+    cached_seconds = time.perf_counter() - start
+    cached = {"com_reads": app.com_reads, "com_writes": app.com_writes, "driver_calls": app.driver_calls,
+              "template_hits": cache.template_hits}
+
+    print(f"page_setup: {files} 个工作簿 x {sheets} 个工作表, 纸张 {paper_size}{' (打印机不支持)' if unsupported else ''}")
+    print(f"  逐个写入: 读 {legacy['com_reads']} 次, 写 {legacy['com_writes']} 次, 驱动调用 {legacy['driver_calls']} 次, "
+          f"{legacy_seconds * 1000:.1f} ms")
+    print(f"  批量缓存: 读 {cached['com_reads']} 次, 写 {cached['com_writes']} 次, 驱动调用 {cached['driver_calls']} 次, "
+          f"{cached_seconds * 1000:.1f} ms, 模板命中 {cached['template_hits']} 次")
+    return {"legacy": legacy, "cached": cached}
+
+
+def bench_snapshot(files=100000, dirs=100, new_files=50):
+    """监听目录启动比对：files 个文件的目录树，停机期间新增 new_files 个文件、改名和删除各一个"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "watch")
+        db_path = os.path.join(tmp, "watch_snapshot.db")
+        per_dir = max(1, files // dirs)
+        for d in range(dirs):
+            os.makedirs(os.path.join(root, f"clinic{d:03d}"))
+            for i in range(per_dir):
+                open(os.path.join(root, f"clinic{d:03d}", f"{i:05d}.pdf"), "wb").close()
+
+        start = time.perf_counter()
+        snapshot = SnapshotIndex(root, db_path)
+        snapshot.catch_up()
+        snapshot.close()
+        baseline = time.perf_counter() - start
+
+        # 目录修改时间要早于 DIR_MTIME_MARGIN_NS 才会被信任，把整棵树的时间往前调
+        old = time.time() - 3600
+        for d in range(dirs):
+            os.utime(os.path.join(root, f"clinic{d:03d}"), (old, old))
+        snapshot = SnapshotIndex(root, db_path)
+        snapshot.catch_up()
+        snapshot.close()
+
+        # 停机期间的变化
+        for i in range(new_files):
+            open(os.path.join(root, f"clinic{i % dirs:03d}", f"new{i}.pdf"), "wb").close()
+        os.rename(os.path.join(root, "clinic000", "00000.pdf"), os.path.join(root, "clinic000", "renamed.pdf"))
+        os.remove(os.path.join(root, "clinic001", "00000.pdf"))
+
+        start = time.perf_counter()
+        snapshot = SnapshotIndex(root, db_path)
+        loaded = time.perf_counter() - start
+        found = snapshot.catch_up()
+        total = time.perf_counter() - start
+        stats = snapshot.last_catch_up
+        snapshot.close()
+
+    assert len(found) == new_files and stats["moved"] == 1 and stats["removed"] == 1
+    print(f"snapshot: {dirs} 个目录共 {dirs * per_dir} 个文件")
+    print(f"  第一次建立快照: {baseline:.2f} 秒")
+    print(f"  启动比对: {total:.3f} 秒 (读取快照 {loaded:.3f} 秒), 新文件 {stats['new']} 个, "
+          f"移动 {stats['moved']} 个, 删除 {stats['removed']} 个")
+    return {"baseline": baseline, "load": loaded, "catch_up": total, "stats": stats}
+
+
+def _full_poll(root):
+    """watchdog PollingObserver 的做法：每次轮询列出所有目录并 stat 每个文件，返回 stat 次数"""
+    stats = 0
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                os.lstat(entry.path)
+                stats += 1
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+    return stats
+
+
+def bench_polling(dirs=2000, files_per_dir=20, drops=20, stat_budget=1000, min_interval=0.5, max_interval=10.0,
+                  idle_seconds=60, seed=7):
+    """
+    网络共享轮询：每次轮询的 IO（stat + 列目录次数）和 CPU，以及新文件的发现延迟（虚拟时间）
+    每放一个新文件前先空闲 idle_seconds，让轮询间隔放慢到最长
+    """
+    import random
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "share")
+        for d in range(dirs):
+            path = os.path.join(root, f"clinic{d // 100:02d}", f"{d:04d}")
+            os.makedirs(path)
+            for i in range(files_per_dir):
+                open(os.path.join(path, f"{i:03d}.pdf"), "wb").close()
+
+        start = time.perf_counter()
+        cpu = time.process_time()
+        full_stats = _full_poll(root)
+        full_seconds = time.perf_counter() - start
+        full_cpu = time.process_time() - cpu
+
+        clock = VirtualClock()
+        found = []
+        poller = DirectoryPoller(root, lambda kind, path, dest, is_dir: found.append(path), stat_budget=stat_budget,
+                                 min_interval=min_interval, max_interval=max_interval, clock=clock)
+        baseline_io = poller.baseline()
+
+        ticks = []
+        latencies = []
+        for n in range(drops):
+            # 空闲一段时间
+            idle_until = clock() + idle_seconds
+            while clock() < idle_until:
+                clock.sleep(poller.interval)
+                poller.tick()
+                ticks.append(poller.last_tick)
+            # 放一个新文件，距离下一次轮询还有 phase 秒（下一次轮询的时刻是随机的）
+            d = rng.randrange(dirs)
+            target = os.path.join(root, f"clinic{d // 100:02d}", f"{d:04d}", f"new{n}.pdf")
+            open(target, "wb").close()
+            latency = rng.random() * poller.interval
+            clock.sleep(latency)
+            while True:
+                poller.tick()
+                ticks.append(poller.last_tick)
+                if target in found:
+                    break
+                clock.sleep(poller.interval)
+                latency += poller.interval
+            latencies.append(latency)
+
+    idle_ticks = [t for t in ticks if not t["events"]]
+    io_per_tick = sum(t["io"] for t in idle_ticks) / len(idle_ticks)
+    cpu_per_tick = sum(t["cpu_seconds"] for t in idle_ticks) / len(idle_ticks)
+    latencies.sort()
+    print(f"polling: {dirs} 个目录 x {files_per_dir} 个文件, 每次最多 {stat_budget} 次 IO")
+    print(f"  全部 stat: 每次轮询 {full_stats} 次 stat, {full_seconds * 1000:.1f} ms (CPU {full_cpu * 1000:.1f} ms)")
+    print(f"  目录修改时间: 启动 {baseline_io} 次 IO, 空闲时每次轮询 {io_per_tick:.0f} 次 IO, CPU {cpu_per_tick * 1000:.2f} ms")
+    print(f"  发现延迟 (空闲 {idle_seconds} 秒后): 平均 {sum(latencies) / len(latencies):.2f} 秒, "
+          f"最大 {latencies[-1]:.2f} 秒 (轮询间隔 {min_interval}~{max_interval} 秒)")
+    return {
+        "full_stats": full_stats, "full_seconds": full_seconds, "full_cpu": full_cpu,
+        "baseline_io": baseline_io, "io_per_tick": io_per_tick, "cpu_per_tick": cpu_per_tick,
+        "latency_mean": sum(latencies) / len(latencies), "latency_max": latencies[-1],
+    }
+
+
+def bench_roots(counts=(10, 100, 500), files_per_root=5, flood=200, others=20):
+    """
+    多目录监听：目录数增加时线程数和每个目录占用的内存（快照 + 轮询索引），
+    以及一个目录一次放进 flood 个文件时，其他 others 个目录的文件要排在第几个打印（先进先出 vs 轮流）
+    """
+    import asyncio
+    import tracemalloc
+
+    scale = []
+    for count in counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i in range(count):
+                path = os.path.join(tmp, "drop", f"clinic{i:04d}")
+                os.makedirs(path)
+                for j in range(files_per_root):
+                    open(os.path.join(path, f"{j}.pdf"), "wb").close()
+                paths.append(path)
+
+            threads = threading.active_count()
+            tracemalloc.start()
+            roots = WatchRoots([WatchRoot(os.path.basename(p), p, poll=True) for p in paths])
+            roots.open_snapshots(os.path.join(tmp, "watch_snapshot.db"))
+            for root in roots:
+                root.snapshot.catch_up()
+            observer = DirectoryPollingObserver()
+            for root in roots:
+                observer.schedule(None, path=root.path, recursive=root.recursive)
+            observer.start()
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            extra_threads = threading.active_count() - threads
+            observer.stop()
+            observer.join()
+            roots.close()
+        scale.append({"roots": count, "threads": extra_threads, "bytes_per_root": memory // count})
+
+    async def order(queue):
+        for i in range(flood):
+            queue.put_nowait(("flood", f"flood/{i}.pdf"))
+        for i in range(others):
+            queue.put_nowait((f"clinic{i}", f"clinic{i}/0.pdf"))
+        result = [(await queue.get())[0] for _ in range(flood + others)]
+        # 其他目录最后一个文件的打印顺序（从 1 开始）
+        return max(i for i, source in enumerate(result) if source != "flood") + 1
+
+    fifo = asyncio.run(order(asyncio.Queue()))
+    fair = asyncio.run(order(FairQueue(key=lambda item: item[0])))
+
+    print(f"roots: 每个目录 {files_per_root} 个文件，轮询模式")
+    for item in scale:
+        print(f"  {item['roots']:4d} 个目录: 新增线程 {item['threads']} 个, 每个目录 {item['bytes_per_root'] / 1024:.1f} KB")
+    print(f"  一个目录放进 {flood} 个文件后其他 {others} 个目录各放 1 个: "
+          f"先进先出第 {fifo} 个才打印完, 轮流第 {fair} 个")
+    return {"scale": scale, "fifo_last": fifo, "fair_last": fair}
+
+
+def bench_burst(files=3000, events_per_file=3, print_seconds=0.001, max_in_flight=64, spill_memory=256,
+                coalesce_window=0.05):
+    """
+    监听目录一次放进 files 个文件（每个文件 events_per_file 个 created / modified 事件），打印机比事件慢：
+    事件循环被唤醒了几次、合并成几组、写进磁盘多少个，流水线和排队的峰值，以及是否每个文件正好打印一次、按文件名顺序
+    """
+    import asyncio
+
+    async def run(root, spill_path):
+        printed = []
+
+        def print_func(path, kind):
+            time.sleep(print_seconds)
+            printed.append(path)
+            return True
+
+        pipeline = WatchPipeline(print_func, max_in_flight=max_in_flight, spill_path=spill_path,
+                                 spill_memory=spill_memory, coalesce_window=coalesce_window,
+                                 quiet_seconds=0.02, debounce_interval=0.01, probe=lambda path: True)
+        await pipeline.start()
+        paths = [os.path.join(root, f"{i:05d}.pdf") for i in range(files)]
+        for path in paths:
+            open(path, "wb").close()
+
+        def burst():
+            for path in paths:
+                for _ in range(events_per_file):
+                    pipeline.submit_threadsafe(path)
+
+        wakeups = 0
+        original_set = pipeline._coalesce_wakeup.set
+
+        def counted_set():
+            nonlocal wakeups
+            wakeups += 1
+            original_set()
+
+        pipeline._coalesce_wakeup.set = counted_set
+        peak_in_flight = peak_memory = 0
+        start = time.perf_counter()
+        thread = threading.Thread(target=burst)
+        thread.start()
+        while thread.is_alive() or pipeline._pending or len(pipeline.spill) or pipeline._in_flight:
+            await asyncio.sleep(0.005)
+            peak_in_flight = max(peak_in_flight, len(pipeline._in_flight))
+            peak_memory = max(peak_memory, pipeline.spill.in_memory())
+        seconds = time.perf_counter() - start
+        await pipeline.shutdown()
+        return {
+            "events": pipeline.events,
+            "wakeups": wakeups,
+            "groups": pipeline.batches,
+            "printed": len(printed),
+            "duplicates": len(printed) - len(set(printed)),
+            "ordered": printed == sorted(printed),
+            "spilled": pipeline.spill.spilled,
+            "peak_in_flight": peak_in_flight,
+            "peak_queued_in_memory": peak_memory,
+            "seconds": round(seconds, 3),
+        }
+
+    results = {}
+    for name, spill in (("memory", False), ("spill", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            results[name] = asyncio.run(run(tmp, os.path.join(tmp, "watch_spill.db") if spill else None))
+
+    print(f"burst: {files} 个文件 x {events_per_file} 个事件，流水线上限 {max_in_flight}，内存排队上限 {spill_memory}")
+    for name, r in results.items():
+        label = "不写磁盘" if name == "memory" else "超出写磁盘"
+        print(f"  {label}: {r['events']} 个事件唤醒 {r['wakeups']} 次合并成 {r['groups']} 组, "
+              f"打印 {r['printed']} 个(重复 {r['duplicates']}, 按顺序 {r['ordered']}), 写磁盘 {r['spilled']} 个, "
+              f"流水线峰值 {r['peak_in_flight']}, 内存排队峰值 {r['peak_queued_in_memory']}, 用时 {r['seconds']} 秒")
+    return results
+
+
+def _proc_io():
+    """当前进程的读写统计（Linux 的 /proc/self/io：系统调用次数和字节数），其他系统返回 None"""
+    try:
+        with open("/proc/self/io") as f:
+            return {key: int(value) for key, value in (line.split(":") for line in f)}
+    except OSError:
+        return None
+
+
+def bench_batch(clinics=20, files_per_clinic=50, xlsx_ratio=0.3, monthly_ratio=0.1, size=4096,
+                pdf_latency=0.002, open_delay=0.005, print_delay=0.002, duplicate_action="flag", merge=False,
+                rate_ppm=0.0, stage_metrics=True):
+    """
+    整批打印吞吐量：直接运行 batch_printer.main()（计划 → 账本 → 查重 → 限速 → Excel 双缓冲 / 合并打印 → 归档 → 删除空目录），
+    处理一棵模拟的诊所目录树；PDF 打印、Excel 和打印机枚举换成假后端，延迟可以配置
+    不跟踪打印队列、打印间隔为 0、诊所之间不提示等待；rate_ppm > 0 时配置 [printer_rates] 限速（突发页数很大，只测开销）
+    """
+    import batch_printer
+    from excel_session import configure_excel_session, DEFAULT_MAX_JOBS
+
+    # 假的 xlsx 读不出页数会有警告，不影响结果
+    logging.disable(logging.WARNING)
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+    saved = {name: getattr(batch_printer, name) for name in ("PDF_BACKEND", "PRINTER_CATALOG", "DEFAULT_PRINTER")}
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src")
+        make_tree(src, clinics, files_per_clinic, monthly_ratio=monthly_ratio, xlsx_ratio=xlsx_ratio, size=size,
+                  real_pdf=merge)
+        with open(os.path.join(tmp, "config.ini"), "w", encoding="utf-8") as f:
+            f.write(
+                "[settings]\n"
+                f"source_dir = {src}\n"
+                "monthly_printer_name = A4print\n"
+                "default_paper_size = 132\n"
+                "default_paper_zoom = 75\n"
+                "delay_seconds = 0\n"
+                "enable_wait_prompt = false\n"
+                "wait_prompt_sleep = 0\n"
+                "spooler_tracking = false\n"
+                f"duplicate_action = {duplicate_action}\n"
+                f"merge_directory = {str(merge).lower()}\n"
+                f"stage_metrics = {str(stage_metrics).lower()}\n"
+            )
+            if rate_ppm > 0:
+                f.write(f"[printer_rates]\ndefault = {rate_ppm}, 1000000\n")
+
+        printer = FakePrinterBackend({"DotMatrix": pdf_latency})
+        excel_backend = FakeExcelBackend(sheet_count=2, open_delay=open_delay, print_delay=print_delay)
+        batch_printer.PDF_BACKEND = printer
+        batch_printer.PRINTER_CATALOG = PrinterCatalog(
+            FakePrinterEnumBackend({"DotMatrix": ("LPT1", []), "A4print": ("Ne01", [])}, default="DotMatrix"))
+        batch_printer.DEFAULT_PRINTER = None
+        configure_excel_session(backend=excel_backend)
+
+        io_before = _proc_io()
+        start = time.perf_counter()
+        try:
+            with SyscallCounter() as counter:
+                batch_printer.main(base_dir=tmp)
+        except SystemExit:
+            raise AssertionError("batch_printer.main 打印失败退出")
+        finally:
+            elapsed = time.perf_counter() - start
+            io_after = _proc_io()
+            for handler in root_logger.handlers[:]:
+                if handler not in handlers:
+                    root_logger.removeHandler(handler)
+                    handler.close()
+            for name, value in saved.items():
+                setattr(batch_printer, name, value)
+            configure_excel_session(backend=None, max_jobs=DEFAULT_MAX_JOBS)
+            logging.disable(logging.NOTSET)
+
+        leftover = [name for name in os.listdir(src) if not name.startswith("~$")]
+        assert leftover == [], f"源目录没有清空: {leftover[:5]}"
+        plans = [name for name in os.listdir(os.path.join(tmp, "logs")) if name.startswith("plan_")]
+        with open(os.path.join(tmp, "logs", plans[0]), encoding="utf-8") as f:
+            totals = json.load(f)["totals"]
+
+    files = totals["files"]
+    result = {
+        "files": files,
+        "excel": totals["excel"],
+        "seconds": elapsed,
+        "files_per_second": files / elapsed,
+        "pdf_jobs": len(printer.printed),
+        "syscalls": counter.total(),
+        "calls": dict(counter.counts),
+        "excel_launches": excel_backend.launches,
+    }
+    if io_before and io_after:
+        result["io"] = {key: io_after[key] - io_before[key] for key in io_after}
+
+    print(f"batch: {clinics} 个诊所 x {files_per_clinic} 个文件 (Excel {result['excel']}), "
+          f"PDF {pdf_latency} 秒, Excel 打开 {open_delay} 秒 + 打印 {print_delay} 秒, "
+          f"查重 {duplicate_action}, 合并打印 {merge}, 限速 {rate_ppm or '无'}")
+    print(f"  {elapsed:.2f} 秒, 每秒 {result['files_per_second']:.1f} 个文件, 打印任务 {result['pdf_jobs']} 个 PDF, "
+          f"os 调用 {result['syscalls']}")
+    if "io" in result:
+        io = result["io"]
+        print(f"  读 {io['syscr']} 次 / {io['rchar']} 字节, 写 {io['syscw']} 次 / {io['wchar']} 字节")
+    return result
+
+
+BENCHMARKS = {
+    "spooler": bench_spooler,
+    "dispatch": bench_dispatch,
+    "wave": bench_wave,
+    "archive": bench_archive,
+    "plan": bench_plan,
+    "excel_pipeline": bench_excel_pipeline,
+    "catalog": bench_catalog,
+    "rate": bench_rate,
+    "paper": bench_paper,
+    "page_setup": bench_page_setup,
+    "snapshot": bench_snapshot,
+    "polling": bench_polling,
+    "roots": bench_roots,
+    "burst": bench_burst,
+    "batch": bench_batch,
+}
+
+
+def _parse_sequence(value, default):
+    """
+    元组参数：pages=1,1,2,8   counts=10,100   sizes=(400,150),(2480,930)
+    只写一个元素时也返回元组（sizes=400,150 是一个尺寸）
+    """
+    parsed = ast.literal_eval(value)
+    nested = bool(default) and isinstance(default[0], (tuple, list))
+    if not isinstance(parsed, (tuple, list)) or (nested and not isinstance(parsed[0], (tuple, list))):
+        parsed = (parsed,)
+    return type(default)(parsed)
+
+
+def _parse_params(func, items):
+    """把 --param key=value 按函数参数默认值的类型转换，只保留这个函数认识的参数"""
+    defaults = {name: p.default for name, p in inspect.signature(func).parameters.items()}
+    params = {}
+    for key, value in items:
+        if key not in defaults:
+            continue
+        default = defaults[key]
+        if isinstance(default, bool):
+            params[key] = value.lower() in ("1", "true", "yes")
+        elif isinstance(default, (int, float)):
+            params[key] = type(default)(value)
+        elif isinstance(default, (tuple, list)):
+            params[key] = _parse_sequence(value, default)
+        else:
+            params[key] = value
+    return params
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="打印流程性能测试")
+    parser.add_argument("names", nargs="*", help=f"测试项目: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--param", action="append", default=[], metavar="KEY=VALUE", help="修改测试参数")
+    parser.add_argument("--output", help="把结果保存成 JSON 文件")
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"❌ 未知的测试项目: {name}，可选: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+    items = [item.partition("=")[::2] for item in args.param]
+
+    results = {}
+    for name in names:
+        func = BENCHMARKS[name]
+        params = _parse_params(func, items)
+        results[name] = {"params": params, "result": func(**params)}
+
+    if args.output:
+        report = {
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "benchmarks": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📄 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+ARCHIVE_MARK = "_打印备份_"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    """流式计算文件内容哈希，不会把整个文件读进内存"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def find_archive_folders(source_root):
+    """找出源目录对应的所有按日期生成的备份目录：<源目录>_打印备份_YYYY-MM-DD"""
+    parent = os.path.dirname(os.path.abspath(source_root))
+    prefix = os.path.basename(os.path.abspath(source_root)) + ARCHIVE_MARK
+    folders = []
+    try:
+        with os.scandir(parent) as it:
+            for entry in it:
+                if entry.name.startswith(prefix) and entry.is_dir():
+                    folders.append(entry.path)
+    except FileNotFoundError:
+        pass
+    return sorted(folders)
+
+
+def _iter_files(folder):
+    stack = [folder]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif not entry.name.startswith("~$"):
+                        yield entry
+        except OSError as e:
+            logging.warning(f"⚠️ 无法读取目录: {current} - {e}")
+
+
+class DedupeIndex:
+    """
+    备份目录里已打印文件的内容索引，用来发现重复导出的文件
+    先按文件大小过滤，大小相同时才计算哈希；大小和修改时间没变的文件不会重新计算哈希
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " folder TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " hash TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_size ON files(size)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_files_folder ON files(folder)")
+        # sealed=1 表示往日的备份目录，已经不会再变化，不需要再扫描
+        self.conn.execute("CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY, sealed INTEGER NOT NULL)")
+        self.conn.commit()
+        self.hashed = 0
+
+    def refresh(self, folders, today=None):
+        """增量更新索引：跳过已封存的备份目录，只处理新目录和当天目录里的变化"""
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        sealed = {row[0] for row in self.conn.execute("SELECT path FROM folders WHERE sealed = 1")}
+        scanned = 0
+
+        for folder in folders:
+            if folder in sealed:
+                continue
+            self._scan_folder(folder)
+            scanned += 1
+            is_sealed = 0 if folder.endswith(ARCHIVE_MARK + today) else 1
+            self.conn.execute(
+                "INSERT INTO folders (path, sealed) VALUES (?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET sealed = excluded.sealed",
+                (folder, is_sealed),
+            )
+        self.conn.commit()
+        return scanned
+
+    def _scan_folder(self, folder):
+        known = {
+            path: (size, mtime_ns)
+            for path, size, mtime_ns in self.conn.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE folder = ?", (folder,))
+        }
+        changed = []
+        for entry in _iter_files(folder):
+            st = entry.stat()
+            old = known.pop(entry.path, None)
+            if old != (st.st_size, st.st_mtime_ns):
+                # 新文件或内容变化：哈希置空，等到有同样大小的文件需要比对时再算
+                changed.append((entry.path, folder, st.st_size, st.st_mtime_ns))
+
+        self.conn.executemany(
+            "INSERT INTO files (path, folder, size, mtime_ns, hash) VALUES (?, ?, ?, ?, NULL) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, hash = NULL",
+            changed,
+        )
+        # 已经不存在的文件
+        self.conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in known])
+
+    def add(self, path, folder, content_hash=None):
+        """登记刚归档的文件"""
+        st = os.stat(path)
+        self.conn.execute(
+            "INSERT INTO files (path, folder, size, mtime_ns, hash) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, hash = excluded.hash",
+            (path, folder, st.st_size, st.st_mtime_ns, content_hash),
+        )
+        self.conn.commit()
+
+    def _hash_of(self, path):
+        self.hashed += 1
+        return file_hash(path)
+
+    def find_duplicate(self, path):
+        """
+        返回内容相同的已归档文件路径，没有则返回 None
+        第二个返回值是待检查文件的哈希（没算过则为 None），归档时可以直接复用
+        """
+        size = os.path.getsize(path)
+        rows = self.conn.execute("SELECT path, mtime_ns, hash FROM files WHERE size = ?", (size,)).fetchall()
+        if not rows:
+            return None, None
+
+        target_hash = self._hash_of(path)
+        for archived, mtime_ns, archived_hash in rows:
+            if archived_hash is None:
+                try:
+                    if os.stat(archived).st_mtime_ns != mtime_ns:
+                        continue
+                    archived_hash = self._hash_of(archived)
+                except OSError:
+                    continue
+                self.conn.execute("UPDATE files SET hash = ? WHERE path = ?", (archived_hash, archived))
+                self.conn.commit()
+            if archived_hash == target_hash:
+                return archived, target_hash
+        return None, target_hash
+
+    def close(self):
+        self.conn.close()
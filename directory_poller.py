@@ -0,0 +1,346 @@
+"""
+网络共享目录（SMB）的轮询监听
+watchdog 的原生通知在网络共享上不可靠，它自带的 PollingObserver 每次都要 stat 全部文件
+这里只记录每个目录的修改时间：目录里有文件增删、改名时目录的修改时间会变，只有这些目录才重新列出文件
+"""
+import logging
+import os
+import threading
+import time
+
+# 有变化后按最短间隔轮询，一直没有变化时逐渐放慢到最长间隔（秒）
+DEFAULT_MIN_INTERVAL = 0.5
+DEFAULT_MAX_INTERVAL = 10.0
+DEFAULT_BACKOFF = 2.0
+# 每次轮询最多做多少次 stat / 列目录，目录很多时分几次轮询检查完一遍
+DEFAULT_STAT_BUDGET = 2000
+# 目录有变化后多少秒内每次轮询都重新列出（不看修改时间），避免同一个时间刻度里的后续变化被漏掉
+DEFAULT_HOT_SECONDS = 5.0
+
+CREATED = "created"
+DELETED = "deleted"
+MOVED = "moved"
+
+# Windows 上 DirEntry.inode() 要单独 stat 一次，计入预算；其他系统直接来自 readdir
+_INODE_COST = 1 if os.name == "nt" else 0
+
+
+class _Dir:
+    __slots__ = ("mtime_ns", "inode", "files", "subdirs", "hot_until")
+
+    def __init__(self, inode=0):
+        self.mtime_ns = None
+        self.inode = inode
+        # 文件名 -> inode（用来识别改名 / 移动）
+        self.files = {}
+        # 子目录名 -> inode
+        self.subdirs = {}
+        self.hot_until = 0.0
+
+
+class DirectoryPoller:
+    """
+    轮询一个目录树，on_event(类型, 路径, 新路径, 是否目录) 在轮询线程里调用，类型是 CREATED / DELETED / MOVED
+    每次轮询：
+        1. 最近有变化的目录直接重新列出
+        2. 其余目录按顺序 stat，修改时间变了才列出；超出 stat_budget 的下次轮询接着检查
+        3. 同一次轮询里消失和新出现的文件 / 目录 inode 相同时报告为移动
+    启动时列出整个目录树作为基准，已有的文件不报告；由 DirectoryPollingObserver 在后台线程里定时调用 tick()
+    """
+
+    def __init__(self, root, on_event, recursive=True, min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL, backoff=DEFAULT_BACKOFF, stat_budget=DEFAULT_STAT_BUDGET,
+                 hot_seconds=DEFAULT_HOT_SECONDS, clock=time.monotonic):
+        self.root = os.path.abspath(root)
+        self.on_event = on_event
+        self.recursive = recursive
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.stat_budget = stat_budget
+        self.hot_seconds = hot_seconds
+        self.clock = clock
+        self.interval = min_interval
+        self.ticks = 0
+        self.last_tick = None
+
+        self._dirs = {}
+        self._hot = set()
+        self._order = []
+        self._cursor = 0
+        self._io = 0
+        self._removed = {}
+        self._added = []
+
+    def __len__(self):
+        return len(self._dirs)
+
+    # ---------- 列目录 ----------
+
+    def _inode(self, entry):
+        self._io += _INODE_COST
+        return entry.inode()
+
+    @staticmethod
+    def _removed_key(inode, name, path, is_dir):
+        # 没有 inode 的文件系统（inode 为 0）用路径区分，不参与移动配对
+        return (inode, is_dir) if inode else (os.path.join(path, name), is_dir)
+
+    def _list(self, path, state, mtime_ns, now):
+        """重新列出目录，和上次的文件 / 子目录比较，变化记到本次轮询的 _added / _removed"""
+        self._io += 1
+        files = {}
+        subdirs = {}
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    name = entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                inode = state.subdirs.get(name)
+                                subdirs[name] = inode if inode is not None else self._inode(entry)
+                        elif entry.is_file(follow_symlinks=False):
+                            inode = state.files.get(name)
+                            files[name] = inode if inode is not None else self._inode(entry)
+                    except OSError:
+                        continue
+        except OSError:
+            # 目录在列出前被删除，由上级目录报告
+            return
+
+        changed = False
+        for name in state.files.keys() - files.keys():
+            self._removed[self._removed_key(state.files[name], name, path, False)] = os.path.join(path, name)
+            changed = True
+        for name in files.keys() - state.files.keys():
+            self._added.append((os.path.join(path, name), files[name], False))
+            changed = True
+        for name in state.subdirs.keys() - subdirs.keys():
+            self._removed[self._removed_key(state.subdirs[name], name, path, True)] = os.path.join(path, name)
+            changed = True
+        for name in subdirs.keys() - state.subdirs.keys():
+            self._added.append((os.path.join(path, name), subdirs[name], True))
+            changed = True
+
+        state.mtime_ns = mtime_ns
+        state.files = files
+        state.subdirs = subdirs
+        if changed:
+            state.hot_until = now + self.hot_seconds
+            self._hot.add(path)
+
+    def _check(self, path, now, force=False):
+        state = self._dirs.get(path)
+        if state is None:
+            return
+        self._io += 1
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        if force or mtime_ns != state.mtime_ns:
+            self._list(path, state, mtime_ns, now)
+
+    def _add_tree(self, path, inode, now):
+        """
+        新出现的目录：登记并列出整棵子树，返回 (里面的文件 [(路径, inode), ...], 移进来的目录 [(原路径, 新路径), ...])
+        子树里和本次轮询消失的目录 inode 相同的（例如移到新建的目录里）按移动处理，不再往下列出
+        """
+        files = []
+        moves = []
+        pending = [(path, inode)]
+        while pending:
+            path, inode = pending.pop()
+            self._dirs[path] = _Dir(inode)
+            self._order.append(path)
+            self._added = []
+            self._check(path, now, force=True)
+            for added_path, added_inode, is_dir in self._added:
+                if not is_dir:
+                    files.append((added_path, added_inode))
+                    continue
+                src = self._removed.pop((added_inode, True), None) if added_inode else None
+                if src is not None:
+                    moves.append((src, added_path))
+                else:
+                    pending.append((added_path, added_inode))
+        self._added = []
+        for src, dest in moves:
+            self._move_tree(src, dest)
+        return files, moves
+
+    def _move_tree(self, src, dest):
+        prefix = src + os.sep
+        for path in [p for p in self._dirs if p == src or p.startswith(prefix)]:
+            new_path = dest + path[len(src):]
+            self._dirs[new_path] = self._dirs.pop(path)
+            self._order.append(new_path)
+            if path in self._hot:
+                self._hot.discard(path)
+                self._hot.add(new_path)
+
+    def _remove_tree(self, path):
+        prefix = path + os.sep
+        for p in [p for p in self._dirs if p == path or p.startswith(prefix)]:
+            del self._dirs[p]
+            self._hot.discard(p)
+
+    # ---------- 轮询 ----------
+
+    def baseline(self):
+        """列出整个目录树作为基准，不报告事件"""
+        self._dirs.clear()
+        self._hot.clear()
+        self._order = []
+        self._cursor = 0
+        self._added = []
+        self._removed = {}
+        self._io = 0
+        self._add_tree(self.root, 0, self.clock())
+        self._hot.clear()
+        return self._io
+
+    def tick(self):
+        """轮询一次，返回报告的事件数"""
+        started = time.perf_counter()
+        cpu = time.process_time()
+        now = self.clock()
+        self._io = 0
+        self._added = []
+        self._removed = {}
+
+        checked = set()
+        for path in list(self._hot):
+            state = self._dirs.get(path)
+            if state is None or state.hot_until <= now:
+                self._hot.discard(path)
+                continue
+            self._check(path, now, force=True)
+            checked.add(path)
+
+        # 其余目录轮流检查，用完预算为止，一次最多检查一遍
+        for _ in range(len(self._order)):
+            if self._io >= self.stat_budget:
+                break
+            if self._cursor >= len(self._order):
+                # 一遍检查完，去掉已经删除 / 移走的目录
+                self._order = [p for p in dict.fromkeys(self._order) if p in self._dirs]
+                self._cursor = 0
+                if not self._order:
+                    break
+            path = self._order[self._cursor]
+            self._cursor += 1
+            if path not in checked:
+                self._check(path, now)
+                checked.add(path)
+
+        events = self._pair(now)
+        if events or self._hot:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        self.ticks += 1
+        self.last_tick = {
+            "checked": len(checked),
+            "io": self._io,
+            "events": len(events),
+            "seconds": time.perf_counter() - started,
+            "cpu_seconds": time.process_time() - cpu,
+            "interval": self.interval,
+        }
+        for event in events:
+            try:
+                self.on_event(*event)
+            except Exception as e:
+                logging.error(f"❌ 处理文件事件失败: {event} - {e}")
+        return len(events)
+
+    def _pair(self, now):
+        """把本次轮询的新增 / 消失配对成移动，其余是新建 / 删除；新目录在这里整棵列出"""
+        events = []
+        added_files = []
+        added, self._added = self._added, []
+        for path, inode, is_dir in added:
+            if not is_dir:
+                added_files.append((path, inode))
+                continue
+            src = self._removed.pop((inode, True), None) if inode else None
+            if src is not None:
+                self._move_tree(src, path)
+                events.append((MOVED, src, path, True))
+            else:
+                files, moves = self._add_tree(path, inode, now)
+                added_files.extend(files)
+                events.extend((MOVED, src, dest, True) for src, dest in moves)
+
+        for path, inode in added_files:
+            src = self._removed.pop((inode, False), None) if inode else None
+            if src is not None:
+                events.append((MOVED, src, path, False))
+            else:
+                events.append((CREATED, path, None, False))
+
+        for (_, is_dir), path in self._removed.items():
+            if is_dir:
+                self._remove_tree(path)
+            events.append((DELETED, path, None, is_dir))
+        return events
+
+
+class DirectoryPollingObserver:
+    """
+    和 watchdog 的 Observer 用法相同（schedule / start / stop / join），事件交给 FileSystemEventHandler.dispatch
+    用在网络共享目录上，代替 watchdog 的 PollingObserver
+    所有目录在同一个线程里轮询，每个目录按自己的间隔，监听几百个目录也只有一个线程
+    """
+
+    def __init__(self, **poller_options):
+        self.poller_options = poller_options
+        self.pollers = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def schedule(self, event_handler, path, recursive=False):
+        def emit(kind, src, dest, is_directory):
+            from watchdog import events
+            if kind == CREATED:
+                event = events.DirCreatedEvent(src) if is_directory else events.FileCreatedEvent(src)
+            elif kind == DELETED:
+                event = events.DirDeletedEvent(src) if is_directory else events.FileDeletedEvent(src)
+            else:
+                event = events.DirMovedEvent(src, dest) if is_directory else events.FileMovedEvent(src, dest)
+            event_handler.dispatch(event)
+
+        poller = DirectoryPoller(path, emit, recursive=recursive, **self.poller_options)
+        self.pollers.append(poller)
+        return poller
+
+    def start(self):
+        """列出每个目录的基准后在后台线程里轮询"""
+        for poller in self.pollers:
+            poller.baseline()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="directory-poller", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        due = {id(poller): time.monotonic() + poller.interval for poller in self.pollers}
+        while self.pollers:
+            if self._stop.wait(max(0.0, min(due.values()) - time.monotonic())):
+                break
+            for poller in self.pollers:
+                if due[id(poller)] > time.monotonic():
+                    continue
+                try:
+                    poller.tick()
+                except Exception as e:
+                    logging.error(f"❌ 轮询目录失败: {poller.root} - {e}")
+                due[id(poller)] = time.monotonic() + poller.interval
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
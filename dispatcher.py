@@ -0,0 +1,87 @@
+import logging
+import queue
+import threading
+
+# 每台打印机的待打印队列长度，队列满时提交方会等待
+DEFAULT_QUEUE_SIZE = 16
+
+
+class PrinterDispatcher:
+    """
+    每台物理打印机一个工作线程和一个有界队列，多台打印机同时打印
+    同一台打印机上的任务按提交顺序执行；打印成功后才调用 on_success（归档移动）
+    """
+
+    def __init__(self, handler, on_success=None, queue_size=DEFAULT_QUEUE_SIZE, worker_exit=None):
+        # handler(printer, job) -> bool，返回是否打印成功
+        self.handler = handler
+        self.on_success = on_success
+        self.queue_size = queue_size
+        self.worker_exit = worker_exit
+        self.failed = False
+        self.completed = 0
+        self._queues = {}
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _worker(self, printer, jobs):
+        try:
+            while True:
+                job = jobs.get()
+                if job is None:
+                    jobs.task_done()
+                    break
+                try:
+                    # 有任务失败后，剩下的任务不再打印，和原来遇错退出的行为一致
+                    if self.failed:
+                        continue
+                    try:
+                        success = self.handler(printer, job)
+                    except Exception as e:
+                        logging.error(f"❌ 打印任务异常: {job} - {e}")
+                        success = False
+
+                    if not success:
+                        self.failed = True
+                        continue
+
+                    # 归档移动会删除空目录，多个打印机线程之间串行执行
+                    with self._lock:
+                        if self.on_success:
+                            self.on_success(job)
+                        self.completed += 1
+                except Exception as e:
+                    logging.error(f"❌ 归档失败: {job} - {e}")
+                    self.failed = True
+                finally:
+                    jobs.task_done()
+        finally:
+            if self.worker_exit:
+                self.worker_exit()
+
+    def submit(self, printer, job):
+        """把任务放进对应打印机的队列，第一次遇到的打印机会启动一个工作线程"""
+        jobs = self._queues.get(printer)
+        if jobs is None:
+            jobs = queue.Queue(maxsize=self.queue_size)
+            thread = threading.Thread(target=self._worker, args=(printer, jobs),
+                                      name=f"printer-{printer}", daemon=True)
+            self._queues[printer] = jobs
+            self._threads.append(thread)
+            thread.start()
+        jobs.put(job)
+
+    def wait(self):
+        """等待已提交的任务全部完成，全部成功时返回 True"""
+        for jobs in list(self._queues.values()):
+            jobs.join()
+        return not self.failed
+
+    def close(self):
+        """停止所有工作线程（会先把队列里剩下的任务处理完）"""
+        for jobs in self._queues.values():
+            jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._queues.clear()
+        self._threads.clear()
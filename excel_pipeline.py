@@ -0,0 +1,130 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+# 同时准备的工作簿数量：2 = 双缓冲，打印第 N 个时准备第 N+1 个
+DEFAULT_SLOTS = 2
+
+
+class _Job:
+    def __init__(self, key, args):
+        self.key = key
+        self.args = args
+        self.go = threading.Event()
+        self.cancelled = False
+        self.started = False
+        # cancelled / started 的判断和设置在同一把锁里，取消和开始准备不会交叉
+        self.lock = threading.Lock()
+        # 工作簿已经关闭（或者根本没有打开）
+        self.released = threading.Event()
+        self.future = Future()
+
+
+class ExcelPrintPipeline:
+    """
+    两阶段流水线：准备阶段（打开工作簿 + 设置 PageSetup）在独立线程 / 独立 Excel 实例里提前进行，
+    打印阶段只是把已经准备好的工作簿交出去打印
+    单个文件的耗时从 准备 + 打印 变成约 max(准备, 打印)
+
+    prepare(*args) -> prepared          在工作线程里执行
+    print_prepared(prepared, *args) -> bool
+    release(prepared)                    打印完或取消后释放（关闭工作簿）
+    worker_exit()                        工作线程退出前执行（关闭本线程的 Excel 会话）
+    """
+
+    def __init__(self, prepare, print_prepared, release, slots=DEFAULT_SLOTS, worker_exit=None):
+        self.prepare = prepare
+        self.print_prepared = print_prepared
+        self.release = release
+        self.worker_exit = worker_exit
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._threads = []
+        for i in range(slots):
+            thread = threading.Thread(target=self._worker, name=f"excel-slot-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+                self._run_job(job)
+        finally:
+            if self.worker_exit:
+                self.worker_exit()
+
+    def _run_job(self, job):
+        with job.lock:
+            if job.cancelled:
+                # 还没开始准备就取消了，不用再打开工作簿
+                job.future.set_result(None)
+                job.released.set()
+                return
+            job.started = True
+        try:
+            prepared = self.prepare(*job.args)
+        except Exception as e:
+            job.future.set_exception(e)
+            job.released.set()
+            return
+
+        # 准备好后等待调用方交接（轮到它打印）或者取消
+        job.go.wait()
+        try:
+            if job.cancelled:
+                job.future.set_result(None)
+            else:
+                job.future.set_result(self.print_prepared(prepared, *job.args))
+        except Exception as e:
+            job.future.set_exception(e)
+        finally:
+            try:
+                self.release(prepared)
+            except Exception as e:
+                logging.warning(f"⚠️ 释放工作簿失败: {job.key} - {e}")
+            job.released.set()
+
+    def prefetch(self, key, *args):
+        """
+        提前开始准备一个文件（不打印），已经在准备中的文件不会重复提交
+        同时预先准备的文件数要小于 slots，否则所有线程都在等交接，后面的文件排不上
+        """
+        if key not in self._jobs:
+            job = _Job(key, args)
+            self._jobs[key] = job
+            self._queue.put(job)
+
+    def run(self, key, *args):
+        """打印一个文件：已经预先准备好就直接打印，否则现在开始准备；返回打印结果"""
+        self.prefetch(key, *args)
+        job = self._jobs.pop(key)
+        job.go.set()
+        return job.future.result()
+
+    def discard(self, key):
+        """
+        取消一个预先准备的文件（例如后来决定跳过打印）
+        已经在准备中时，等工作簿打开后再关闭才返回：Excel 还占着文件时调用方不能移动它
+        """
+        job = self._jobs.pop(key, None)
+        if job is None:
+            return
+        with job.lock:
+            job.cancelled = True
+            started = job.started
+        job.go.set()
+        if started:
+            job.released.wait()
+
+    def close(self):
+        for key in list(self._jobs):
+            self.discard(key)
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
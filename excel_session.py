@@ -0,0 +1,172 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+# 单个 Excel 实例最多处理的文件数，达到后重启实例（防止 Excel 内存越用越多）
+DEFAULT_MAX_JOBS = 200
+
+
+class Win32ExcelBackend:
+    """
+    真实的 Excel 自动化后端，基于 pywin32 COM
+    pywin32 在这里才导入，这样在 Linux 上也能用假的后端测试会话逻辑
+    """
+
+    def init_thread(self):
+        import pythoncom
+        pythoncom.CoInitialize()
+
+    def uninit_thread(self):
+        import pythoncom
+        pythoncom.CoUninitialize()
+
+    def launch(self):
+        import win32com.client
+        # DispatchEx 总是启动新的 Excel 进程，每个线程各用各的实例，互不干扰
+        return win32com.client.DispatchEx("Excel.Application")
+
+
+class ExcelSession:
+    """
+    每个工作线程一个常驻的 Excel 实例，多个文件复用同一个实例
+    只有在 Excel 挂掉或处理文件数达到 max_jobs 时才重启
+    """
+
+    def __init__(self, backend=None, max_jobs=DEFAULT_MAX_JOBS):
+        self.backend = backend or Win32ExcelBackend()
+        self.max_jobs = max_jobs
+        self.excel = None
+        self.jobs = 0
+        self.launches = 0
+        self._default_printer = None
+        self._thread_ready = False
+
+    def _is_alive(self):
+        if self.excel is None:
+            return False
+        try:
+            self.excel.Workbooks.Count
+            return True
+        except Exception:
+            return False
+
+    def _launch(self):
+        if not self._thread_ready:
+            self.backend.init_thread()
+            self._thread_ready = True
+
+        excel = self.backend.launch()
+        excel.Visible = False
+        excel.DisplayAlerts = False
+        try:
+            self._default_printer = excel.ActivePrinter
+        except Exception:
+            self._default_printer = None
+
+        self.excel = excel
+        self.jobs = 0
+        self.launches += 1
+        logging.info(f"🚀 启动 Excel 实例 (第 {self.launches} 次)")
+
+    def _quit(self):
+        if self.excel is None:
+            return
+        try:
+            self.excel.Quit()
+        except Exception:
+            pass
+        self.excel = None
+
+    def get_excel(self):
+        """返回可用的 Excel 实例，必要时（首次、挂掉、达到上限）重新启动"""
+        if self.excel is not None and self.jobs >= self.max_jobs:
+            logging.info(f"♻️ Excel 已处理 {self.jobs} 个文件，重启实例")
+            self._quit()
+        elif self.excel is not None and not self._is_alive():
+            logging.warning(f"⚠️ Excel 实例已失效，重新启动")
+            self.excel = None
+
+        if self.excel is None:
+            self._launch()
+        return self.excel
+
+    def reset(self):
+        """清理上一个任务留下的状态：关闭所有工作簿，恢复默认打印机"""
+        if self.excel is None:
+            return
+        try:
+            while self.excel.Workbooks.Count > 0:
+                self.excel.Workbooks(1).Close(False)
+        except Exception:
+            pass
+        if self._default_printer:
+            try:
+                if self.excel.ActivePrinter != self._default_printer:
+                    self.excel.ActivePrinter = self._default_printer
+            except Exception:
+                pass
+
+    def open_workbook(self, path, read_only=True):
+        """打开工作簿；用完必须调用 finish_workbook()"""
+        excel = self.get_excel()
+        return excel.Workbooks.Open(path, ReadOnly=read_only)
+
+    def finish_workbook(self, wb):
+        """关闭工作簿并重置 Excel 状态，实例本身保留给下一个文件"""
+        try:
+            if wb is not None:
+                wb.Close(False)
+        except Exception:
+            pass
+        self.jobs += 1
+        self.reset()
+
+    @contextmanager
+    def workbook(self, path, read_only=True):
+        """打开工作簿，用完后关闭并重置 Excel 状态，实例本身保留给下一个文件"""
+        wb = None
+        try:
+            wb = self.open_workbook(path, read_only)
+            yield wb
+        finally:
+            self.finish_workbook(wb)
+
+    def close(self):
+        self._quit()
+        if self._thread_ready:
+            try:
+                self.backend.uninit_thread()
+            except Exception:
+                pass
+            self._thread_ready = False
+
+
+_local = threading.local()
+_backend = None
+_max_jobs = DEFAULT_MAX_JOBS
+
+
+def configure_excel_session(backend=None, max_jobs=None):
+    """设置之后新建会话使用的后端和重启上限"""
+    global _backend, _max_jobs
+    if backend is not None:
+        _backend = backend
+    if max_jobs is not None:
+        _max_jobs = max_jobs
+
+
+def get_excel_session():
+    """获取当前线程的 Excel 会话（没有则创建）"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = ExcelSession(backend=_backend, max_jobs=_max_jobs)
+        _local.session = session
+    return session
+
+
+def close_excel_session():
+    """关闭当前线程的 Excel 会话，COM 对象只能在创建它的线程里释放"""
+    session = getattr(_local, "session", None)
+    if session is not None:
+        session.close()
+        _local.session = None
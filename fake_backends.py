@@ -0,0 +1,325 @@
+"""
+假的打印 / Excel 后端，用于在 Linux 上测试和压测，不需要真实的打印机和 Office
+"""
+import threading
+import time
+
+
+class FakePageSetup:
+    """
+    统计属性读写次数（每次读写都是一次 COM 往返）
+    PrintCommunication 开启时每次写入都要和打印机驱动通信一次，关闭时写入先缓存，重新开启时一次性提交
+    """
+
+    DEFAULTS = {"PaperSize": 9, "Zoom": 100, "FitToPagesWide": False, "FitToPagesTall": False, "Orientation": 1}
+
+    def __init__(self, app=None):
+        object.__setattr__(self, "_app", app)
+        object.__setattr__(self, "_values", dict(self.DEFAULTS))
+
+    def __getattr__(self, name):
+        values = object.__getattribute__(self, "_values")
+        if name not in values:
+            raise AttributeError(name)
+        app = object.__getattribute__(self, "_app")
+        if app is not None:
+            app.com_reads += 1
+        return values[name]
+
+    def __setattr__(self, name, value):
+        app = self._app
+        if app is not None:
+            app.com_writes += 1
+            if name == "PaperSize" and value in app.unsupported_papers:
+                raise RuntimeError(f"无法设置 PageSetup 类的 PaperSize 属性: {value}")
+            if app.PrintCommunication:
+                app.driver_calls += 1
+            else:
+                app.pending_driver_writes += 1
+        self._values[name] = value
+
+
+def write_blank_pdf(path, title=""):
+    """写一个一页的空白 PDF，title 写进文档信息，保证每个文件内容不同"""
+    from pypdf import PdfWriter
+    writer = PdfWriter()
+    writer.add_blank_page(width=595, height=842)
+    writer.add_metadata({"/Title": title})
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def text_pdf_bytes(texts):
+    """
+    手写一个最小的 PDF：每段文字一页（带内容流），xref 偏移都是准确的
+    不依赖 pypdf，测试页数统计和合并时用
+    """
+    count = len(texts)
+    # 对象编号：1 = Catalog，2 = Pages，3 = 字体，之后每页一个 Page 和一个内容流
+    kids = " ".join(f"{4 + 2 * i} 0 R" for i in range(count))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode("ascii"),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(texts):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode("ascii"))
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode("ascii") + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("ascii")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("ascii")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def write_text_pdf(path, texts):
+    with open(path, "wb") as f:
+        f.write(text_pdf_bytes(texts))
+    return path
+
+
+class FakeSheet:
+    def __init__(self, name, app=None):
+        self.Name = name
+        self.PageSetup = FakePageSetup(app)
+
+
+class FakeWorkbook:
+    def __init__(self, app, path, sheet_count=1):
+        self.app = app
+        self.path = path
+        self.Sheets = [FakeSheet(f"Sheet{i + 1}", app) for i in range(sheet_count)]
+        self.printed = 0
+
+    def PrintOut(self, *args, **kwargs):
+        self.app._check()
+        if self.app.print_delay:
+            time.sleep(self.app.print_delay)
+        self.printed += 1
+        self.app.printed.append(self.path)
+
+    def ExportAsFixedFormat(self, file_type, path, From=None, To=None):
+        """导出成一页空白 PDF（合并打印用）"""
+        self.app._check()
+        write_blank_pdf(path, self.path)
+
+    def Close(self, save_changes=False):
+        if self in self.app._open:
+            self.app._open.remove(self)
+
+
+class FakeWorkbooks:
+    def __init__(self, app):
+        self.app = app
+
+    @property
+    def Count(self):
+        self.app._check()
+        return len(self.app._open)
+
+    def __call__(self, index):
+        return self.app._open[index - 1]
+
+    def Open(self, path, ReadOnly=False):
+        self.app._check()
+        if self.app.open_delay:
+            time.sleep(self.app.open_delay)
+        wb = FakeWorkbook(self.app, path, self.app.sheet_count)
+        self.app._open.append(wb)
+        return wb
+
+
+class FakeExcelApplication:
+    def __init__(self, sheet_count=1, open_delay=0.0, print_delay=0.0, unsupported_papers=()):
+        self.open_delay = open_delay
+        self.print_delay = print_delay
+        self.Visible = True
+        self.DisplayAlerts = True
+        self.ActivePrinter = "FakePrinter on Ne00:"
+        self.sheet_count = sheet_count
+        self.printed = []
+        self.dead = False
+        self.quit_called = False
+        self._open = []
+        self.Workbooks = FakeWorkbooks(self)
+        # PageSetup 的 COM 往返统计
+        self.unsupported_papers = set(unsupported_papers)
+        self.com_reads = 0
+        self.com_writes = 0
+        self.driver_calls = 0
+        self.pending_driver_writes = 0
+        self._print_communication = True
+
+    @property
+    def PrintCommunication(self):
+        return self._print_communication
+
+    @PrintCommunication.setter
+    def PrintCommunication(self, value):
+        # 重新开启时把缓存的页面设置一次性提交给打印机驱动
+        if value and not self._print_communication and self.pending_driver_writes:
+            self.driver_calls += 1
+            self.pending_driver_writes = 0
+        self._print_communication = bool(value)
+
+    def _check(self):
+        if self.dead:
+            raise RuntimeError("RPC 服务器不可用")
+
+    def kill(self):
+        """模拟 Excel 进程被意外结束"""
+        self.dead = True
+
+    def Quit(self):
+        self.quit_called = True
+
+
+class FakeExcelBackend:
+    """
+    统计启动了多少次 Excel 实例的假后端
+    open_delay / print_delay 模拟打开工作簿和 PrintOut 的耗时（秒）
+    """
+
+    def __init__(self, sheet_count=1, open_delay=0.0, print_delay=0.0, unsupported_papers=()):
+        self.sheet_count = sheet_count
+        self.open_delay = open_delay
+        self.print_delay = print_delay
+        self.unsupported_papers = unsupported_papers
+        self.launches = 0
+        self.instances = []
+        self._lock = threading.Lock()
+
+    def init_thread(self):
+        pass
+
+    def uninit_thread(self):
+        pass
+
+    def launch(self):
+        with self._lock:
+            self.launches += 1
+            app = FakeExcelApplication(self.sheet_count, self.open_delay, self.print_delay, self.unsupported_papers)
+            self.instances.append(app)
+            return app
+
+
+class VirtualClock:
+    """虚拟时钟，sleep 只推进时间不真正等待，方便测试节奏控制逻辑"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(0.0, seconds)
+
+
+class SimulatedSpoolerBackend:
+    """
+    模拟打印队列：任务按提交顺序逐个打印，每页耗时 seconds_per_page
+    spool_delay 模拟 PDF 阅读器把任务送进队列之前的延迟
+    """
+
+    def __init__(self, seconds_per_page=1.0, job_overhead=0.0, spool_delay=0.0, clock=None):
+        self.seconds_per_page = seconds_per_page
+        self.job_overhead = job_overhead
+        self.spool_delay = spool_delay
+        self.clock = clock or VirtualClock()
+        self.jobs = []  # (job_id, 出现时间, 完成时间)
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def submit(self, document="", pages=1):
+        with self._lock:
+            now = self.clock()
+            appear = now + self.spool_delay
+            start = max(appear, self.jobs[-1][2] if self.jobs else appear)
+            end = start + self.job_overhead + pages * self.seconds_per_page
+            job_id = self._next_id
+            self._next_id += 1
+            self.jobs.append((job_id, appear, end))
+            return job_id
+
+    def _active(self):
+        now = self.clock()
+        return [job for job in self.jobs if job[1] <= now < job[2]]
+
+    def job_ids(self):
+        with self._lock:
+            return {job[0] for job in self._active()}
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self._active())
+
+    def job_status(self, job_id):
+        with self._lock:
+            for job in self._active():
+                if job[0] == job_id:
+                    return 0
+            return None
+
+    def finished_at(self):
+        return self.jobs[-1][2] if self.jobs else 0.0
+
+
+class FakePrinterBackend:
+    """
+    假打印机：每台打印机按 latencies 里配置的秒数真实等待，用来测量并行打印的墙钟时间
+    同一台打印机同一时间只能打印一个任务
+    """
+
+    def __init__(self, latencies, default_latency=0.01):
+        self.latencies = latencies
+        self.default_latency = default_latency
+        self.printed = []
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def print_file(self, printer, path):
+        with self._lock:
+            printer_lock = self._locks.setdefault(printer, threading.Lock())
+        with printer_lock:
+            time.sleep(self.latencies.get(printer, self.default_latency))
+        with self._lock:
+            self.printed.append((printer, path))
+        return True
+
+
+class FakePrinterEnumBackend:
+    """
+    假的打印机枚举：printers = {打印机名: (端口, [(纸张名, 宽, 高), ...])}，按字典顺序枚举
+    统计枚举次数，用来确认 PrinterCatalog 没有重复枚举
+    """
+
+    def __init__(self, printers, default=None):
+        self.printers = printers
+        self.default = default or next(iter(printers), None)
+        self.list_calls = 0
+        self.form_calls = 0
+        self.fail = False
+
+    def list_printers(self):
+        self.list_calls += 1
+        if self.fail:
+            raise OSError("打印服务不可用")
+        return [(name, port) for name, (port, _) in self.printers.items()]
+
+    def list_forms(self, printer_name):
+        self.form_calls += 1
+        _, forms = self.printers[printer_name]
+        return [{"name": name, "width": width, "height": height} for name, width, height in forms]
+
+    def default_printer(self):
+        return self.default
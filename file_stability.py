@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+import time
+
+# 文件大小和修改时间保持不变多久才认为写入完成（秒）
+DEFAULT_QUIET_SECONDS = 1.0
+# 检查待定文件的间隔（秒）
+DEFAULT_POLL_INTERVAL = 0.25
+# 一个文件最长等待多久，超过仍未写完则放弃（秒）
+DEFAULT_MAX_WAIT = 600
+
+
+def exclusive_probe(path):
+    """
+    尝试以读写方式打开文件：Windows 上写入方还没关闭文件时会因为共享冲突失败
+    """
+    try:
+        with open(path, "r+b"):
+            return True
+    except OSError:
+        return False
+
+
+class StabilityTracker:
+    """
+    跟踪待定文件的大小和修改时间，文件不再变化且可以独占打开时判定为写入完成
+    至少要连续两次检查大小和修改时间都没变：复制时保留了原修改时间（资源管理器复制、cp -p、rsync -t）的文件
+    第一次检查时看起来早就静止了，而 POSIX 上写入中的文件也能打开，只靠 probe 拦不住写了一半的文件
+    本身不开线程，由调用方定期调用 poll()
+    """
+
+    def __init__(self, quiet_seconds=DEFAULT_QUIET_SECONDS, max_wait=DEFAULT_MAX_WAIT,
+                 probe=exclusive_probe, clock=time.monotonic, wall_clock=time.time, stat=os.stat):
+        self.quiet_seconds = quiet_seconds
+        self.max_wait = max_wait
+        self.probe = probe
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.stat = stat
+        # path -> [size, mtime, 最后一次变化的时间, 加入时间]
+        self._pending = {}
+        self._abandoned = []
+        self._lock = threading.Lock()
+
+    def add(self, path):
+        """登记（或重新登记）一个文件，只记录不阻塞，可以在监听线程里直接调用"""
+        with self._lock:
+            now = self.clock()
+            state = self._pending.get(path)
+            if state is None:
+                self._pending[path] = [None, None, now, now]
+            else:
+                state[2] = now
+
+    def discard(self, path):
+        with self._lock:
+            self._pending.pop(path, None)
+
+    def _abandon(self, path):
+        with self._lock:
+            if self._pending.pop(path, None) is not None:
+                self._abandoned.append(path)
+
+    def take_abandoned(self):
+        """取出被放弃的文件（已删除或一直没写完）"""
+        with self._lock:
+            abandoned, self._abandoned = self._abandoned, []
+        return abandoned
+
+    def take_pending(self):
+        """取出全部还没写完的文件（按加入顺序），停止时用"""
+        with self._lock:
+            pending, self._pending = list(self._pending), {}
+        return pending
+
+    def __len__(self):
+        return len(self._pending)
+
+    def poll(self):
+        """检查一遍所有待定文件，返回已经写入完成的文件列表"""
+        with self._lock:
+            items = list(self._pending.items())
+
+        now = self.clock()
+        ready = []
+        for path, state in items:
+            try:
+                st = self.stat(path)
+            except FileNotFoundError:
+                self._abandon(path)
+                continue
+            except OSError:
+                continue
+
+            size, mtime = st.st_size, st.st_mtime
+            first = state[0] is None
+            if first:
+                # 第一次检查：按文件自身的修改时间估算已经静止了多久（整个文件一次性复制进来时无需再等）
+                state[2] = now - max(0.0, self.wall_clock() - mtime)
+            elif (size, mtime) != (state[0], state[1]):
+                # 还在写入
+                state[2] = now
+            state[0], state[1] = size, mtime
+
+            quiet_for = now - state[2]
+            # 第一次检查只记录大小和修改时间，下一次检查确认没变才算写完
+            if not first and quiet_for >= self.quiet_seconds and self.probe(path):
+                self.discard(path)
+                ready.append(path)
+            elif now - state[3] >= self.max_wait:
+                logging.warning(f"⚠️ 文件 {self.max_wait} 秒内一直未写入完成，放弃打印: {path}")
+                self._abandon(path)
+        return ready
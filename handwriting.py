@@ -2,16 +2,21 @@ import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import random
+from functools import lru_cache
 
 
-def generate_signature_image(text, font_path, output_path="signature.png"):
+@lru_cache(maxsize=16)
+def load_font(font_path, font_size):
+    """加载 TrueType 字体，按 (路径, 字号) 缓存，批量生成时不用每张图都重新读字体文件"""
+    return ImageFont.truetype(font_path, font_size)
+
+
+def render_signature(text, font_path, font_size=80, img_width=400, img_height=150):
     # 1. 创建基本签名图像（白底 + 手写字体）
-    img_width, img_height = 400, 150
     img = Image.new("RGB", (img_width, img_height), color=(255, 255, 255))
     draw = ImageDraw.Draw(img)
 
-    font_size = 80
-    font = ImageFont.truetype(font_path, font_size)
+    font = load_font(font_path, font_size)
     # text_width, text_height = draw.textsize(text, font=font)
     bbox = draw.textbbox((0, 0), text, font=font)
     text_width = bbox[2] - bbox[0]
@@ -20,27 +25,45 @@ def generate_signature_image(text, font_path, output_path="signature.png"):
     x = (img_width - text_width) / 2
     y = (img_height - text_height) / 2
     draw.text((x, y), text, font=font, fill=(0, 0, 139))  # 深蓝墨水效果
+    return img
 
+
+def generate_signature_image(text, font_path, output_path="signature.png"):
+    img = render_signature(text, font_path)
     img.save(output_path)  # 初始图像保存
     return output_path
 
 
-def distort_image(image_path, output_path="signature_distorted.png"):
-    # 2. 使用 OpenCV 加载图像
-    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+@lru_cache(maxsize=32)
+def wave_maps(h, w, magnitude=5, period=50):
+    """
+    预先计算波浪扭曲的坐标映射：第 i 行整体左右平移 int(magnitude * sin(2πi/period)) 像素
+    移出图像范围的像素映射到 -1，remap 时按黑色边界填充（和原来逐像素循环的结果一致）
+    """
+    # 每行的偏移只有 h 个，按原来的标量公式计算，保证取整结果完全一致
+    offsets = np.array([int(magnitude * np.sin(2 * np.pi * i / period)) for i in range(h)], dtype=np.int64)
+    cols = np.arange(w, dtype=np.int64)[None, :] + offsets[:, None]
+    cols[(cols < 0) | (cols >= w)] = -1
+    map_x = cols.astype(np.float32)
+    map_y = np.repeat(np.arange(h, dtype=np.float32)[:, None], w, axis=1)
+    return map_x, map_y
+
+
+def wave_distort(img, magnitude=5):
+    """模拟波浪扭曲（模拟笔迹波动），一次向量化 remap 完成"""
+    h, w = img.shape[:2]
+    map_x, map_y = wave_maps(h, w, magnitude)
+    return cv2.remap(img, map_x, map_y, interpolation=cv2.INTER_NEAREST,
+                     borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def distort_array(img, seed=None):
+    """旋转 + 模糊 + 波浪扭曲，seed 相同时结果完全相同"""
+    rng = random.Random(seed) if seed is not None else random
     h, w = img.shape[:2]
-    # 3. 模拟波浪扭曲（模拟笔迹波动）
-    def wave_distort(img, magnitude=5):
-        distorted = np.zeros_like(img)
-        for i in range(h):
-            offset = int(magnitude * np.sin(2 * np.pi * i / 50))
-            for j in range(w):
-                if 0 <= j + offset < w:
-                    distorted[i, j] = img[i, (j + offset) % w]
-        return distorted
 
     # 4. 添加轻微旋转
-    angle = random.uniform(-5, 5)
+    angle = rng.uniform(-5, 5)
     M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1)
     img_rotated = cv2.warpAffine(img, M, (w, h), borderValue=(255, 255, 255))
 
@@ -54,6 +77,15 @@ def distort_image(image_path, output_path="signature_distorted.png"):
     # mask = np.random.randint(0, 2, (h, w), dtype=np.uint8) * 255
     # img_distorted[mask == 0] = 255
 
+    return img_distorted
+
+
+def distort_image(image_path, output_path="signature_distorted.png", seed=None):
+    # 2. 使用 OpenCV 加载图像
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    # 3. 旋转、模糊、波浪扭曲
+    img_distorted = distort_array(img, seed)
+
     # 8. 保存最终图像
     cv2.imwrite(output_path, img_distorted)
     print(f"伪造签名图像已保存：{output_path}")
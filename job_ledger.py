@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import time
+
+# 任务状态：已计划 -> 已提交打印 -> 已打印 -> 已归档
+PLANNED = "planned"
+SUBMITTED = "submitted"
+PRINTED = "printed"
+ARCHIVED = "archived"
+FAILED = "failed"
+
+
+class JobLedger:
+    """
+    记录每个文件打印进度的磁盘账本（SQLite，每次状态变化都落盘）
+    程序崩溃重启后，已打印但还没归档的文件只做归档，不会重复打印
+    已归档的记录只在本次运行中有用，一次运行结束时用 prune() 删掉，启动时也不读取，
+    启动开销只和上次没处理完的文件数有关，和历史上打印过多少文件无关
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        # isolation_level=None：每条语句自动提交，批量写入时再手动 BEGIN
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # FULL：每次提交都 fsync，断电也不会丢状态
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " path TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        # 状态常驻内存，查询是 O(1) 的字典查找，不用每个文件都查一次数据库
+        # 已归档的文件和没有记录一样（plan 会重新登记），不用读进来
+        self._status = dict(self.conn.execute("SELECT path, status FROM jobs WHERE status != ?", (ARCHIVED,)))
+
+    def status(self, path):
+        return self._status.get(path)
+
+    def plan(self, paths):
+        """
+        批量登记待打印文件（一个事务，一次 fsync）
+        已归档或失败的同名文件视为重新导出的新文件；打印中的状态保持不变
+        """
+        now = time.time()
+        rows = []
+        for path in paths:
+            if self._status.get(path) in (None, ARCHIVED, FAILED):
+                rows.append((path, PLANNED, now))
+        if not rows:
+            return 0
+
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(
+                "INSERT INTO jobs (path, status, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET status = excluded.status, updated = excluded.updated",
+                rows,
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        for path, status, _ in rows:
+            self._status[path] = status
+        return len(rows)
+
+    def mark(self, path, status):
+        """记录单个文件的状态变化，返回前已经 fsync 到磁盘"""
+        self.conn.execute(
+            "INSERT INTO jobs (path, status, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET status = excluded.status, updated = excluded.updated",
+            (path, status, time.time()),
+        )
+        self._status[path] = status
+
+    def counts(self):
+        result = {}
+        for status in self._status.values():
+            result[status] = result.get(status, 0) + 1
+        return result
+
+    def pending(self):
+        """还没有归档的文件"""
+        return [path for path, status in self._status.items() if status != ARCHIVED]
+
+    def prune(self):
+        """删除已归档的记录（一次运行结束时调用），返回删除的条数"""
+        deleted = self.conn.execute("DELETE FROM jobs WHERE status = ?", (ARCHIVED,)).rowcount
+        self._status = {path: status for path, status in self._status.items() if status != ARCHIVED}
+        return deleted
+
+    def close(self):
+        self.conn.close()
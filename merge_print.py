@@ -0,0 +1,79 @@
+import logging
+import os
+import shutil
+
+# Excel ExportAsFixedFormat 的类型：0 = xlTypePDF
+XL_TYPE_PDF = 0
+
+
+def merge_pdfs(paths, output_path):
+    """
+    按顺序把多个 PDF 合并成一个文件，返回总页数
+    内存：add_page 会把页面（包括内容流）复制进 writer，合并结果在写出前整份留在内存里，
+    占用和合并后的文档大小相当；一个诊所目录通常只有几十页，所以不分段写。
+    每个源文件加完页面后马上关闭，不会同时打开所有源文件和它们的对象缓存
+    结果先写临时文件再改名：中途失败时不会留下写了一半的合并文件，也不会覆盖已有的同名文件
+    """
+    # 只有开启合并打印时才需要 pypdf
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    pages = 0
+    tmp_path = output_path + ".tmp"
+    try:
+        for path in paths:
+            with open(path, "rb") as f:
+                for page in PdfReader(f).pages:
+                    writer.add_page(page)
+                    pages += 1
+
+        with open(tmp_path, "wb") as out:
+            writer.write(out)
+        os.replace(tmp_path, output_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        writer.close()
+    return pages
+
+
+def export_excel_pdf(wb, pdf_path, first_page_only=True):
+    """把已经设置好页面的工作簿导出成 PDF（和 PrintOut(From=1, To=1) 打印的内容一致）"""
+    if first_page_only:
+        wb.ExportAsFixedFormat(XL_TYPE_PDF, pdf_path, From=1, To=1)
+    else:
+        wb.ExportAsFixedFormat(XL_TYPE_PDF, pdf_path)
+    return pdf_path
+
+
+def reset_merge_dir(merge_dir):
+    """清空上次运行留下的合并文件（打印程序可能还在读取本次的文件，所以只在启动时清理）"""
+    if os.path.isdir(merge_dir):
+        shutil.rmtree(merge_dir, ignore_errors=True)
+    os.makedirs(merge_dir, exist_ok=True)
+
+
+def build_directory_document(jobs, merge_dir, name, convert_excel):
+    """
+    把一个目录要打印的文件合并成一个 PDF
+    jobs: [(完整路径, 类型, 是否月结单), ...]，按打印顺序
+    convert_excel(path, use_alt, pdf_path) 负责把 Excel 转成 PDF
+    返回 (合并后的文件路径, 总页数)
+    """
+    parts = []
+    for index, (path, kind, is_monthly) in enumerate(jobs):
+        if kind == "pdf":
+            parts.append(path)
+        elif kind == "excel":
+            pdf_path = os.path.join(merge_dir, f"{name}_{index:04d}.pdf")
+            convert_excel(path, is_monthly, pdf_path)
+            parts.append(pdf_path)
+        else:
+            raise ValueError(f"不支持合并的文件类型: {path}")
+
+    output_path = os.path.join(merge_dir, f"{name}_合并.pdf")
+    pages = merge_pdfs(parts, output_path)
+    logging.info(f"📚 已合并 {len(parts)} 个文件，共 {pages} 页: {output_path}")
+    return output_path, pages
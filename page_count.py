@@ -0,0 +1,321 @@
+import logging
+import math
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import zipfile
+from xml.etree.ElementTree import fromstring, iterparse
+
+# ---------- PDF ----------
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_XREF_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)\s*[\r\n]")
+_XREF_ENTRY = re.compile(rb"\s*(\d{10})\s(\d{5})\s([nf])")
+_ROOT = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_PAGES = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+_COUNT = re.compile(rb"/Count\s+(\d+)")
+_TYPE_PAGES = re.compile(rb"/Type\s*/Pages\b")
+
+
+def _read_xref_table(mm, offset, offsets):
+    """读取一个传统 xref 表（以及它的 trailer），返回 trailer 字典的原始内容；不是 xref 表时返回 None"""
+    if mm[offset:offset + 4] != b"xref":
+        return None
+    pos = offset + 4
+    while True:
+        m = _XREF_SUBSECTION.match(mm, pos)
+        if not m:
+            break
+        start, count = int(m.group(1)), int(m.group(2))
+        pos = m.end()
+        for i in range(count):
+            entry = _XREF_ENTRY.match(mm, pos)
+            if not entry:
+                return None
+            # 从最新的 xref 往旧的读，同一个对象以最新的位置为准
+            if entry.group(3) == b"n":
+                offsets.setdefault(start + i, int(entry.group(1)))
+            pos = entry.end()
+    trailer = mm.find(b"trailer", pos)
+    if trailer < 0:
+        return None
+    end = mm.find(b"startxref", trailer)
+    return mm[trailer:end if end > 0 else len(mm)]
+
+
+def _read_object(mm, offsets, number):
+    offset = offsets.get(number)
+    if offset is None:
+        return None
+    end = mm.find(b"endobj", offset)
+    return mm[offset:end if end > 0 else len(mm)]
+
+
+def _pdf_count_from_xref(mm):
+    """startxref -> xref 表 -> trailer /Root -> 目录 /Pages -> /Count，只读几个对象"""
+    m = None
+    for m in _STARTXREF.finditer(mm, max(0, len(mm) - 2048)):
+        pass
+    if m is None:
+        return None
+
+    offsets = {}
+    root = None
+    offset = int(m.group(1))
+    seen = set()
+    while offset is not None and offset not in seen and offset < len(mm):
+        seen.add(offset)
+        trailer = _read_xref_table(mm, offset, offsets)
+        if trailer is None:
+            # PDF 1.5 以后的交叉引用流（压缩的 xref），交给下面的扫描处理
+            return None
+        if root is None:
+            found = _ROOT.search(trailer)
+            root = int(found.group(1)) if found else None
+        prev = _PREV.search(trailer)
+        offset = int(prev.group(1)) if prev else None
+
+    catalog = _read_object(mm, offsets, root) if root is not None else None
+    pages_ref = _PAGES.search(catalog) if catalog else None
+    pages = _read_object(mm, offsets, int(pages_ref.group(1))) if pages_ref else None
+    count = _COUNT.search(pages) if pages else None
+    return int(count.group(1)) if count else None
+
+
+def _pdf_count_from_scan(mm):
+    """没有传统 xref 表时：找所有 /Type /Pages 节点，根节点的 /Count 最大"""
+    best = None
+    for m in _TYPE_PAGES.finditer(mm):
+        start = mm.rfind(b"obj", 0, m.start())
+        end = mm.find(b"endobj", m.end())
+        count = _COUNT.search(mm[max(0, start):end if end > 0 else len(mm)])
+        if count:
+            best = max(best or 0, int(count.group(1)))
+    return best
+
+
+def pdf_page_count(path):
+    """
+    读取 PDF 页数：mmap 文件后按 startxref / trailer 找到页面树根节点的 /Count，不解析整个文件
+    对象被压缩在对象流里时才用 pypdf（如果安装了）完整读取
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            count = _pdf_count_from_xref(mm)
+            if count is None:
+                count = _pdf_count_from_scan(mm)
+    if count is not None:
+        return count
+
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    return len(PdfReader(path).pages)
+
+
+# ---------- XLSX ----------
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_CELL_REF = re.compile(r"([A-Z]+)(\d+)")
+
+# 纸张尺寸（毫米，纵向）：9 = A4，132 = 132 列针式打印纸（15 × 11 英寸）
+PAPER_SIZES_MM = {9: (210.0, 297.0), 132: (381.0, 279.4)}
+# Excel 默认的“普通”页边距（磅）：左右各 0.7 英寸，上下各 0.75 英寸
+MARGIN_WIDTH_PT = 2 * 0.7 * 72
+MARGIN_HEIGHT_PT = 2 * 0.75 * 72
+DEFAULT_COL_WIDTH = 8.43
+DEFAULT_ROW_HEIGHT = 15.0
+
+
+def _column_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+def _col_width_pt(chars):
+    """列宽（字符数）换算成磅，按默认字体 Calibri 11 每个字符 7 像素 + 5 像素边距"""
+    return (chars * 7 + 5) * 0.75
+
+
+def visible_sheets(zf):
+    """按工作簿里的顺序返回可见工作表的 XML 路径（隐藏的工作表不会打印）"""
+    workbook = fromstring(zf.read("xl/workbook.xml"))
+    rels = fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{_PKG_REL_NS}Relationship")}
+    result = []
+    for sheet in workbook.iter(f"{_NS}sheet"):
+        if sheet.get("state") in ("hidden", "veryHidden"):
+            continue
+        target = targets.get(sheet.get(f"{_REL_NS}id"))
+        if not target:
+            continue
+        target = target.lstrip("/")
+        result.append(target if target.startswith("xl/") else f"xl/{target}")
+    return result
+
+
+def _sheet_extent(stream):
+    """
+    流式读取工作表 XML，返回已用区域的 (宽, 高)，单位磅；空表返回 (0, 0)
+    不把整个工作表读进内存，读过的行立即释放
+    """
+    default_width = DEFAULT_COL_WIDTH
+    default_height = DEFAULT_ROW_HEIGHT
+    columns = []
+    heights = {}
+    max_row = max_col = 0
+
+    for _, elem in iterparse(stream, events=("end",)):
+        tag = elem.tag
+        if tag == f"{_NS}c":
+            if len(elem):
+                m = _CELL_REF.match(elem.get("r", ""))
+                if m:
+                    max_col = max(max_col, _column_index(m.group(1)))
+                    max_row = max(max_row, int(m.group(2)))
+        elif tag == f"{_NS}row":
+            r = int(elem.get("r", 0) or 0)
+            if elem.get("hidden") in ("1", "true"):
+                heights[r] = 0.0
+            elif elem.get("ht"):
+                heights[r] = float(elem.get("ht"))
+            elem.clear()
+        elif tag == f"{_NS}col":
+            width = 0.0 if elem.get("hidden") in ("1", "true") else float(elem.get("width", default_width))
+            columns.append((int(elem.get("min")), int(elem.get("max")), width))
+        elif tag == f"{_NS}sheetFormatPr":
+            default_height = float(elem.get("defaultRowHeight", default_height))
+            default_width = float(elem.get("defaultColWidth", elem.get("baseColWidth", default_width)))
+
+    if not max_row:
+        return 0.0, 0.0
+
+    width = 0.0
+    covered = 0
+    for low, high, chars in columns:
+        low, high = max(1, low), min(max_col, high)
+        if low <= high:
+            width += (high - low + 1) * _col_width_pt(chars)
+            covered += high - low + 1
+    width += (max_col - covered) * _col_width_pt(default_width)
+
+    height = sum(heights.get(r, default_height) for r in range(1, max_row + 1))
+    return width, height
+
+
+def xlsx_page_estimate(path, paper_size=9, zoom=100, fit_to_page=False):
+    """
+    估算 xlsx 打印页数：按代码会设置的纸张 / 缩放，计算每个可见工作表已用区域需要几页
+    fit_to_page=True 对应 FitToPagesWide = FitToPagesTall = 1，每个有内容的工作表一页
+    """
+    paper_w, paper_h = PAPER_SIZES_MM.get(paper_size, PAPER_SIZES_MM[9])
+    usable_w = paper_w / 25.4 * 72 - MARGIN_WIDTH_PT
+    usable_h = paper_h / 25.4 * 72 - MARGIN_HEIGHT_PT
+    scale = (zoom or 100) / 100.0
+
+    pages = 0
+    with zipfile.ZipFile(path) as zf:
+        for name in visible_sheets(zf):
+            with zf.open(name) as stream:
+                width, height = _sheet_extent(stream)
+            if not height:
+                continue
+            if fit_to_page:
+                pages += 1
+            else:
+                pages += math.ceil(width * scale / usable_w) * math.ceil(height * scale / usable_h)
+    return pages
+
+
+# ---------- 缓存 ----------
+
+class PageCounter:
+    """
+    页数服务：PDF 读 /Count，xlsx 按页面设置估算；结果按 (路径, 大小, 修改时间) 缓存在 SQLite 里，
+    文件没有变化时重复运行直接命中缓存（启动时整张表读进内存，查询是字典查找）
+    db_path 为 None 时只缓存在内存里
+    """
+
+    def __init__(self, db_path=None):
+        self._lock = threading.Lock()
+        self._cache = {}
+        self.conn = None
+        self.hits = 0
+        self.misses = 0
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            # 只是缓存，丢了可以重新计算，不需要每次 fsync
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " path TEXT NOT NULL,"
+                " variant TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " pages INTEGER NOT NULL,"
+                " PRIMARY KEY (path, variant))"
+            )
+            for path, variant, size, mtime_ns, pages in self.conn.execute("SELECT * FROM pages"):
+                self._cache[(path, variant)] = (size, mtime_ns, pages)
+
+    def count(self, path, paper_size=None, zoom=None, fit_to_page=False):
+        """
+        返回打印页数，无法识别（.xls、损坏的文件等）时返回 None
+        paper_size / zoom / fit_to_page 只影响 xlsx 的估算，和打印时设置的 PageSetup 保持一致
+        """
+        lower = path.lower()
+        if lower.endswith(".pdf"):
+            variant = "pdf"
+        elif lower.endswith(".xlsx"):
+            variant = f"xlsx:{paper_size}:{zoom}:{int(bool(fit_to_page))}"
+        else:
+            return None
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (os.path.abspath(path), variant)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            self.hits += 1
+            return cached[2]
+
+        self.misses += 1
+        try:
+            if variant == "pdf":
+                pages = pdf_page_count(path)
+            else:
+                pages = xlsx_page_estimate(path, paper_size or 9, zoom or 100, fit_to_page)
+        except Exception as e:
+            logging.warning(f"⚠️ 无法读取页数: {path} - {e}")
+            return None
+        if pages is None:
+            return None
+
+        with self._lock:
+            self._cache[key] = (st.st_size, st.st_mtime_ns, pages)
+            if self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO pages (path, variant, size, mtime_ns, pages) VALUES (?, ?, ?, ?, ?)",
+                    (key[0], variant, st.st_size, st.st_mtime_ns, pages),
+                )
+        return pages
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import re
+import threading
+import zipfile
+
+from page_count import visible_sheets
+
+# 设置顺序有讲究：先关掉 Zoom，FitToPages 才会生效
+PAGE_SETUP_PROPERTIES = ("PaperSize", "Zoom", "FitToPagesWide", "FitToPagesTall", "Orientation")
+# 打印机不支持目标纸张时改用 A4
+FALLBACK_PAPER_SIZE = 9
+
+_PAGE_SETUP_TAG = re.compile(rb"<(?:\w+:)?pageSetup\b[^>]*>")
+_PAGE_SETUP_PR_TAG = re.compile(rb"<(?:\w+:)?pageSetUpPr\b[^>]*>")
+
+
+def template_fingerprint(path):
+    """
+    工作簿模板的指纹：可见工作表的路径 + 每个表原有的 pageSetup 设置（直接从 xlsx 的 XML 里取，不经过 Excel）
+    指纹相同的工作簿打开后页面设置相同，需要改哪些属性只用算一次；不是 xlsx 时返回 None
+    """
+    if not path.lower().endswith(".xlsx"):
+        return None
+    try:
+        digest = hashlib.blake2b(digest_size=16)
+        with zipfile.ZipFile(path) as zf:
+            for name in visible_sheets(zf):
+                data = zf.read(name)
+                digest.update(name.encode("utf-8"))
+                for pattern in (_PAGE_SETUP_PR_TAG, _PAGE_SETUP_TAG):
+                    m = pattern.search(data)
+                    digest.update(m.group(0) if m else b"-")
+        return digest.hexdigest()
+    except Exception:
+        return None
+
+
+def _disable_print_communication(excel):
+    """关闭 PrintCommunication，页面设置先缓存在 Excel 里；Excel 2007 及更早版本没有这个属性"""
+    try:
+        excel.PrintCommunication = False
+        return True
+    except Exception:
+        return False
+
+
+class PageSetupCache:
+    """
+    批量设置工作表页面：
+        - 关闭 PrintCommunication 后再写，所有属性在重新开启时一次性提交给打印机驱动
+        - 已经是目标值的属性不写
+        - 每台打印机是否支持某种纸张只试一次（原来每个工作表都靠异常重新发现 132 不支持）
+        - 同一模板（template_fingerprint 相同）的工作簿，需要写哪些属性只算一次，之后不再逐个读取
+    可以在多个 Excel 流水线线程里共用
+    """
+
+    def __init__(self, fingerprint=template_fingerprint):
+        self.fingerprint = fingerprint
+        self._layouts = {}
+        self._paper_supported = {}
+        self._lock = threading.Lock()
+        self.template_hits = 0
+        self.template_misses = 0
+
+    def paper_supported(self, printer, paper_size):
+        """打印机是否支持这种纸张：True / False，还没试过时返回 None"""
+        return self._paper_supported.get((printer, paper_size))
+
+    def _resolve_targets(self, printer, targets):
+        paper = targets.get("PaperSize")
+        if paper is not None and self._paper_supported.get((printer, paper)) is False:
+            targets = dict(targets, PaperSize=FALLBACK_PAPER_SIZE)
+        return targets
+
+    @staticmethod
+    def _diff(sheets, targets):
+        """逐个读取当前值，返回需要写入的 [(工作表序号, [(属性, 值), ...]), ...]"""
+        writes = []
+        for index, sheet in enumerate(sheets):
+            page_setup = sheet.PageSetup
+            changes = []
+            for name in PAGE_SETUP_PROPERTIES:
+                if name in targets and getattr(page_setup, name) != targets[name]:
+                    changes.append((name, targets[name]))
+            if changes:
+                writes.append((index, changes))
+        return writes
+
+    def _probe_paper(self, sheets, printer, writes, targets):
+        """
+        打印机第一次遇到这种纸张时，在 PrintCommunication 开启的状态下单独写一次，确认驱动是否支持
+        不支持时改用 A4，并重新计算需要写入的属性
+        返回 (writes, targets, 已经写过纸张的工作表序号)，写入失败或没有试写时序号为 None
+        """
+        paper = targets.get("PaperSize")
+        for index, changes in writes:
+            if ("PaperSize", paper) in changes:
+                try:
+                    sheets[index].PageSetup.PaperSize = paper
+                    supported = True
+                except Exception as e:
+                    logging.warning(f"⚠️ 打印机 {printer} 不支持纸张 {paper}，改用 A4: {e}")
+                    supported = False
+                with self._lock:
+                    self._paper_supported[(printer, paper)] = supported
+                if supported:
+                    return writes, targets, index
+                targets = dict(targets, PaperSize=FALLBACK_PAPER_SIZE)
+                return self._diff(sheets, targets), targets, None
+        return writes, targets, None
+
+    def apply(self, excel, wb, path, printer, targets):
+        """
+        把 targets（{属性: 值}）写到工作簿的每个工作表
+        excel 是 Excel.Application，用来切换 PrintCommunication；返回实际写入的属性个数
+        """
+        targets = self._resolve_targets(printer, targets)
+        # COM 集合只遍历一次，之后按序号取
+        sheets = list(wb.Sheets)
+        fingerprint = self.fingerprint(path) if self.fingerprint else None
+        key = (fingerprint, printer, tuple(sorted(targets.items()))) if fingerprint else None
+
+        with self._lock:
+            writes = self._layouts.get(key) if key else None
+        probed = None
+        if writes is not None:
+            self.template_hits += 1
+        else:
+            self.template_misses += 1
+            writes = self._diff(sheets, targets)
+            paper = targets.get("PaperSize")
+            if paper is not None and self._paper_supported.get((printer, paper)) is None:
+                writes, targets, probed = self._probe_paper(sheets, printer, writes, targets)
+                key = (fingerprint, printer, tuple(sorted(targets.items()))) if fingerprint else None
+            if key:
+                with self._lock:
+                    self._layouts[key] = writes
+
+        count = 0
+        if probed is not None:
+            # 试写成功的工作表纸张已经是目标值，这次不再写第二遍；缓存的 writes 保持完整，给同模板的其他工作簿用
+            count = 1
+            writes = [(index, [(name, value) for name, value in changes if index != probed or name != "PaperSize"])
+                      for index, changes in writes]
+            writes = [(index, changes) for index, changes in writes if changes]
+        if not writes:
+            return count
+
+        batched = _disable_print_communication(excel)
+        try:
+            for index, changes in writes:
+                page_setup = sheets[index].PageSetup
+                for name, value in changes:
+                    setattr(page_setup, name, value)
+                    count += 1
+        finally:
+            if batched:
+                excel.PrintCommunication = True
+        return count
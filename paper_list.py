@@ -1,19 +1,19 @@
 import sys
-import win32print
+
+from printer_catalog import PrinterCatalog, Win32PrinterBackend
 
 
 def main():
-    PRINTER_NAME = win32print.GetDefaultPrinter()
+    catalog = PrinterCatalog(Win32PrinterBackend())
+    PRINTER_NAME = sys.argv[1] if len(sys.argv) > 1 else catalog.default_printer()
     try:
-        hprinter = win32print.OpenPrinter(PRINTER_NAME)
-        printer_info = win32print.GetPrinter(hprinter, 2)
-        # 获取打印机支持的纸张数量
-        level = 1
-        forms = win32print.EnumForms(hprinter)
+        # 支持只写打印机名称的一部分
+        PRINTER_NAME = catalog.find(PRINTER_NAME) or PRINTER_NAME
+        forms = catalog.forms(PRINTER_NAME)
         print(f"\n打印机 '{PRINTER_NAME}' 支持的纸张大小:")
         for i, form in enumerate(forms, 1):
             print(
-                f"{i}. {form['Name']} (宽度: {form['Size']['cx'] / 1000:.1f}cm × 高度: {form['Size']['cy'] / 1000:.1f}cm)")
+                f"{i}. {form['name']} (宽度: {form['width'] / 1000:.1f}cm × 高度: {form['height'] / 1000:.1f}cm)")
     except Exception as e:
         print(f"设置纸张大小时出错: {e}")
         sys.exit(1)
@@ -0,0 +1,501 @@
+"""
+常驻打印服务：解释器、打印机信息和 Excel 实例一直保持热状态，客户端通过本机 socket 提交任务
+避免每次运行 pyinstaller -F 打包的程序都要解压、导入 pywin32、重新启动 Excel
+
+    python auto_printer.py --daemon                 启动服务（Windows）
+    python print_daemon.py submit <文件或目录>...    提交打印
+    python print_daemon.py status [任务编号]
+    python print_daemon.py cancel <任务编号>
+    python print_daemon.py shutdown
+    python print_daemon.py --name batch_printer ...  连接 batch_printer.exe --daemon 启动的服务
+
+安全：
+    - 消息是一行一个 JSON，不用 pickle，收到的数据不会被当成代码执行
+    - 服务目录只有当前用户能访问（Windows: %LOCALAPPDATA%\\auto_printer，其他系统: 权限 0700 的私有目录）
+    - 第一次启动时生成随机密钥保存在服务目录里（权限 0600），连接时用 HMAC 质询应答验证，密钥本身不在连接上传输
+    - Windows 上监听 127.0.0.1 的随机端口（写在服务目录里），其他系统用服务目录里的 UNIX socket
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import os
+import queue
+import secrets
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+
+from print_plan import build_plan, classify
+
+DEFAULT_NAME = "auto_printer"
+# 最多保留多少个已结束任务的状态
+DEFAULT_HISTORY = 1000
+# 一条消息最多多少字节，超过时断开连接
+MAX_MESSAGE_BYTES = 1024 * 1024
+# 连接后多少秒内必须完成认证
+AUTH_TIMEOUT = 10
+KEY_FILE = "daemon.key"
+
+QUEUED = "queued"
+PRINTING = "printing"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class DaemonAuthError(Exception):
+    """客户端认证失败"""
+
+
+class MessageTooLarge(ValueError):
+    """消息超过 MAX_MESSAGE_BYTES，连接里剩下的数据已经对不上，只能断开"""
+
+
+def daemon_dir():
+    """当前用户私有的服务目录"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "auto_printer")
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "auto_printer")
+    return os.path.join(tempfile.gettempdir(), f"auto_printer-{os.getuid()}")
+
+
+def ensure_private_dir(directory):
+    """创建服务目录；已经存在时确认属于当前用户并且其他用户不能访问"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if sys.platform == "win32":
+        # %LOCALAPPDATA% 默认只有当前用户能访问
+        return directory
+    st = os.lstat(directory)
+    if st.st_uid != os.getuid() or not os.path.isdir(directory) or os.path.islink(directory):
+        raise PermissionError(f"服务目录不属于当前用户: {directory}")
+    if st.st_mode & 0o077:
+        os.chmod(directory, 0o700)
+    return directory
+
+
+def load_secret(directory, create=False):
+    """读取服务目录里的密钥；create=True 时没有就生成一个（只有当前用户可读）"""
+    path = os.path.join(directory, KEY_FILE)
+    if create and not os.path.exists(path):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass
+        else:
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+    with open(path) as f:
+        return f.read().strip().encode("ascii")
+
+
+def _endpoint_path(directory, name):
+    return os.path.join(directory, f"{name}.json")
+
+
+def _sign(secret, challenge):
+    return hmac.new(secret, challenge.encode("ascii"), hashlib.sha256).hexdigest()
+
+
+def send_message(stream, message):
+    stream.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def recv_message(stream):
+    """读一条消息；对方关闭连接时返回 None，消息过长时抛出 MessageTooLarge，不是 JSON 对象时抛出 ValueError"""
+    line = stream.readline(MAX_MESSAGE_BYTES + 1)
+    if not line:
+        return None
+    if len(line) > MAX_MESSAGE_BYTES:
+        raise MessageTooLarge("消息过长")
+    message = json.loads(line.decode("utf-8"))
+    if not isinstance(message, dict):
+        raise ValueError("消息必须是 JSON 对象")
+    return message
+
+
+def expand_paths(paths):
+    """把提交的路径展开成 [(文件, 类型), ...]；目录按 build_plan 的顺序展开，只保留 PDF / Excel"""
+    result = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for directory in build_plan(path)["directories"]:
+                for job in directory["files"]:
+                    if job["kind"] in ("pdf", "excel"):
+                        result.append((os.path.join(directory["path"], job["name"]), job["kind"]))
+        else:
+            kind = classify(os.path.basename(path))
+            if kind in ("pdf", "excel"):
+                result.append((path, kind))
+    return result
+
+
+class PrintDaemon:
+    """
+    print_func(path, kind, **options) -> bool 在唯一的打印线程里执行，Excel 会话常驻在这个线程
+    请求和响应都是 JSON 对象：
+        {"op": "submit", "paths": [...], "options": {...}}  -> {"ok": True, "jobs": [编号, ...]}
+        {"op": "status", "job": 编号/null}                   -> {"ok": True, "jobs": [任务, ...], "queued": n}
+        {"op": "cancel", "job": 编号}                        -> {"ok": 是否取消成功}（只能取消还没开始打印的任务）
+        {"op": "shutdown"}
+    options 原样传给 print_func（例如 batch_printer 的 monthly），只接受字符串键和 JSON 基本类型的值
+    name 区分同一个用户的多个服务（auto_printer / batch_printer），directory 默认是 daemon_dir()
+    """
+
+    def __init__(self, print_func, name=DEFAULT_NAME, directory=None, history=DEFAULT_HISTORY, worker_exit=None):
+        self.print_func = print_func
+        self.name = name
+        self.directory = directory or daemon_dir()
+        self.history = history
+        self.worker_exit = worker_exit
+        self.address = None
+        self._secret = None
+        self._jobs = OrderedDict()
+        self._finished = deque()
+        self._ids = itertools.count(1)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._listener = None
+        self._worker = None
+
+    # ---------- 任务 ----------
+
+    def submit(self, paths, options=None):
+        options = {key: value for key, value in (options or {}).items()
+                   if isinstance(key, str) and isinstance(value, (str, int, float, bool, type(None)))}
+        ids = []
+        with self._lock:
+            for path, kind in expand_paths(paths):
+                job = {"id": next(self._ids), "path": path, "kind": kind, "options": options, "state": QUEUED,
+                       "submitted": time.time(), "finished": None, "error": None}
+                self._jobs[job["id"]] = job
+                self._queue.put(job)
+                ids.append(job["id"])
+        if ids:
+            logging.info(f"📥 收到 {len(ids)} 个打印任务")
+        return ids
+
+    def status(self, job_id=None):
+        with self._lock:
+            if job_id is None:
+                jobs = list(self._jobs.values())
+            else:
+                jobs = [self._jobs[job_id]] if job_id in self._jobs else []
+            return [dict(job) for job in jobs]
+
+    def queued(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["state"] == QUEUED)
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["state"] != QUEUED:
+                return False
+            self._set_finished(job, CANCELLED)
+            return True
+
+    def _set_finished(self, job, state, error=None):
+        job["state"] = state
+        job["error"] = error
+        job["finished"] = time.time()
+        # 只保留最近的已结束任务
+        self._finished.append(job["id"])
+        while len(self._finished) > self.history:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    def _finish(self, job, state, error=None):
+        with self._lock:
+            self._set_finished(job, state, error)
+
+    def _work(self):
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    break
+                with self._lock:
+                    if job["state"] != QUEUED:
+                        continue
+                    job["state"] = PRINTING
+                try:
+                    ok = self.print_func(job["path"], job["kind"], **job["options"])
+                    self._finish(job, DONE if ok else FAILED)
+                except Exception as e:
+                    logging.error(f"❌ 打印失败: {job['path']} - {e}")
+                    self._finish(job, FAILED, str(e))
+        finally:
+            if self.worker_exit:
+                self.worker_exit()
+
+    # ---------- 连接 ----------
+
+    @staticmethod
+    def _job_id(request, required=False):
+        """请求里的任务编号：整数，或者（required=False 时）省略 / null；其他值抛出 ValueError"""
+        job_id = request.get("job")
+        if job_id is None and not required:
+            return None
+        if not isinstance(job_id, int) or isinstance(job_id, bool):
+            raise ValueError("job 必须是任务编号（整数）")
+        return job_id
+
+    def handle(self, request):
+        """处理一个请求，返回响应；请求格式不对时返回 {"ok": False, "error": ...}，不会抛出异常"""
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "请求必须是 JSON 对象"}
+        try:
+            return self._handle(request)
+        except ValueError as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            logging.error(f"❌ 处理请求失败: {request.get('op')} - {e}")
+            return {"ok": False, "error": f"处理请求失败: {e}"}
+
+    def _handle(self, request):
+        op = request.get("op")
+        if op == "submit":
+            paths = request.get("paths")
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                return {"ok": False, "error": "paths 必须是字符串列表"}
+            options = request.get("options")
+            return {"ok": True, "jobs": self.submit(paths, options if isinstance(options, dict) else None)}
+        if op == "status":
+            return {"ok": True, "jobs": self.status(self._job_id(request)), "queued": self.queued()}
+        if op == "cancel":
+            return {"ok": self.cancel(self._job_id(request, required=True))}
+        if op == "shutdown":
+            self._stopping.set()
+            return {"ok": True}
+        return {"ok": False, "error": f"未知的请求: {op}"}
+
+    def _authenticate(self, stream):
+        challenge = secrets.token_hex(16)
+        send_message(stream, {"challenge": challenge})
+        reply = recv_message(stream)
+        signature = reply.get("auth") if reply else None
+        if not isinstance(signature, str) or not hmac.compare_digest(signature, _sign(self._secret, challenge)):
+            raise DaemonAuthError("认证失败")
+        send_message(stream, {"ok": True})
+
+    def _serve_connection(self, conn):
+        with conn, conn.makefile("rwb") as stream:
+            try:
+                conn.settimeout(AUTH_TIMEOUT)
+                self._authenticate(stream)
+                conn.settimeout(None)
+                while True:
+                    try:
+                        request = recv_message(stream)
+                    except MessageTooLarge:
+                        raise
+                    except ValueError as e:
+                        # 一行不是 JSON 对象：回复错误，连接继续可用
+                        send_message(stream, {"ok": False, "error": f"无法解析的请求: {e}"})
+                        continue
+                    if request is None:
+                        break
+                    send_message(stream, self.handle(request))
+                    if self._stopping.is_set():
+                        break
+            except DaemonAuthError:
+                logging.warning("⚠️ 拒绝了一个认证失败的连接")
+            except (ValueError, OSError) as e:
+                logging.warning(f"⚠️ 连接异常，已断开: {e}")
+
+    def start(self):
+        ensure_private_dir(self.directory)
+        self._secret = load_secret(self.directory, create=True)
+        if sys.platform == "win32":
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # 只监听本机回环地址，端口由系统分配
+            listener.bind(("127.0.0.1", 0))
+            self.address = listener.getsockname()[:2]
+            endpoint = {"family": "tcp", "address": list(self.address)}
+        else:
+            self.address = os.path.join(self.directory, f"{self.name}.sock")
+            if os.path.exists(self.address):
+                # 上次异常退出留下的 socket 文件
+                os.unlink(self.address)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.address)
+            os.chmod(self.address, 0o600)
+            endpoint = {"family": "unix", "address": self.address}
+        listener.listen()
+        # accept() 定时返回，检查是否要停止
+        listener.settimeout(0.5)
+        self._listener = listener
+
+        endpoint_path = _endpoint_path(self.directory, self.name)
+        tmp_path = endpoint_path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(dict(endpoint, pid=os.getpid()), f)
+        os.replace(tmp_path, endpoint_path)
+
+        self._worker = threading.Thread(target=self._work, name="print-daemon-worker", daemon=True)
+        self._worker.start()
+        logging.info(f"🟢 打印服务已启动: {self.address}")
+
+    def serve_forever(self):
+        if self._listener is None:
+            self.start()
+        try:
+            while not self._stopping.is_set():
+                try:
+                    conn, _ = self._listener.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    if self._stopping.is_set():
+                        break
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        """停止接收新连接，已经排队的任务打印完后退出"""
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            for path in (_endpoint_path(self.directory, self.name),
+                         self.address if isinstance(self.address, str) else None):
+                if path:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+        logging.info("🔴 打印服务已停止")
+
+
+class DaemonClient:
+    """连接常驻打印服务的客户端；服务没有运行时抛出 OSError"""
+
+    def __init__(self, name=DEFAULT_NAME, directory=None, timeout=None):
+        directory = directory or daemon_dir()
+        with open(_endpoint_path(directory, name), encoding="utf-8") as f:
+            endpoint = json.load(f)
+        secret = load_secret(directory)
+        if endpoint["family"] == "unix":
+            self._conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = endpoint["address"]
+        else:
+            self._conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = tuple(endpoint["address"])
+        self._conn.settimeout(timeout)
+        try:
+            self._conn.connect(address)
+            self._stream = self._conn.makefile("rwb")
+            challenge = recv_message(self._stream)
+            if not challenge or "challenge" not in challenge:
+                raise ConnectionError("打印服务没有响应")
+            send_message(self._stream, {"auth": _sign(secret, challenge["challenge"])})
+            if not (recv_message(self._stream) or {}).get("ok"):
+                raise ConnectionError("打印服务拒绝了连接")
+        except Exception:
+            self._conn.close()
+            raise
+
+    def _call(self, **request):
+        send_message(self._stream, request)
+        response = recv_message(self._stream)
+        if response is None:
+            raise ConnectionError("打印服务已断开")
+        return response
+
+    def submit(self, paths, options=None):
+        request = {"op": "submit", "paths": [os.path.abspath(p) for p in paths]}
+        if options:
+            request["options"] = options
+        return self._call(**request)["jobs"]
+
+    def status(self, job_id=None):
+        return self._call(op="status", job=job_id)
+
+    def cancel(self, job_id):
+        return self._call(op="cancel", job=job_id)["ok"]
+
+    def wait(self, job_ids, interval=0.2, timeout=None):
+        """等任务全部结束（完成 / 失败 / 取消），返回 {编号: 任务}；超时时返回 None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending = set(job_ids)
+        finished = {}
+        while pending:
+            for job in self.status()["jobs"]:
+                if job["id"] in pending and job["state"] in FINISHED:
+                    finished[job["id"]] = job
+                    pending.discard(job["id"])
+            if not pending:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(interval)
+        return finished
+
+    def shutdown(self):
+        return self._call(op="shutdown")["ok"]
+
+    def close(self):
+        self._stream.close()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    commands = ("submit", "status", "cancel", "shutdown")
+    args = sys.argv[1:]
+    name = DEFAULT_NAME
+    if len(args) >= 2 and args[0] == "--name":
+        name, args = args[1], args[2:]
+    if not args or args[0] not in commands:
+        print(f"❌ 用法错误：python print_daemon.py [--name 服务名] <{'|'.join(commands)}> [参数]")
+        sys.exit(1)
+    command, args = args[0], args[1:]
+
+    try:
+        client = DaemonClient(name)
+    except OSError:
+        print(f"❌ 打印服务没有运行，请先执行: {name}.exe --daemon")
+        sys.exit(1)
+
+    with client:
+        if command == "submit":
+            ids = client.submit(args)
+            print(f"✅ 已提交 {len(ids)} 个打印任务: {ids}")
+        elif command == "status":
+            result = client.status(int(args[0]) if args else None)
+            for job in result["jobs"]:
+                print(f"{job['id']:>5}  {job['state']:<9}  {job['path']}" + (f"  ({job['error']})" if job["error"] else ""))
+            print(f"📋 排队中: {result['queued']}")
+        elif command == "cancel":
+            ok = client.cancel(int(args[0]))
+            print("✅ 已取消" if ok else "⚠️ 任务不存在或已经开始打印")
+        elif command == "shutdown":
+            client.shutdown()
+            print("✅ 打印服务正在停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import json
+import os
+import time
+from datetime import datetime
+
+# 估算耗时用的每个文件处理时间（秒），不含打印间隔
+DEFAULT_SECONDS_PER_KIND = {"pdf": 1.0, "excel": 3.0}
+
+
+def classify(name):
+    """文件分类：temp（~$ 临时文件）、pdf、excel、other"""
+    if name.startswith("~$"):
+        return "temp"
+    lower = name.lower()
+    if lower.endswith(".pdf"):
+        return "pdf"
+    if lower.endswith((".xls", ".xlsx")):
+        return "excel"
+    return "other"
+
+
+def is_monthly_file(filename):
+    return "月结单" in filename
+
+
+def _scan(path, topdown):
+    """
+    用 os.scandir 遍历，顺序和 os.walk 完全一致
+    DirEntry 自带类型信息（Windows 上还自带 stat 结果），不用对每个文件单独 stat
+    """
+    dirs, files, subdirs = [], [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    dirs.append(entry.name)
+                    # 和 os.walk 一样不进入符号链接目录
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                else:
+                    files.append(entry)
+    except OSError:
+        return
+
+    if topdown:
+        yield path, dirs, files
+    for subdir in subdirs:
+        yield from _scan(subdir, topdown)
+    if not topdown:
+        yield path, dirs, files
+
+
+def build_plan(source_root, topdown=False, page_count=None):
+    """
+    打印前先扫描一遍源目录，生成按目录分组、按打印顺序排列的任务计划（可以直接保存成 JSON）
+    topdown=False 与 batch_printer 原来 os.walk(topdown=False) 的顺序一致：先子目录，后父目录
+    page_count(path, kind, monthly) 不为空时，每个文件再记录打印页数 pages（未知时为 None）
+    """
+    start = time.perf_counter()
+    directories = []
+    totals = {"files": 0, "pdf": 0, "excel": 0, "other": 0, "temp": 0, "monthly": 0, "bytes": 0}
+    if page_count:
+        totals["pages"] = 0
+
+    for root, dirs, entries in _scan(source_root, topdown):
+        files = []
+        temp = []
+        for entry in entries:
+            kind = classify(entry.name)
+            if kind == "temp":
+                temp.append(entry.name)
+                totals["temp"] += 1
+                continue
+            try:
+                size = entry.stat().st_size
+            except OSError:
+                size = 0
+            monthly = is_monthly_file(entry.name)
+            job = {"name": entry.name, "kind": kind, "monthly": monthly, "size": size}
+            if page_count and kind != "other":
+                job["pages"] = page_count(entry.path, kind, monthly)
+                totals["pages"] += job["pages"] or 0
+            files.append(job)
+            totals["files"] += 1
+            totals[kind] += 1
+            totals["monthly"] += monthly
+            totals["bytes"] += size
+
+        directories.append({
+            "path": root,
+            "name": os.path.basename(root),
+            "dirs": dirs,
+            "files": files,
+            "temp": temp,
+        })
+
+    return {
+        "source": source_root,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "scan_seconds": round(time.perf_counter() - start, 4),
+        "totals": totals,
+        "directories": directories,
+    }
+
+
+def paper_key(job):
+    """默认的分组依据：月结单用 A4 纸，其他文件用针式打印纸"""
+    return "A4" if job["monthly"] else "default"
+
+
+def count_switches(keys):
+    """相邻两个任务纸张 / 打印机不同的次数"""
+    return sum(1 for a, b in zip(keys, keys[1:]) if a != b)
+
+
+def group_by_paper(plan, scope="clinic", key=paper_key):
+    """
+    按打印机 / 纸张重新排列每个目录里的文件，减少换纸次数；目录之间的顺序不变（诊所提示和空目录清理都按目录进行）
+    scope = clinic：每个目录内同一种纸的文件排在一起，组的先后按第一次出现的顺序
+    scope = run：在 clinic 的基础上，每个目录先打印上一个目录最后用的纸，最后打印下一个目录会先用到的纸
+    组内保持原来的顺序；返回并记录到 plan["paper_switches"] 的换纸次数对比
+    """
+    directories = plan["directories"]
+    before = count_switches([key(job) for directory in directories for job in directory["files"]])
+
+    last = None
+    for index, directory in enumerate(directories):
+        groups = {}
+        order = []
+        for job in directory["files"]:
+            k = key(job)
+            if k not in groups:
+                groups[k] = []
+                order.append(k)
+            groups[k].append(job)
+        if not order:
+            continue
+
+        if scope == "run":
+            if last in groups:
+                order.remove(last)
+                order.insert(0, last)
+            upcoming = next((d["files"] for d in directories[index + 1:] if d["files"]), [])
+            upcoming_keys = {key(job) for job in upcoming}
+            candidates = [k for k in order[1:] if k in upcoming_keys]
+            if candidates:
+                order.remove(candidates[0])
+                order.append(candidates[0])
+
+        directory["files"] = [job for k in order for job in groups[k]]
+        last = order[-1]
+
+    after = count_switches([key(job) for directory in directories for job in directory["files"]])
+    result = {"scope": scope, "before": before, "after": after, "saved": before - after}
+    plan["paper_switches"] = result
+    return result
+
+
+def estimate_duration(plan, seconds_per_kind=None, delay_seconds=0.0, seconds_per_clinic=0.0, seconds_per_page=0.0):
+    """
+    估算整个计划需要的时间（秒）
+    每个文件 = 处理时间 + 打印间隔 + 页数 × 每页时间（计划里有页数时），
+    每个诊所目录（纯数字目录名）结束后再加上提示等待时间
+    """
+    seconds_per_kind = seconds_per_kind or DEFAULT_SECONDS_PER_KIND
+    total = 0.0
+    for directory in plan["directories"]:
+        for job in directory["files"]:
+            total += seconds_per_kind.get(job["kind"], 0.0) + delay_seconds
+            total += (job.get("pages") or 1) * seconds_per_page
+        if directory["name"].isdigit():
+            total += seconds_per_clinic
+    plan["estimated_seconds"] = round(total, 1)
+    return total
+
+
+def save_plan(plan, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=1)
+
+
+def load_plan(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def format_duration(seconds):
+    minutes, sec = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours} 小时 {minutes} 分"
+    if minutes:
+        return f"{minutes} 分 {sec} 秒"
+    return f"{sec} 秒"
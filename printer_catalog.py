@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import threading
+import time
+
+# 打印机列表在内存里的有效期（秒），过期后下次查询时重新枚举
+DEFAULT_TTL = 600
+# 查询不到打印机时会重新枚举一次，两次枚举之间至少间隔这么多秒，避免反复枚举
+DEFAULT_MIN_REFRESH = 5
+
+# Excel 不接受这些特殊端口
+INVALID_EXCEL_PORTS = ("PORTPROMPT:", "NUL:")
+
+
+class Win32PrinterBackend:
+    """通过 win32print 枚举本机和网络打印机、端口以及支持的纸张"""
+
+    def list_printers(self):
+        """返回 [(打印机名, 端口), ...]，顺序与 EnumPrinters 一致"""
+        import win32print
+        result = []
+        for printer in win32print.EnumPrinters(win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS):
+            name = printer[2]
+            try:
+                handle = win32print.OpenPrinter(name)
+                try:
+                    port = win32print.GetPrinter(handle, 2)["pPortName"]
+                finally:
+                    win32print.ClosePrinter(handle)
+            except Exception as e:
+                logging.warning(f"⚠️ 获取打印机端口失败: {name} - {e}")
+                port = None
+            result.append((name, port))
+        return result
+
+    def list_forms(self, printer_name):
+        """返回打印机支持的纸张 [{"name", "width", "height"}, ...]，宽高单位是千分之一毫米"""
+        import win32print
+        handle = win32print.OpenPrinter(printer_name)
+        try:
+            forms = win32print.EnumForms(handle)
+        finally:
+            win32print.ClosePrinter(handle)
+        return [{"name": form["Name"], "width": form["Size"]["cx"], "height": form["Size"]["cy"]} for form in forms]
+
+    def default_printer(self):
+        import win32print
+        return win32print.GetDefaultPrinter()
+
+
+class PrinterCatalog:
+    """
+    打印机目录：打印机、端口、纸张只枚举一次，之后按名称片段 / 纸张名直接查字典
+    代替每打印一个月结单就 EnumPrinters + OpenPrinter + GetPrinter 一遍
+
+    内存里的数据超过 ttl 秒后重新枚举；名称查不到时也会重新枚举一次（新装的打印机）
+    cache_path 不为空时把结果保存到磁盘，下次启动在有效期内直接读取
+    """
+
+    def __init__(self, backend, ttl=DEFAULT_TTL, cache_path=None, min_refresh=DEFAULT_MIN_REFRESH,
+                 clock=time.time):
+        self.backend = backend
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.min_refresh = min_refresh
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._attempted_at = None
+        self._printers = {}
+        self._fragments = {}
+        self._forms = {}
+        self._form_index = {}
+
+    # ---------- 加载 ----------
+
+    def _index(self, printers, forms, loaded_at):
+        """建立索引：打印机名（小写）的每个子串都指向第一个包含它的打印机，和原来逐个查找的结果一致"""
+        self._printers = {}
+        self._fragments = {}
+        for name, port in printers:
+            self._printers[name] = port
+            lower = name.lower()
+            for i in range(len(lower)):
+                for j in range(i + 1, len(lower) + 1):
+                    self._fragments.setdefault(lower[i:j], name)
+        self._forms = {}
+        self._form_index = {}
+        for name, items in forms.items():
+            if name in self._printers:
+                self._set_forms(name, items)
+        self._loaded_at = loaded_at
+
+    def _load_disk_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if self.clock() - data["created"] >= self.ttl:
+                return False
+            self._index([tuple(item) for item in data["printers"]], data["forms"], data["created"])
+            return True
+        except Exception as e:
+            logging.warning(f"⚠️ 读取打印机缓存失败: {self.cache_path} - {e}")
+            return False
+
+    def _save_disk_cache(self):
+        if not self.cache_path:
+            return
+        data = {
+            "created": self._loaded_at,
+            "printers": list(self._printers.items()),
+            "forms": self._forms,
+        }
+        try:
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logging.warning(f"⚠️ 保存打印机缓存失败: {self.cache_path} - {e}")
+
+    def _set_forms(self, printer_name, forms):
+        self._forms[printer_name] = forms
+        index = {}
+        for form in forms:
+            index.setdefault(form["name"].lower(), form)
+        self._form_index[printer_name] = index
+
+    def refresh(self):
+        """重新枚举打印机；枚举失败时保留原来的数据"""
+        with self._lock:
+            self._attempted_at = self.clock()
+            try:
+                printers = self.backend.list_printers()
+            except Exception as e:
+                logging.error(f"❌ 枚举打印机失败: {e}")
+                return False
+            self._index(printers, {}, self.clock())
+            self._save_disk_cache()
+            logging.info(f"🖨️ 已枚举 {len(printers)} 台打印机")
+            return True
+
+    def _recently_attempted(self):
+        return self._attempted_at is not None and self.clock() - self._attempted_at < self.min_refresh
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded_at is not None and self.clock() - self._loaded_at < self.ttl:
+                return
+            if self._loaded_at is None and self._load_disk_cache():
+                return
+            # 过期后重新枚举失败时继续使用旧数据，min_refresh 秒内不再重试
+            if self._loaded_at is not None and self._recently_attempted():
+                return
+            self.refresh()
+
+    def _refresh_on_miss(self):
+        """查询不到时重新枚举一次（距上次枚举不足 min_refresh 秒则不再枚举）"""
+        with self._lock:
+            if self._recently_attempted():
+                return False
+            return self.refresh()
+
+    # ---------- 查询 ----------
+
+    def printers(self):
+        self._ensure_loaded()
+        return dict(self._printers)
+
+    def find(self, fragment):
+        """按名称片段（不区分大小写）查找打印机，返回完整名称，找不到返回 None"""
+        self._ensure_loaded()
+        key = fragment.lower()
+        name = self._fragments.get(key)
+        if name is None and self._refresh_on_miss():
+            name = self._fragments.get(key)
+        return name
+
+    def port(self, printer_name):
+        self._ensure_loaded()
+        return self._printers.get(printer_name)
+
+    def excel_name(self, fragment):
+        """返回 Excel ActivePrinter 使用的格式，例如 "A4Print on Ne01:"，找不到返回 None"""
+        name = self.find(fragment)
+        port = self._printers.get(name) if name else None
+        if port is None:
+            return None
+        return f"{name} on {port}:"
+
+    def forms(self, printer_name):
+        """打印机支持的纸张列表；每台打印机只在第一次查询时 EnumForms"""
+        self._ensure_loaded()
+        with self._lock:
+            if printer_name not in self._forms:
+                self._set_forms(printer_name, self.backend.list_forms(printer_name))
+                self._save_disk_cache()
+            return list(self._forms[printer_name])
+
+    def form(self, printer_name, form_name):
+        """按纸张名称（不区分大小写）查找纸张，返回 {"name", "width", "height"}，不支持时返回 None"""
+        self.forms(printer_name)
+        return self._form_index[printer_name].get(form_name.lower())
+
+    def default_printer(self):
+        return self.backend.default_printer()
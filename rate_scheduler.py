@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶：每分钟补充 pages_per_minute 页，最多攒 burst 页
+    一个任务按页数扣令牌；令牌不少于 min(页数, burst) 就放行，超出的部分记成欠账，由后面的任务等待补上
+    这样大任务不会永远等不到，小任务也不会超过打印机缓存
+    """
+
+    def __init__(self, pages_per_minute, burst, clock=time.monotonic):
+        self.rate = pages_per_minute / 60.0
+        self.burst = max(1.0, float(burst))
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, pages):
+        """还要等多少秒才能放行 pages 页的任务（不扣令牌）"""
+        self._refill(self.clock())
+        need = min(pages, self.burst) - self.tokens
+        if need <= 0:
+            return 0.0
+        return need / self.rate if self.rate > 0 else float("inf")
+
+    def consume(self, pages):
+        self._refill(self.clock())
+        self.tokens -= pages
+        return self.tokens
+
+
+def parse_rate(value):
+    """config.ini 里的 "每分钟页数, 突发页数"，例如 "30, 4"；只写一个数时突发页数等于 1"""
+    parts = [p.strip() for p in value.split(",")]
+    pages_per_minute = float(parts[0])
+    burst = float(parts[1]) if len(parts) > 1 and parts[1] else 1
+    return pages_per_minute, burst
+
+
+class RateScheduler:
+    """
+    每台打印机一个令牌桶，按页数放行打印任务，代替每个文件之后固定 sleep(DELAY_SECONDS)
+    rates = {打印机名称片段: (每分钟页数, 突发页数)}，片段不区分大小写；匹配不到的打印机用 default，
+    default 为 None 时不限速
+    每次放行都记录在 decisions 里（也可以传 on_decision 回调），方便查看和测试
+    """
+
+    def __init__(self, rates, default=None, clock=time.monotonic, sleep=time.sleep, on_decision=None):
+        self.rates = {fragment.lower(): rate for fragment, rate in rates.items()}
+        self.default = default
+        self.clock = clock
+        self.sleep = sleep
+        self.on_decision = on_decision
+        self.decisions = []
+        self._buckets = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, printer):
+        lower = printer.lower()
+        for fragment, rate in self.rates.items():
+            if fragment in lower:
+                return rate
+        return self.default
+
+    def bucket(self, printer):
+        """打印机对应的令牌桶，不限速时返回 None"""
+        with self._lock:
+            if printer not in self._buckets:
+                rate = self._rate_for(printer)
+                self._buckets[printer] = TokenBucket(*rate, clock=self.clock) if rate else None
+                self._locks[printer] = threading.Lock()
+            return self._buckets[printer]
+
+    def seconds_per_page(self, printer):
+        """按配置的速度打印一页需要的秒数，不限速时返回 0"""
+        bucket = self.bucket(printer)
+        return 1 / bucket.rate if bucket and bucket.rate > 0 else 0.0
+
+    def acquire(self, printer, pages=1):
+        """等到打印机有足够的令牌再返回，返回等待的秒数；同一台打印机的任务按调用顺序放行"""
+        bucket = self.bucket(printer)
+        if bucket is None:
+            return 0.0
+        pages = max(1, pages)
+        requested = self.clock()
+        with self._locks[printer]:
+            while True:
+                wait = bucket.wait_time(pages)
+                if wait <= 0:
+                    break
+                self.sleep(wait)
+            tokens = bucket.consume(pages)
+        admitted = self.clock()
+
+        decision = {
+            "printer": printer,
+            "pages": pages,
+            "requested": requested,
+            "admitted": admitted,
+            "waited": admitted - requested,
+            "tokens": tokens,
+        }
+        self.decisions.append(decision)
+        if self.on_decision:
+            self.on_decision(decision)
+        if decision["waited"] > 0:
+            logging.info(f"⏳ 打印机限速: {printer} 等待 {decision['waited']:.1f} 秒 ({pages} 页)")
+        return decision["waited"]
+
+
+def rate_scheduler_from_config(config, section="printer_rates"):
+    """读取 config.ini 的 [printer_rates]，没有配置时返回 None（继续使用固定打印间隔）"""
+    if not config.has_section(section):
+        return None
+    rates = {}
+    default = None
+    for key, value in config.items(section):
+        if not value.strip():
+            continue
+        if key == "default":
+            default = parse_rate(value)
+        else:
+            rates[key] = parse_rate(value)
+    if not rates and default is None:
+        return None
+    return RateScheduler(rates, default=default)
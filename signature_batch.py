@@ -0,0 +1,119 @@
+"""
+批量生成签名图片：
+    python signature_batch.py <名单文件> <字体文件> <输出目录> [每人数量]
+
+名单文件每行一个名字，可以写成 "名字,数量" 单独指定数量
+输出按请求内容寻址（名字 + 字体 + 字号 + 变体序号），同样的请求直接复用已有图片
+"""
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from handwriting import render_signature, distort_array
+
+# 生成算法有变化时修改这个版本号，旧的缓存图片就不会再被复用
+RENDER_VERSION = 1
+DEFAULT_FONT_SIZE = 80
+DEFAULT_VARIANTS = 10
+
+
+def _font_identity(font_path):
+    st = os.stat(font_path)
+    return f"{os.path.abspath(font_path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def variant_key(name, font_identity, font_size, index):
+    """一个变体的内容地址，同时决定它的随机种子"""
+    raw = f"{RENDER_VERSION}|{name}|{font_identity}|{font_size}|{index}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def variant_seed(key):
+    return int(key[:16], 16)
+
+
+def variant_path(output_dir, key):
+    # 按前两位分子目录，避免单个目录下文件过多
+    return os.path.join(output_dir, key[:2], f"{key}.png")
+
+
+def render_variant(name, font_path, font_size, key, output_path):
+    """在工作进程里执行：渲染 + 扭曲 + 原子写入"""
+    img = render_signature(name, font_path, font_size)
+    bgr = np.array(img)[:, :, ::-1].copy()
+    distorted = distort_array(bgr, variant_seed(key))
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp.png"
+    cv2.imwrite(tmp_path, distorted)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def generate_batch(requests, font_path, output_dir, font_size=DEFAULT_FONT_SIZE, workers=None):
+    """
+    requests: [(名字, 数量), ...]
+    返回 ({名字: [图片路径, ...]}, 新生成数量, 缓存命中数量)
+    """
+    font_identity = _font_identity(font_path)
+    result = {}
+    todo = []
+    cached = 0
+
+    for name, count in requests:
+        paths = result.setdefault(name, [])
+        for index in range(len(paths), len(paths) + count):
+            key = variant_key(name, font_identity, font_size, index)
+            path = variant_path(output_dir, key)
+            paths.append(path)
+            if os.path.exists(path):
+                cached += 1
+            else:
+                todo.append((name, font_path, font_size, key, path))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(todo) // ((workers or os.cpu_count() or 1) * 4))
+            for _ in pool.map(render_variant, *zip(*todo), chunksize=chunksize):
+                pass
+
+    return result, len(todo), cached
+
+
+def read_name_list(list_path, default_count):
+    requests = []
+    with open(list_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            name, _, count = line.partition(",")
+            requests.append((name.strip(), int(count) if count.strip() else default_count))
+    return requests
+
+
+def main():
+    if len(sys.argv) < 4:
+        print("❌ 用法错误：python signature_batch.py <名单文件> <字体文件> <输出目录> [每人数量]")
+        sys.exit(1)
+
+    list_path, font_path, output_dir = sys.argv[1:4]
+    default_count = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_VARIANTS
+
+    requests = read_name_list(list_path, default_count)
+    result, rendered, cached = generate_batch(requests, font_path, output_dir)
+
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ 新生成 {rendered} 张，复用缓存 {cached} 张，清单: {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+监听目录的待处理文件队列：内存里最多放 memory_limit 个路径，超出的写进 SQLite，打印跟上以后再按顺序读回来
+一批导出几万个文件、打印机又跟不上时，内存占用不会随积压增长，也不会丢掉任何一个文件
+"""
+import logging
+import os
+import sqlite3
+from collections import OrderedDict, deque
+
+# 内存里最多排队多少个路径
+DEFAULT_MEMORY_LIMIT = 1024
+
+
+class SpillQueue:
+    """
+    按来源分开的先进先出队列（只在事件循环线程里使用）：
+        - key(path) 是来源，出队时各来源轮流，和打印队列的 FairQueue 一致，一个目录的积压不会挡住其他目录
+        - 同一个路径排队期间只保留一份（内存里用集合判断，数据库里靠主键）
+        - 内存满了以后新路径写进数据库；一个来源在数据库里还有积压时，它的新路径也写进数据库，保证先进先出
+    db_path 为 None 时不写磁盘，队列不限长度
+    close() 时内存里还没处理的路径也写进数据库，下次启动时接着处理
+    """
+
+    def __init__(self, db_path=None, memory_limit=DEFAULT_MEMORY_LIMIT, key=None):
+        self.memory_limit = max(1, memory_limit)
+        self._key = key or (lambda path: None)
+        # 来源 -> deque；有积压（内存或数据库里）的来源按轮流顺序排在 _sources 里
+        self._memory = {}
+        self._queued = set()
+        self._on_disk = {}
+        self._sources = OrderedDict()
+        self.spilled = 0
+        self.reloaded = 0
+        self.conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self.conn = sqlite3.connect(db_path, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            # NORMAL 就够了：断电丢掉的最后几条在下次启动比对快照时还会找回来
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS spill ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " source TEXT,"
+                " path TEXT NOT NULL UNIQUE)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS spill_source ON spill (source, id)")
+            # 上次退出时没处理完的路径
+            for source, count in self.conn.execute("SELECT source, COUNT(*) FROM spill GROUP BY source"):
+                self._on_disk[source] = count
+                self._sources[source] = None
+
+    def __len__(self):
+        return len(self._queued) + sum(self._on_disk.values())
+
+    def in_memory(self):
+        return len(self._queued)
+
+    def on_disk(self):
+        return sum(self._on_disk.values())
+
+    def put_many(self, paths):
+        """按顺序加入一组路径，已经在排队的跳过，返回新加入的个数"""
+        spill = []
+        added = 0
+        for path in paths:
+            if path in self._queued:
+                continue
+            source = self._key(path)
+            if self.conn is not None and (self._on_disk.get(source) or len(self._queued) >= self.memory_limit):
+                spill.append((source, path))
+                continue
+            self._memory.setdefault(source, deque()).append(path)
+            self._queued.add(path)
+            self._sources.setdefault(source, None)
+            added += 1
+        if spill:
+            added += self._spill(spill)
+        return added
+
+    def _spill(self, rows):
+        """一组路径在一个事务里写进数据库，已经在数据库里的路径不重复写；写不进去时留在内存里，不丢"""
+        written = []
+        try:
+            self.conn.execute("BEGIN")
+            try:
+                for source, path in rows:
+                    if self.conn.execute("INSERT OR IGNORE INTO spill (source, path) VALUES (?, ?)",
+                                         (source, path)).rowcount:
+                        written.append(source)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logging.error(f"❌ 排队文件写入磁盘失败，暂时留在内存里: {e}")
+            for source, path in rows:
+                if path not in self._queued:
+                    self._memory.setdefault(source, deque()).append(path)
+                    self._queued.add(path)
+                    self._sources.setdefault(source, None)
+            return len(rows)
+        for source in written:
+            self._on_disk[source] = self._on_disk.get(source, 0) + 1
+            self._sources.setdefault(source, None)
+        self.spilled += len(written)
+        return len(written)
+
+    def _reload(self, source):
+        """内存里这个来源排空后，从数据库按顺序读回一批（至少一个），不超过内存上限"""
+        limit = max(1, self.memory_limit - len(self._queued))
+        rows = self.conn.execute("SELECT id, path FROM spill WHERE source IS ? ORDER BY id LIMIT ?",
+                                 (source, limit)).fetchall()
+        if rows:
+            self.conn.execute("DELETE FROM spill WHERE source IS ? AND id <= ?", (source, rows[-1][0]))
+        items = self._memory.setdefault(source, deque())
+        for _, path in rows:
+            items.append(path)
+            self._queued.add(path)
+        self.reloaded += len(rows)
+        left = self._on_disk.get(source, 0) - len(rows)
+        if left > 0 and rows:
+            self._on_disk[source] = left
+        else:
+            self._on_disk.pop(source, None)
+        return items
+
+    def get(self):
+        """取出下一个路径，各来源轮流；队列为空时返回 None"""
+        while self._sources:
+            source = next(iter(self._sources))
+            items = self._memory.get(source)
+            if not items and self._on_disk.get(source):
+                items = self._reload(source)
+            if not items:
+                self._memory.pop(source, None)
+                del self._sources[source]
+                continue
+            path = items.popleft()
+            self._queued.discard(path)
+            if items or self._on_disk.get(source):
+                self._sources.move_to_end(source)
+            else:
+                del self._memory[source]
+                del self._sources[source]
+            return path
+        return None
+
+    def close(self):
+        """内存里的路径写进数据库（排在各来源已有积压的前面）后关闭"""
+        if self.conn is None:
+            return
+        rows = []
+        for source, items in self._memory.items():
+            rows.extend((source, path) for path in items)
+        if rows:
+            # 内存里的路径比数据库里的早，用更小的 id 排到前面
+            start = (self.conn.execute("SELECT MIN(id) FROM spill").fetchone()[0] or 1) - len(rows) - 1
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("INSERT OR IGNORE INTO spill (id, source, path) VALUES (?, ?, ?)",
+                                      [(start + i, source, path) for i, (source, path) in enumerate(rows)])
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        self._memory.clear()
+        self._queued.clear()
+        self.conn.close()
+        self.conn = None
@@ -0,0 +1,140 @@
+import logging
+import time
+
+# 打印队列里最多允许积压几个任务，低于这个数才放行下一个文件
+DEFAULT_HIGH_WATER = 2
+# 轮询打印队列的间隔（秒）
+DEFAULT_POLL_INTERVAL = 0.25
+# 提交后多久还没在队列里看到新任务、而队列又低于上限时，认为任务已经在两次检查之间打印完（秒）
+DEFAULT_SETTLE_TIME = 1.0
+# 单个任务最长等待时间（秒），超过后不再等待，避免卡死整个批次
+DEFAULT_JOB_TIMEOUT = 300
+
+# win32print 的 JOB_STATUS_* 中表示打印机出错的状态位
+JOB_STATUS_ERROR_MASK = 0x0002 | 0x0020 | 0x0040 | 0x0200 | 0x0400  # ERROR | OFFLINE | PAPEROUT | BLOCKED_DEVQ | USER_INTERVENTION
+
+
+class Win32SpoolerBackend:
+    """通过 win32print 的 EnumJobs / GetJob 读取 Windows 打印队列"""
+
+    def __init__(self, printer_name):
+        self.printer_name = printer_name
+
+    def _enum_jobs(self):
+        import win32print
+        handle = win32print.OpenPrinter(self.printer_name)
+        try:
+            return win32print.EnumJobs(handle, 0, -1, 1)
+        finally:
+            win32print.ClosePrinter(handle)
+
+    def job_ids(self):
+        return {job["JobId"] for job in self._enum_jobs()}
+
+    def queue_depth(self):
+        return len(self._enum_jobs())
+
+    def job_status(self, job_id):
+        """返回任务状态位，任务已经不在队列里时返回 None"""
+        import win32print
+        handle = win32print.OpenPrinter(self.printer_name)
+        try:
+            return win32print.GetJob(handle, job_id, 1)["Status"]
+        except Exception:
+            return None
+        finally:
+            win32print.ClosePrinter(handle)
+
+
+class SpoolerTracker:
+    """
+    跟踪提交到打印队列的任务，代替每个文件之后固定 sleep(DELAY_SECONDS)
+    只有当队列深度低于 high_water 时才放行下一个文件
+    很快打完的任务可能在两次检查之间进出队列，一直看不到；提交后 settle_time 内没看到新任务、队列又低于上限时
+    按已完成处理，不再等满 appear_timeout
+    """
+
+    def __init__(self, backend, high_water=DEFAULT_HIGH_WATER, poll_interval=DEFAULT_POLL_INTERVAL,
+                 job_timeout=DEFAULT_JOB_TIMEOUT, settle_time=DEFAULT_SETTLE_TIME, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.backend = backend
+        self.high_water = max(1, high_water)
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.settle_time = settle_time
+        self.clock = clock
+        self.sleep = sleep
+        self.waited = 0.0
+
+    def snapshot(self):
+        """提交任务前记录队列里已有的任务，用来识别新提交的任务"""
+        try:
+            return self.backend.job_ids()
+        except Exception as e:
+            logging.warning(f"⚠️ 读取打印队列失败: {e}")
+            return set()
+
+    def find_new_job(self, before, appear_timeout):
+        """
+        等待新任务出现在队列里（ShellExecute 交给 PDF 阅读器后会有一段延迟），返回任务编号
+        没看到新任务时返回 None：settle_time 后队列低于上限（任务已经在两次检查之间打印完）时立即返回，
+        否则最多等 appear_timeout，相当于原来的固定延迟
+        """
+        start = self.clock()
+        deadline = start + appear_timeout
+        while True:
+            try:
+                ids = self.backend.job_ids()
+            except Exception as e:
+                logging.warning(f"⚠️ 读取打印队列失败: {e}")
+                ids = None
+            if ids:
+                new_ids = ids - before
+                if new_ids:
+                    return max(new_ids)
+            now = self.clock()
+            if ids is not None and now - start >= self.settle_time and len(ids) < self.high_water:
+                logging.info(f"🧾 队列中未发现新任务，队列低于上限，按已打印完处理")
+                return None
+            if now >= deadline:
+                logging.info(f"⏳ 队列中未发现新任务，已按 {appear_timeout} 秒延迟处理")
+                return None
+            self.sleep(self.poll_interval)
+
+    def wait_for_slot(self, job_id=None):
+        """阻塞到队列深度低于 high_water，返回实际等待的秒数"""
+        start = self.clock()
+        warned = False
+        while True:
+            try:
+                depth = self.backend.queue_depth()
+            except Exception as e:
+                logging.warning(f"⚠️ 读取打印队列失败: {e}")
+                break
+            if depth < self.high_water:
+                break
+
+            if job_id is not None and not warned:
+                status = self.backend.job_status(job_id)
+                if status and status & JOB_STATUS_ERROR_MASK:
+                    logging.warning(f"⚠️ 打印任务 {job_id} 状态异常 (0x{status:x})，请检查打印机")
+                    warned = True
+
+            if self.clock() - start >= self.job_timeout:
+                logging.warning(f"⚠️ 打印队列等待超时 ({self.job_timeout} 秒)，继续下一个文件")
+                break
+            self.sleep(self.poll_interval)
+
+        elapsed = self.clock() - start
+        self.waited += elapsed
+        return elapsed
+
+    def track(self, before, appear_timeout):
+        """
+        跟踪 snapshot() 之后提交的任务，直到队列有空位
+        appear_timeout 内没在队列里看到新任务时，只按原来的固定延迟等待
+        """
+        job_id = self.find_new_job(before, appear_timeout)
+        if job_id is not None:
+            logging.info(f"🧾 已跟踪打印任务: {job_id}")
+        return self.wait_for_slot(job_id)
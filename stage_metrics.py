@@ -0,0 +1,147 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+# 关闭统计时 stage() 直接返回这个空的上下文，不计时也不分配对象
+_DISABLED = nullcontext()
+
+
+class _Stage:
+    __slots__ = ("recorder", "name", "path", "start")
+
+    def __init__(self, recorder, name, path):
+        self.recorder = recorder
+        self.name = name
+        self.path = path
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.record(self.name, self.path, time.perf_counter() - self.start, exc_type is None)
+        return False
+
+
+def percentile(sorted_values, p):
+    """最近秩百分位数，sorted_values 必须已经排好序"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values), math.ceil(p / 100 * len(sorted_values))) - 1)
+    return sorted_values[index]
+
+
+class StageMetrics:
+    """
+    按阶段记录每个文件的耗时（单调时钟），每条记录写一行 JSON：
+        {"ts": ..., "stage": "excel_open", "file": "...", "seconds": 0.412, "ok": true}
+    结束时汇总每个阶段的 p50 / p95 / max 和每分钟处理的文件数
+    可以在多个线程里同时使用（Excel 流水线的准备阶段在工作线程里）
+    """
+
+    def __init__(self, path, clock=time.perf_counter):
+        self.path = path
+        self.clock = clock
+        self.started = clock()
+        self.files = 0
+        self._durations = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._out = open(path, "a", encoding="utf-8", buffering=1)
+
+    def stage(self, name, path=None):
+        return _Stage(self, name, path)
+
+    def record(self, name, path, seconds, ok=True):
+        line = json.dumps({
+            "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            "stage": name,
+            "file": path,
+            "seconds": round(seconds, 6),
+            "ok": ok,
+        }, ensure_ascii=False)
+        with self._lock:
+            self._durations.setdefault(name, []).append(seconds)
+            self._out.write(line + "\n")
+
+    def file_done(self):
+        with self._lock:
+            self.files += 1
+
+    def summary(self):
+        elapsed = self.clock() - self.started
+        stages = {}
+        with self._lock:
+            for name, values in self._durations.items():
+                values = sorted(values)
+                stages[name] = {
+                    "count": len(values),
+                    "total": round(sum(values), 3),
+                    "p50": round(percentile(values, 50), 4),
+                    "p95": round(percentile(values, 95), 4),
+                    "max": round(values[-1], 4),
+                }
+            files = self.files
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "files": files,
+            "files_per_minute": round(files / elapsed * 60, 2) if elapsed > 0 else 0.0,
+            "stages": stages,
+        }
+
+    def close(self):
+        """关闭记录文件，写出汇总（和 JSON lines 文件同名，后缀 _summary.json），返回汇总"""
+        result = self.summary()
+        with self._lock:
+            self._out.close()
+        summary_path = os.path.splitext(self.path)[0] + "_summary.json"
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        return result
+
+
+# 全局记录器，None 表示没有开启统计
+_metrics = None
+
+
+def configure_metrics(log_dir, enabled=True):
+    """开启统计时在 log_dir 下创建 metrics_<时间>.jsonl，和日志文件放在一起"""
+    global _metrics
+    if not enabled:
+        _metrics = None
+        return None
+    filename = datetime.now().strftime("metrics_%Y-%m-%d_%H-%M-%S.jsonl")
+    _metrics = StageMetrics(os.path.join(log_dir, filename))
+    return _metrics
+
+
+def stage(name, path=None):
+    """用法：with stage("move", path): ...   没有开启统计时几乎没有开销"""
+    if _metrics is None:
+        return _DISABLED
+    return _metrics.stage(name, path)
+
+
+def file_done():
+    if _metrics is not None:
+        _metrics.file_done()
+
+
+def close_metrics():
+    """写出汇总并输出到日志，没有开启统计时什么也不做"""
+    global _metrics
+    if _metrics is None:
+        return None
+    metrics, _metrics = _metrics, None
+    result = metrics.close()
+    logging.info(f"⏱️ 阶段耗时统计: {result['files']} 个文件, {result['elapsed_seconds']} 秒, "
+                 f"每分钟 {result['files_per_minute']} 个")
+    for name, item in result["stages"].items():
+        logging.info(f"   {name}: {item['count']} 次, p50 {item['p50']} 秒, p95 {item['p95']} 秒, max {item['max']} 秒")
+    logging.info(f"📈 统计明细: {metrics.path}")
+    return result
@@ -0,0 +1,58 @@
+import os
+
+from archive_mover import ArchiveMover
+
+
+def _tree(root, files):
+    for rel in files:
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x")
+
+
+def _archive_all(src, dst, printable=lambda name: not name.startswith("~$") and not name.endswith(".txt")):
+    """和 batch_printer 一样：os.walk(topdown=False) 逐个目录登记、移动、收尾"""
+    mover = ArchiveMover(src, dst)
+    removed = []
+    for root, dirs, files in os.walk(src, topdown=False):
+        mover.begin_directory(root, dirs, files)
+        for name in files:
+            if printable(name):
+                mover.move(os.path.join(root, name))
+        if mover.finish_directory(root):
+            removed.append(os.path.relpath(root, src))
+    return removed
+
+
+def test_emptied_directories_removed_once(tmp_path):
+    src, dst = str(tmp_path / "src"), str(tmp_path / "dst")
+    _tree(src, ["1001/a.pdf", "1001/b.xlsx", "1001/sub/c.pdf", "1002/d.pdf", "e.pdf"])
+    removed = _archive_all(src, dst)
+    assert sorted(removed) == ["1001", os.path.join("1001", "sub"), "1002"]
+    # 源目录本身保留
+    assert os.listdir(src) == []
+    assert os.path.exists(os.path.join(dst, "1001", "sub", "c.pdf"))
+    assert os.path.exists(os.path.join(dst, "e.pdf"))
+
+
+def test_directories_with_leftovers_kept(tmp_path):
+    src, dst = str(tmp_path / "src"), str(tmp_path / "dst")
+    _tree(src, ["1001/a.pdf", "1001/note.txt", "1002/a.pdf", "1002/~$a.xlsx"])
+    removed = _archive_all(src, dst)
+    # 还有不打印的文件时保留；只剩 ~$ 临时文件时和原来一样尝试删除（失败只记警告）
+    assert removed == []
+    assert os.listdir(os.path.join(src, "1001")) == ["note.txt"]
+    assert os.listdir(os.path.join(src, "1002")) == ["~$a.xlsx"]
+
+
+def test_directories_without_moved_files_kept(tmp_path):
+    src, dst = str(tmp_path / "src"), str(tmp_path / "dst")
+    _tree(src, ["1001/sub/a.pdf"])
+    os.makedirs(os.path.join(src, "empty"))
+    os.makedirs(os.path.join(src, "1003", "nested_empty"))
+    removed = _archive_all(src, dst)
+    # 只删除移走过文件的目录：本来就空的目录、只有子目录的目录都保留
+    assert removed == [os.path.join("1001", "sub")]
+    assert sorted(os.listdir(src)) == ["1001", "1003", "empty"]
+    assert os.listdir(os.path.join(src, "1003")) == ["nested_empty"]
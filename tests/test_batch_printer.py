@@ -0,0 +1,177 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+import batch_printer
+from excel_session import DEFAULT_MAX_JOBS, close_excel_session, configure_excel_session
+from fake_backends import FakeExcelBackend, FakePrinterBackend, FakePrinterEnumBackend
+from job_ledger import FAILED, JobLedger
+from print_daemon import DONE, DaemonClient, PrintDaemon
+from printer_catalog import PrinterCatalog
+
+
+@pytest.fixture
+def fake_run(tmp_path, monkeypatch):
+    """在 tmp_path 里准备 config.ini，打印机和 Excel 换成假后端"""
+    src = tmp_path / "src"
+    printer = FakePrinterBackend({}, default_latency=0)
+    excel = FakeExcelBackend(sheet_count=2)
+    monkeypatch.setattr(batch_printer, "PDF_BACKEND", printer)
+    monkeypatch.setattr(batch_printer, "PRINTER_CATALOG",
+                        PrinterCatalog(FakePrinterEnumBackend({"DotMatrix": ("LPT1", [])})))
+    monkeypatch.setattr(batch_printer, "DEFAULT_PRINTER", None)
+    monkeypatch.setattr(batch_printer, "PRINT_DAEMON", False)
+    monkeypatch.setattr(batch_printer, "PRINT_CLIENT", None)
+    configure_excel_session(backend=excel)
+    (tmp_path / "config.ini").write_text(
+        "[settings]\n"
+        f"source_dir = {src}\n"
+        "monthly_printer_name = A4print\n"
+        "default_paper_size = 132\n"
+        "default_paper_zoom = 75\n"
+        "delay_seconds = 0\n"
+        "enable_wait_prompt = false\n"
+        "wait_prompt_sleep = 0\n"
+        "spooler_tracking = false\n",
+        encoding="utf-8")
+    handlers = list(logging.getLogger().handlers)
+    yield src, printer, excel
+    configure_excel_session(backend=None, max_jobs=DEFAULT_MAX_JOBS)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if handler not in handlers:
+            root.removeHandler(handler)
+            handler.close()
+
+
+def _make_tree(src):
+    files = []
+    for clinic in ("1001", "1002"):
+        for name in ("a.pdf", "b.xlsx", "月结单_c.pdf"):
+            path = src / clinic / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(str(path).encode("utf-8"))
+            files.append(str(path))
+    return files
+
+
+def _assert_archived(tmp_path, src, files):
+    # 源目录清空，文件都移到了备份目录
+    assert os.listdir(src) == []
+    backups = [p for p in os.listdir(tmp_path) if p.startswith("src_打印备份_")]
+    assert len(backups) == 1
+    assert sorted(os.listdir(tmp_path / backups[0] / "1001")) == ["a.pdf", "b.xlsx", "月结单_c.pdf"]
+    # 运行结束时已归档的记录都删掉了，账本里没有剩下要处理的文件
+    ledger = JobLedger(str(tmp_path / "job_ledger.db"))
+    try:
+        assert ledger.pending() == []
+        assert all(ledger.status(path) is None for path in files)
+    finally:
+        ledger.close()
+
+
+@pytest.fixture
+def runtime_dir(monkeypatch):
+    # 常驻服务的目录放在一个短路径里（UNIX socket 路径有长度限制）
+    base = tempfile.mkdtemp(prefix="apd")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", base)
+    monkeypatch.setenv("LOCALAPPDATA", base)
+    yield base
+    shutil.rmtree(base, ignore_errors=True)
+
+
+def test_main_prints_and_archives_every_file(tmp_path, fake_run):
+    src, printer, excel = fake_run
+    files = _make_tree(src)
+
+    batch_printer.main(base_dir=str(tmp_path))
+
+    assert sorted(path for _, path in printer.printed) == sorted(p for p in files if p.endswith(".pdf"))
+    assert sorted(p for app in excel.instances for p in app.printed) == sorted(p for p in files if p.endswith(".xlsx"))
+    _assert_archived(tmp_path, src, files)
+
+
+def test_main_prints_through_the_daemon(tmp_path, fake_run, runtime_dir):
+    src, printer, excel = fake_run
+    files = _make_tree(src)
+    with open(tmp_path / "config.ini", "a", encoding="utf-8") as f:
+        f.write("print_daemon = true\n")
+
+    daemon = PrintDaemon(batch_printer.daemon_print, name=batch_printer.DAEMON_NAME,
+                         worker_exit=close_excel_session)
+    daemon.start()
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    try:
+        batch_printer.main(base_dir=str(tmp_path))
+        jobs = daemon.status()
+    finally:
+        with DaemonClient(batch_printer.DAEMON_NAME, timeout=5) as client:
+            client.shutdown()
+        thread.join(5)
+
+    # 每个文件都由常驻服务打印（月结单带着 monthly 选项），归档和账本仍由 main 处理
+    assert sorted(job["path"] for job in jobs) == sorted(files)
+    assert all(job["state"] == DONE for job in jobs)
+    assert all(job["options"] == {"monthly": "月结单" in job["path"]} for job in jobs)
+    assert sorted(path for _, path in printer.printed) == sorted(p for p in files if p.endswith(".pdf"))
+    # Excel 只在服务的打印线程里启动一次
+    assert excel.launches == 1
+    assert sorted(excel.instances[0].printed) == sorted(p for p in files if p.endswith(".xlsx"))
+    assert batch_printer.PRINT_CLIENT is None
+    _assert_archived(tmp_path, src, files)
+
+
+def test_main_prints_locally_when_the_daemon_is_not_running(tmp_path, fake_run, runtime_dir):
+    src, printer, excel = fake_run
+    files = _make_tree(src)
+    with open(tmp_path / "config.ini", "a", encoding="utf-8") as f:
+        f.write("print_daemon = true\n")
+
+    batch_printer.main(base_dir=str(tmp_path))
+
+    assert sorted(path for _, path in printer.printed) == sorted(p for p in files if p.endswith(".pdf"))
+    _assert_archived(tmp_path, src, files)
+
+
+def test_stuck_daemon_times_out_and_marks_the_file_failed(tmp_path, fake_run, runtime_dir):
+    src, printer, excel = fake_run
+    files = _make_tree(src)
+    with open(tmp_path / "config.ini", "a", encoding="utf-8") as f:
+        f.write("print_daemon = true\ndaemon_job_timeout = 0.5\n")
+
+    release = threading.Event()
+    started = []
+
+    def stuck_print(path, kind, monthly=False):
+        started.append(path)
+        release.wait(10)
+        return False
+
+    daemon = PrintDaemon(stuck_print, name=batch_printer.DAEMON_NAME)
+    daemon.start()
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with pytest.raises(SystemExit):
+            batch_printer.main(base_dir=str(tmp_path))
+    finally:
+        release.set()
+        with DaemonClient(batch_printer.DAEMON_NAME, timeout=5) as client:
+            client.shutdown()
+        thread.join(5)
+
+    # 第一个文件卡在服务里：不再等下去，记为打印失败，文件留在源目录
+    assert len(started) == 1
+    ledger = JobLedger(str(tmp_path / "job_ledger.db"))
+    try:
+        assert ledger.status(started[0]) == FAILED
+    finally:
+        ledger.close()
+    assert os.path.exists(started[0])
+    assert printer.printed == []
+    assert batch_printer.PRINT_CLIENT is None
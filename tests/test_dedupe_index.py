@@ -0,0 +1,98 @@
+import os
+
+from dedupe_index import DedupeIndex, find_archive_folders
+
+TODAY = "2025-06-02"
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def _setup(tmp_path):
+    source = tmp_path / "src"
+    source.mkdir()
+    old = tmp_path / "src_打印备份_2025-06-01"
+    today = tmp_path / f"src_打印备份_{TODAY}"
+    _write(old / "1001" / "a.pdf", b"A" * 100)
+    _write(old / "1001" / "b.pdf", b"B" * 200)
+    _write(today / "1002" / "c.pdf", b"C" * 300)
+    # 不是这个源目录的备份
+    _write(tmp_path / "other_打印备份_2025-06-01" / "x.pdf", b"A" * 100)
+    index = DedupeIndex(str(tmp_path / "dedupe.db"))
+    folders = find_archive_folders(str(source))
+    assert folders == [str(old), str(today)]
+    index.refresh(folders, today=TODAY)
+    return source, old, today, index, folders
+
+
+def test_size_prefilter_skips_hashing(tmp_path):
+    source, old, today, index, _ = _setup(tmp_path)
+    # 建索引时不计算哈希
+    assert index.hashed == 0
+    new = _write(source / "1003" / "n.pdf", b"N" * 150)
+    assert index.find_duplicate(new) == (None, None)
+    assert index.hashed == 0
+    index.close()
+
+
+def test_lazy_hashing_and_reuse(tmp_path):
+    source, old, today, index, _ = _setup(tmp_path)
+    same = _write(source / "1003" / "a.pdf", b"A" * 100)
+    duplicate, content_hash = index.find_duplicate(same)
+    assert duplicate == str(old / "1001" / "a.pdf")
+    assert content_hash is not None
+    # 只算了待检查文件和一个同样大小的已归档文件
+    assert index.hashed == 2
+
+    # 已归档文件的哈希已经保存，再查只算待检查文件
+    index.hashed = 0
+    different = _write(source / "1004" / "a.pdf", b"Z" * 100)
+    duplicate, _ = index.find_duplicate(different)
+    assert duplicate is None
+    assert index.hashed == 1
+    index.close()
+
+
+def test_modified_archive_file_not_trusted(tmp_path):
+    source, old, today, index, _ = _setup(tmp_path)
+    archived = old / "1001" / "a.pdf"
+    archived.write_bytes(b"Q" * 100)
+    st = os.stat(archived)
+    os.utime(archived, ns=(st.st_atime_ns, st.st_mtime_ns + 10_000_000_000))
+    same = _write(source / "1003" / "a.pdf", b"Q" * 100)
+    # 索引里的修改时间和磁盘上的对不上，不拿来比对
+    assert index.find_duplicate(same)[0] is None
+    index.close()
+
+
+def test_old_folders_sealed_today_rescanned(tmp_path):
+    source, old, today, index, folders = _setup(tmp_path)
+    late_old = _write(old / "1001" / "late.pdf", b"L" * 400)
+    late_today = _write(today / "1002" / "late.pdf", b"T" * 500)
+    # 往日的目录已封存，不再扫描；当天的目录继续扫描
+    assert index.refresh(folders, today=TODAY) == 1
+    assert index.find_duplicate(_write(source / "x" / "1.pdf", b"L" * 400))[0] is None
+    assert index.find_duplicate(_write(source / "x" / "2.pdf", b"T" * 500))[0] == late_today
+    assert os.path.exists(late_old)
+
+    # 第二天当天的目录也封存
+    assert index.refresh(folders, today="2025-06-03") == 1
+    assert index.refresh(folders, today="2025-06-03") == 0
+    index.close()
+
+
+def test_add_registers_archived_file_with_known_hash(tmp_path):
+    source, old, today, index, _ = _setup(tmp_path)
+    path = _write(source / "1005" / "d.pdf", b"D" * 600)
+    _, content_hash = index.find_duplicate(path)
+    assert content_hash is None
+    archived = _write(today / "1005" / "d.pdf", b"D" * 600)
+    index.add(archived, str(today), "given-hash")
+    index.hashed = 0
+    _, content_hash = index.find_duplicate(_write(source / "1006" / "d.pdf", b"D" * 600))
+    # 归档时登记的哈希直接用，不再读已归档文件
+    assert index.hashed == 1
+    index.close()
@@ -0,0 +1,192 @@
+import itertools
+import os
+import shutil
+from pathlib import Path
+
+from directory_poller import CREATED, DELETED, MOVED, DirectoryPoller
+from fake_backends import VirtualClock
+
+# 每次变化后给目录一个新的修改时间，不依赖文件系统的时间精度
+_MTIMES = itertools.count(1_700_000_000_000_000_000, 1_000_000_000)
+
+
+def _bump(*directories):
+    for directory in directories:
+        mtime_ns = next(_MTIMES)
+        os.utime(directory, ns=(mtime_ns, mtime_ns))
+
+
+def _write(path, data=b"x"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def _poller(root, **options):
+    events = []
+    clock = VirtualClock()
+    poller = DirectoryPoller(str(root), lambda *event: events.append(event), clock=clock, **options)
+    return poller, events, clock
+
+
+def _tree(tmp_path):
+    root = tmp_path / "share"
+    _write(root / "1001" / "a.pdf")
+    _write(root / "1002" / "b.pdf")
+    _write(root / "1001" / "sub" / "c.pdf")
+    return root
+
+
+def test_baseline_reports_nothing_then_creates(tmp_path):
+    root = _tree(tmp_path)
+    poller, events, clock = _poller(root)
+    poller.baseline()
+    assert len(poller) == 4
+    assert poller.tick() == 0
+    assert events == []
+
+    top = _write(root / "d.pdf")
+    nested = _write(root / "1001" / "sub" / "e.pdf")
+    _bump(root, root / "1001" / "sub")
+    clock.sleep(1)
+    assert poller.tick() == 2
+    assert sorted(events) == [(CREATED, nested, None, False), (CREATED, top, None, False)]
+
+    # 新目录整棵列出，里面已有的文件也报告为新建
+    events.clear()
+    inside = _write(root / "1003" / "deep" / "f.pdf")
+    _bump(root)
+    clock.sleep(1)
+    poller.tick()
+    assert events == [(CREATED, inside, None, False)]
+    assert len(poller) == 6
+
+
+def test_deletes(tmp_path):
+    root = _tree(tmp_path)
+    poller, events, clock = _poller(root)
+    poller.baseline()
+
+    os.remove(root / "1002" / "b.pdf")
+    _bump(root / "1002")
+    clock.sleep(1)
+    poller.tick()
+    assert events == [(DELETED, str(root / "1002" / "b.pdf"), None, False)]
+
+    # 删除整个目录只报告目录本身，子目录也不再轮询
+    events.clear()
+    shutil.rmtree(root / "1001")
+    _bump(root)
+    clock.sleep(1)
+    poller.tick()
+    assert events == [(DELETED, str(root / "1001"), None, True)]
+    assert len(poller) == 2
+
+
+def test_file_moved_across_directories(tmp_path):
+    root = _tree(tmp_path)
+    poller, events, clock = _poller(root)
+    poller.baseline()
+
+    src, dest = root / "1001" / "a.pdf", root / "1002" / "a_moved.pdf"
+    os.rename(src, dest)
+    _bump(root / "1001", root / "1002")
+    clock.sleep(1)
+    assert poller.tick() == 1
+    assert events == [(MOVED, str(src), str(dest), False)]
+
+
+def test_directory_move_keeps_tracking_the_tree(tmp_path):
+    root = _tree(tmp_path)
+    poller, events, clock = _poller(root)
+    poller.baseline()
+
+    archive = root / "archive"
+    archive.mkdir()
+    os.rename(root / "1001", archive / "1001")
+    _bump(root, archive)
+    clock.sleep(1)
+    poller.tick()
+    # 新建的 archive 目录里已经有移进来的目录：报告为移动，不是新建
+    assert events == [(MOVED, str(root / "1001"), str(archive / "1001"), True)]
+    assert len(poller) == 5
+
+    # 移动后的子目录按新路径继续监听
+    events.clear()
+    added = _write(archive / "1001" / "sub" / "g.pdf")
+    _bump(archive / "1001" / "sub")
+    clock.sleep(1)
+    poller.tick()
+    assert events == [(CREATED, added, None, False)]
+
+    # 移到已有的目录里
+    events.clear()
+    os.rename(root / "1002", archive / "1002")
+    _bump(root, archive)
+    clock.sleep(1)
+    poller.tick()
+    assert events == [(MOVED, str(root / "1002"), str(archive / "1002"), True)]
+    assert len(poller) == 5
+
+
+def test_stat_budget_spreads_checks_over_ticks(tmp_path):
+    root = tmp_path / "share"
+    for i in range(10):
+        (root / f"{1000 + i}").mkdir(parents=True)
+    poller, events, clock = _poller(root, stat_budget=3, hot_seconds=5)
+    poller.baseline()
+    assert len(poller) == 11
+
+    # 变化发生在最后才检查到的目录
+    last = Path(poller._order[-1])
+    added = _write(last / "a.pdf")
+    _bump(last)
+    ticks = 0
+    while not events:
+        clock.sleep(1)
+        poller.tick()
+        ticks += 1
+        assert poller.last_tick["io"] <= 3 + 1
+    # 每次只检查 3 个目录，11 个目录要 4 次轮询
+    assert ticks == 4
+    assert events == [(CREATED, added, None, False)]
+
+    # 有变化的目录在 hot_seconds 内每次都重新列出，修改时间没变也能发现
+    events.clear()
+    mtime_ns = os.stat(last).st_mtime_ns
+    second = _write(last / "b.pdf")
+    os.utime(last, ns=(mtime_ns, mtime_ns))
+    clock.sleep(1)
+    poller.tick()
+    assert events == [(CREATED, second, None, False)]
+
+    # 过了 hot_seconds 不再强制列出，修改时间不变的变化要等目录修改时间变了才发现
+    events.clear()
+    clock.sleep(10)
+    for _ in range(4):
+        poller.tick()
+    mtime_ns = os.stat(last).st_mtime_ns
+    _write(last / "c.pdf")
+    os.utime(last, ns=(mtime_ns, mtime_ns))
+    for _ in range(4):
+        clock.sleep(1)
+        poller.tick()
+    assert events == []
+
+
+def test_interval_backs_off_when_idle(tmp_path):
+    root = _tree(tmp_path)
+    poller, events, clock = _poller(root, min_interval=0.5, max_interval=4, backoff=2, hot_seconds=1)
+    poller.baseline()
+    intervals = []
+    for _ in range(5):
+        clock.sleep(1)
+        poller.tick()
+        intervals.append(poller.interval)
+    assert intervals == [1, 2, 4, 4, 4]
+
+    _write(root / "d.pdf")
+    _bump(root)
+    clock.sleep(1)
+    poller.tick()
+    assert poller.interval == 0.5
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from dispatcher import PrinterDispatcher
+from fake_backends import FakePrinterBackend
+
+
+def test_printers_run_in_parallel():
+    latency = 0.05
+    backend = FakePrinterBackend({"A4print": latency, "DotMatrix": latency})
+    dispatcher = PrinterDispatcher(backend.print_file)
+    start = time.perf_counter()
+    for i in range(4):
+        dispatcher.submit("A4print", f"monthly{i}.pdf")
+        dispatcher.submit("DotMatrix", f"file{i}.pdf")
+    assert dispatcher.wait()
+    elapsed = time.perf_counter() - start
+    dispatcher.close()
+
+    # 串行要 8 x latency，两台打印机重叠后接近 4 x latency
+    assert elapsed < 6 * latency
+    assert dispatcher.completed == 8
+    # 同一台打印机上按提交顺序打印
+    assert [p for printer, p in backend.printed if printer == "A4print"] == [f"monthly{i}.pdf" for i in range(4)]
+
+
+def test_failure_sets_failed_and_skips_the_rest():
+    archived = []
+
+    def handler(printer, job):
+        if job == "bad.pdf":
+            raise RuntimeError("打印机脱机")
+        return True
+
+    dispatcher = PrinterDispatcher(handler, on_success=archived.append)
+    for job in ("a.pdf", "bad.pdf", "b.pdf"):
+        dispatcher.submit("DotMatrix", job)
+    assert dispatcher.wait() is False
+    dispatcher.close()
+    assert dispatcher.failed
+    # 失败的文件不归档，之后的任务不再打印
+    assert archived == ["a.pdf"]
+
+
+def test_handler_returning_false_marks_failed():
+    dispatcher = PrinterDispatcher(lambda printer, job: False)
+    dispatcher.submit("A4print", "a.pdf")
+    assert dispatcher.wait() is False
+    dispatcher.close()
+    assert dispatcher.completed == 0
+
+
+def test_on_success_is_serialized():
+    backend = FakePrinterBackend({}, default_latency=0.001)
+    active = []
+    overlaps = []
+    guard = threading.Lock()
+
+    def on_success(job):
+        with guard:
+            active.append(job)
+            if len(active) > 1:
+                overlaps.append(tuple(active))
+        time.sleep(0.005)
+        with guard:
+            active.remove(job)
+
+    dispatcher = PrinterDispatcher(backend.print_file, on_success=on_success)
+    for i in range(10):
+        for printer in ("A4print", "DotMatrix", "Label"):
+            dispatcher.submit(printer, f"{printer}/{i}.pdf")
+    assert dispatcher.wait()
+    dispatcher.close()
+    assert dispatcher.completed == 30
+    assert overlaps == []
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from excel_pipeline import ExcelPrintPipeline
+
+
+def _pipeline(prepare, events, slots=2):
+    def release(prepared):
+        time.sleep(0.02)
+        events.append(("release", prepared))
+
+    return ExcelPrintPipeline(prepare, lambda prepared, path: events.append(("print", prepared)) or True,
+                              release, slots=slots)
+
+
+def test_prefetched_file_is_printed_once():
+    events = []
+    pipeline = _pipeline(lambda path: path, events)
+    pipeline.prefetch("a.xlsx", "a.xlsx")
+    assert pipeline.run("a.xlsx", "a.xlsx") is True
+    pipeline.close()
+    assert events == [("print", "a.xlsx"), ("release", "a.xlsx")]
+
+
+def test_discard_waits_for_open_workbook_to_close():
+    events = []
+    opening = threading.Event()
+    finish_open = threading.Event()
+
+    def prepare(path):
+        opening.set()
+        finish_open.wait(5)
+        events.append(("open", path))
+        return path
+
+    pipeline = _pipeline(prepare, events)
+    pipeline.prefetch("a.xlsx", "a.xlsx")
+    assert opening.wait(5)
+
+    discarded = threading.Event()
+
+    def discard():
+        pipeline.discard("a.xlsx")
+        discarded.set()
+
+    thread = threading.Thread(target=discard)
+    thread.start()
+    # Workbooks.Open 还没返回，discard 不能先返回
+    assert not discarded.wait(0.05)
+    finish_open.set()
+    thread.join(5)
+    # discard 返回时工作簿已经关闭，可以移动文件
+    assert events == [("open", "a.xlsx"), ("release", "a.xlsx")]
+    pipeline.close()
+
+
+def test_discard_before_prepare_starts_skips_opening():
+    events = []
+    block = threading.Event()
+
+    def prepare(path):
+        if path == "slow.xlsx":
+            block.wait(5)
+        events.append(("open", path))
+        return path
+
+    # 只有一个线程：b.xlsx 在 slow.xlsx 后面排队，还没开始准备
+    pipeline = _pipeline(prepare, events, slots=1)
+    pipeline.prefetch("slow.xlsx", "slow.xlsx")
+    pipeline.prefetch("b.xlsx", "b.xlsx")
+    pipeline.discard("b.xlsx")
+    block.set()
+    pipeline.run("slow.xlsx", "slow.xlsx")
+    pipeline.close()
+    assert ("open", "b.xlsx") not in events
@@ -0,0 +1,79 @@
+import threading
+
+import excel_session
+from excel_session import ExcelSession, close_excel_session, configure_excel_session, get_excel_session
+from fake_backends import FakeExcelBackend
+
+
+def test_one_launch_for_many_files():
+    backend = FakeExcelBackend()
+    session = ExcelSession(backend)
+    for i in range(5):
+        with session.workbook(f"{i}.xlsx") as wb:
+            wb.PrintOut()
+    assert backend.launches == 1
+    assert session.jobs == 5
+    assert backend.instances[0].printed == [f"{i}.xlsx" for i in range(5)]
+    # 用完的工作簿都关掉了
+    assert backend.instances[0].Workbooks.Count == 0
+
+
+def test_one_launch_per_thread(monkeypatch):
+    backend = FakeExcelBackend()
+    monkeypatch.setattr(excel_session, "_backend", None)
+    configure_excel_session(backend=backend)
+    sessions = []
+
+    def worker():
+        session = get_excel_session()
+        for i in range(3):
+            with session.workbook(f"{i}.xlsx"):
+                pass
+        sessions.append(session)
+        assert get_excel_session() is session
+        close_excel_session()
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert backend.launches == 3
+    assert len({id(s) for s in sessions}) == 3
+    assert all(app.quit_called for app in backend.instances)
+
+
+def test_restart_after_max_jobs():
+    backend = FakeExcelBackend()
+    session = ExcelSession(backend, max_jobs=2)
+    for i in range(5):
+        with session.workbook(f"{i}.xlsx"):
+            pass
+    assert backend.launches == 3
+    assert backend.instances[0].quit_called
+    assert backend.instances[1].quit_called
+    assert not backend.instances[2].quit_called
+
+
+def test_recover_after_excel_dies():
+    backend = FakeExcelBackend()
+    session = ExcelSession(backend)
+    with session.workbook("a.xlsx"):
+        pass
+    backend.instances[0].kill()
+    with session.workbook("b.xlsx") as wb:
+        wb.PrintOut()
+    assert backend.launches == 2
+    assert backend.instances[1].printed == ["b.xlsx"]
+
+
+def test_reset_restores_active_printer_and_closes_workbooks():
+    backend = FakeExcelBackend()
+    session = ExcelSession(backend)
+    excel = session.get_excel()
+    default = excel.ActivePrinter
+    excel.Workbooks.Open("left_open.xlsx")
+    with session.workbook("a.xlsx"):
+        excel.ActivePrinter = "A4 on Ne01:"
+    assert excel.ActivePrinter == default
+    assert excel.Workbooks.Count == 0
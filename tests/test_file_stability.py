@@ -0,0 +1,122 @@
+import os
+
+from fake_backends import VirtualClock
+from file_stability import StabilityTracker
+
+NOW = 1_700_000_000.0
+
+
+class FakeFiles:
+    """假的 os.stat：路径 -> (大小, 修改时间)，不存在的路径抛出 FileNotFoundError"""
+
+    def __init__(self):
+        self.files = {}
+
+    def __call__(self, path):
+        if path not in self.files:
+            raise FileNotFoundError(path)
+        size, mtime = self.files[path]
+        return os.stat_result((0o100644, 0, 0, 1, 0, 0, size, int(mtime), int(mtime), int(mtime)))
+
+
+def _tracker(files, clock, **options):
+    options.setdefault("quiet_seconds", 1.0)
+    options.setdefault("max_wait", 60)
+    options.setdefault("probe", lambda path: True)
+    # 墙上时间和单调时钟一起走
+    return StabilityTracker(clock=clock, wall_clock=lambda: NOW + clock(), stat=files, **options)
+
+
+def test_growing_file_waits_until_quiet():
+    clock, files = VirtualClock(), FakeFiles()
+    tracker = _tracker(files, clock)
+    files.files["a.pdf"] = (100, NOW)
+    tracker.add("a.pdf")
+    for size in (200, 300, 400):
+        assert tracker.poll() == []
+        clock.sleep(0.5)
+        files.files["a.pdf"] = (size, NOW + clock())
+    # 停止变化后还要静止 quiet_seconds
+    assert tracker.poll() == []
+    clock.sleep(0.5)
+    assert tracker.poll() == []
+    clock.sleep(0.6)
+    assert tracker.poll() == ["a.pdf"]
+    assert len(tracker) == 0
+
+
+def test_preserved_old_mtime_needs_a_second_unchanged_poll():
+    clock, files = VirtualClock(), FakeFiles()
+    tracker = _tracker(files, clock)
+    # cp -p / rsync -t：修改时间是一年前，第一次看到时文件还在写
+    old = NOW - 365 * 86400
+    files.files["copy.pdf"] = (1000, old)
+    tracker.add("copy.pdf")
+    assert tracker.poll() == []
+    clock.sleep(0.25)
+    files.files["copy.pdf"] = (5000, old)
+    # 大小变了：重新计时
+    assert tracker.poll() == []
+    clock.sleep(0.25)
+    assert tracker.poll() == []
+    clock.sleep(1.0)
+    assert tracker.poll() == ["copy.pdf"]
+
+
+def test_already_complete_file_ready_on_second_poll():
+    clock, files = VirtualClock(), FakeFiles()
+    tracker = _tracker(files, clock)
+    files.files["old.pdf"] = (1000, NOW - 3600)
+    tracker.add("old.pdf")
+    assert tracker.poll() == []
+    clock.sleep(0.25)
+    # 大小和修改时间没变，按修改时间算早已静止，不用再等 quiet_seconds
+    assert tracker.poll() == ["old.pdf"]
+
+
+def test_locked_file_waits_for_probe():
+    clock, files = VirtualClock(), FakeFiles()
+    locked = {"a.pdf"}
+    tracker = _tracker(files, clock, probe=lambda path: path not in locked)
+    files.files["a.pdf"] = (100, NOW - 3600)
+    tracker.add("a.pdf")
+    tracker.poll()
+    clock.sleep(1)
+    assert tracker.poll() == []
+    locked.clear()
+    assert tracker.poll() == ["a.pdf"]
+
+
+def test_abandoned_after_max_wait_or_deleted():
+    clock, files = VirtualClock(), FakeFiles()
+    tracker = _tracker(files, clock, max_wait=10)
+    files.files["slow.pdf"] = (0, NOW)
+    files.files["gone.pdf"] = (0, NOW)
+    tracker.add("slow.pdf")
+    tracker.add("gone.pdf")
+    tracker.poll()
+    del files.files["gone.pdf"]
+    for i in range(12):
+        clock.sleep(1)
+        # 一直在写
+        files.files["slow.pdf"] = (i + 1, NOW + clock())
+        assert tracker.poll() == []
+    assert sorted(tracker.take_abandoned()) == ["gone.pdf", "slow.pdf"]
+    assert tracker.take_abandoned() == []
+    assert len(tracker) == 0
+
+
+def test_readd_resets_quiet_timer():
+    clock, files = VirtualClock(), FakeFiles()
+    tracker = _tracker(files, clock)
+    files.files["a.pdf"] = (100, NOW)
+    tracker.add("a.pdf")
+    tracker.poll()
+    clock.sleep(0.9)
+    # 又收到 modified 事件
+    tracker.add("a.pdf")
+    clock.sleep(0.5)
+    assert tracker.poll() == []
+    clock.sleep(0.6)
+    assert tracker.poll() == ["a.pdf"]
+    assert tracker.take_pending() == []
@@ -0,0 +1,79 @@
+import sqlite3
+
+from job_ledger import ARCHIVED, FAILED, PLANNED, PRINTED, SUBMITTED, JobLedger
+
+
+def _rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT path, status FROM jobs"))
+    finally:
+        conn.close()
+
+
+def test_plan_registers_new_files_once(tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.db"))
+    assert ledger.plan(["a.pdf", "b.pdf"]) == 2
+    assert ledger.status("a.pdf") == PLANNED
+    ledger.mark("a.pdf", SUBMITTED)
+    # 打印中的文件再次登记时状态不变
+    assert ledger.plan(["a.pdf", "b.pdf", "c.pdf"]) == 1
+    assert ledger.status("a.pdf") == SUBMITTED
+    assert ledger.counts() == {SUBMITTED: 1, PLANNED: 2}
+    ledger.close()
+
+
+def test_resume_after_crash(tmp_path):
+    db_path = str(tmp_path / "ledger.db")
+    ledger = JobLedger(db_path)
+    ledger.plan(["a.pdf", "b.pdf", "c.pdf", "d.pdf"])
+    ledger.mark("a.pdf", PRINTED)
+    ledger.mark("a.pdf", ARCHIVED)
+    ledger.mark("b.pdf", PRINTED)
+    ledger.mark("c.pdf", SUBMITTED)
+    # 模拟崩溃：不调用 prune()，直接丢掉连接
+    ledger.conn.close()
+
+    ledger = JobLedger(db_path)
+    # 已打印未归档的只归档，提交后中断的重新打印，已归档的不再读进来
+    assert ledger.status("b.pdf") == PRINTED
+    assert ledger.status("c.pdf") == SUBMITTED
+    assert ledger.status("d.pdf") == PLANNED
+    assert ledger.status("a.pdf") is None
+    assert sorted(ledger.pending()) == ["b.pdf", "c.pdf", "d.pdf"]
+    ledger.close()
+
+
+def test_failed_file_is_planned_again(tmp_path):
+    db_path = str(tmp_path / "ledger.db")
+    ledger = JobLedger(db_path)
+    ledger.plan(["a.pdf"])
+    ledger.mark("a.pdf", SUBMITTED)
+    ledger.mark("a.pdf", FAILED)
+    ledger.close()
+
+    ledger = JobLedger(db_path)
+    assert ledger.status("a.pdf") == FAILED
+    assert ledger.pending() == ["a.pdf"]
+    # 下次运行重新登记，从头打印
+    assert ledger.plan(["a.pdf"]) == 1
+    assert ledger.status("a.pdf") == PLANNED
+    ledger.close()
+
+
+def test_prune_drops_archived_history(tmp_path):
+    db_path = str(tmp_path / "ledger.db")
+    ledger = JobLedger(db_path)
+    ledger.plan([f"{i}.pdf" for i in range(100)] + ["left.pdf"])
+    for i in range(100):
+        ledger.mark(f"{i}.pdf", ARCHIVED)
+    assert ledger.prune() == 100
+    assert ledger.pending() == ["left.pdf"]
+    ledger.close()
+
+    # 数据库里只剩没处理完的文件，启动开销和历史记录无关
+    assert _rows(db_path) == {"left.pdf": PLANNED}
+    ledger = JobLedger(db_path)
+    # 同名文件重新导出时当作新文件
+    assert ledger.plan(["0.pdf"]) == 1
+    ledger.close()
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+pypdf = pytest.importorskip("pypdf")
+
+from fake_backends import write_text_pdf
+from merge_print import build_directory_document, merge_pdfs
+
+
+def _texts(path):
+    return [page.extract_text() for page in pypdf.PdfReader(path).pages]
+
+
+def test_merge_keeps_order_and_content(tmp_path):
+    first = write_text_pdf(str(tmp_path / "a.pdf"), ["a1", "a2"])
+    second = write_text_pdf(str(tmp_path / "b.pdf"), ["b1"])
+    third = write_text_pdf(str(tmp_path / "c.pdf"), ["c1", "c2", "c3"])
+    output = str(tmp_path / "merged.pdf")
+    assert merge_pdfs([first, second, third], output) == 6
+    assert _texts(output) == ["a1", "a2", "b1", "c1", "c2", "c3"]
+    # 临时文件已经改名
+    assert sorted(os.listdir(tmp_path)) == ["a.pdf", "b.pdf", "c.pdf", "merged.pdf"]
+
+
+def test_failed_merge_keeps_previous_output(tmp_path):
+    good = write_text_pdf(str(tmp_path / "a.pdf"), ["a1"])
+    output = str(tmp_path / "merged.pdf")
+    merge_pdfs([good], output)
+    damaged = tmp_path / "bad.pdf"
+    damaged.write_bytes(b"not a pdf at all")
+    with pytest.raises(Exception):
+        merge_pdfs([good, str(damaged)], output)
+    # 已有的合并文件不被覆盖，也不留下写了一半的临时文件
+    assert _texts(output) == ["a1"]
+    assert not os.path.exists(output + ".tmp")
+
+
+def test_build_directory_document_converts_excel(tmp_path):
+    merge_dir = tmp_path / "merged"
+    merge_dir.mkdir()
+    pdf = write_text_pdf(str(tmp_path / "a.pdf"), ["pdf"])
+    converted = []
+
+    def convert_excel(path, use_alt, pdf_path):
+        converted.append((path, use_alt))
+        write_text_pdf(pdf_path, [f"excel {os.path.basename(path)}"])
+
+    output, pages = build_directory_document(
+        [(pdf, "pdf", False), ("b.xlsx", "excel", True)], str(merge_dir), "0001_1001", convert_excel)
+    assert pages == 2
+    assert output == str(merge_dir / "0001_1001_合并.pdf")
+    assert _texts(output) == ["pdf", "excel b.xlsx"]
+    assert converted == [("b.xlsx", True)]
+
+    with pytest.raises(ValueError):
+        build_directory_document([("c.txt", "other", False)], str(merge_dir), "x", convert_excel)
@@ -0,0 +1,236 @@
+import re
+import struct
+import sys
+import zipfile
+import zlib
+
+import pytest
+
+import page_count
+from fake_backends import text_pdf_bytes
+from page_count import PageCounter, pdf_page_count, xlsx_page_estimate
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def _append_revision(data, objects, size):
+    """增量更新：在文件末尾追加新版本的对象、一个新的 xref 段和带 /Prev 的 trailer"""
+    prev = int(re.findall(rb"startxref\s+(\d+)", data)[-1])
+    out = bytearray(data)
+    offsets = {}
+    for number, body in sorted(objects.items()):
+        offsets[number] = len(out)
+        out += f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n"
+    numbers = sorted(offsets)
+    # 连续的对象编号放在同一个小节
+    start = 0
+    for i in range(1, len(numbers) + 1):
+        if i == len(numbers) or numbers[i] != numbers[i - 1] + 1:
+            out += f"{numbers[start]} {i - start}\n".encode("ascii")
+            for number in numbers[start:i]:
+                out += f"{offsets[number]:010d} 00000 n \n".encode("ascii")
+            start = i
+    out += f"trailer\n<< /Size {size} /Root 1 0 R /Prev {prev} >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def _xref_stream_pdf(objects, compressed=()):
+    """
+    PDF 1.5 风格：交叉引用流代替 xref 表；compressed 里的对象放进一个 Flate 压缩的对象流
+    objects 是 {编号: 内容}，对象流和交叉引用流的编号接在后面
+    """
+    out = bytearray(b"%PDF-1.5\n")
+    entries = {0: (0, 0, 65535)}
+    plain = [n for n in sorted(objects) if n not in compressed]
+    for number in plain:
+        entries[number] = (1, len(out), 0)
+        out += f"{number} 0 obj\n".encode("ascii") + objects[number] + b"\nendobj\n"
+
+    last = max(objects)
+    if compressed:
+        stream_number = last = last + 1
+        header, body = [], b""
+        for index, number in enumerate(compressed):
+            header.append(f"{number} {len(body)}")
+            body += objects[number] + b"\n"
+            entries[number] = (2, stream_number, index)
+        header = (" ".join(header) + "\n").encode("ascii")
+        data = zlib.compress(header + body)
+        entries[stream_number] = (1, len(out), 0)
+        out += (f"{stream_number} 0 obj\n<< /Type /ObjStm /N {len(compressed)} /First {len(header)} "
+                f"/Filter /FlateDecode /Length {len(data)} >>\nstream\n").encode("ascii")
+        out += data + b"\nendstream\nendobj\n"
+
+    xref_number = last + 1
+    xref = len(out)
+    entries[xref_number] = (1, xref, 0)
+    rows = b"".join(struct.pack(">BIH", *entries[n]) for n in range(xref_number + 1))
+    out += (f"{xref_number} 0 obj\n<< /Type /XRef /Size {xref_number + 1} /W [1 4 2] /Root 1 0 R "
+            f"/Length {len(rows)} >>\nstream\n").encode("ascii")
+    out += rows + b"\nendstream\nendobj\n"
+    out += f"startxref\n{xref}\n%%EOF\n".encode("ascii")
+    return bytes(out)
+
+
+def _pages_tree(count):
+    kids = " ".join(f"{3 + i} 0 R" for i in range(count))
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode("ascii"),
+    }
+    for i in range(count):
+        objects[3 + i] = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>"
+    return objects
+
+
+def test_simple_pdf_read_from_xref(tmp_path):
+    path = _write(tmp_path / "a.pdf", text_pdf_bytes(["1", "2", "3"]))
+    with open(path, "rb") as f:
+        assert page_count._pdf_count_from_xref(f.read()) == 3
+    assert pdf_page_count(path) == 3
+
+
+def test_incremental_updates_use_the_latest_revision(tmp_path):
+    # 原始版本 3 页：对象 1 = Catalog，2 = Pages，4 / 6 / 8 = Page
+    data = text_pdf_bytes(["a", "b", "c"])
+    # 第二版加一页（新对象 10、11，和改过的 2 不连续，xref 有两个小节）
+    page = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 11 0 R >>"
+    data = _append_revision(data, {
+        2: b"<< /Type /Pages /Kids [4 0 R 6 0 R 8 0 R 10 0 R] /Count 4 >>",
+        10: page,
+        11: b"<< /Length 0 >>\nstream\n\nendstream",
+    }, size=12)
+    # 第三版删掉两页
+    data = _append_revision(data, {2: b"<< /Type /Pages /Kids [4 0 R 10 0 R] /Count 2 >>"}, size=12)
+    path = _write(tmp_path / "edited.pdf", data)
+
+    assert pdf_page_count(path) == 2
+    # 只扫描文件会看到旧版本留下的 /Count 4
+    assert page_count._pdf_count_from_scan(data) == 4
+    pypdf = pytest.importorskip("pypdf")
+    assert len(pypdf.PdfReader(path).pages) == 2
+
+
+def test_xref_stream_falls_back_to_scan(tmp_path, monkeypatch):
+    data = _xref_stream_pdf(_pages_tree(3))
+    path = _write(tmp_path / "modern.pdf", data)
+    assert page_count._pdf_count_from_xref(data) is None
+    # 页面树没有压缩：扫描就能读到，不用 pypdf
+    monkeypatch.setitem(sys.modules, "pypdf", None)
+    assert pdf_page_count(path) == 3
+
+
+def test_compressed_page_tree_read_with_pypdf(tmp_path):
+    pytest.importorskip("pypdf")
+    data = _xref_stream_pdf(_pages_tree(2), compressed=(1, 2))
+    path = _write(tmp_path / "objstm.pdf", data)
+    # 页面树在对象流里：xref 和扫描都读不到，交给 pypdf
+    assert page_count._pdf_count_from_xref(data) is None
+    assert page_count._pdf_count_from_scan(data) is None
+    assert pdf_page_count(path) == 2
+
+
+def test_damaged_pdf_falls_back_to_scan(tmp_path):
+    data = text_pdf_bytes(["a", "b"])
+    # 下载到一半：没有 xref 和 trailer
+    truncated = _write(tmp_path / "truncated.pdf", data[:data.index(b"xref")])
+    assert pdf_page_count(truncated) == 2
+    # startxref 指向的位置不是 xref 表
+    broken = re.sub(rb"startxref\s+\d+", b"startxref\n9", data)
+    assert page_count._pdf_count_from_xref(broken) is None
+    assert pdf_page_count(_write(tmp_path / "broken.pdf", broken)) == 2
+    assert pdf_page_count(_write(tmp_path / "empty.pdf", b"")) is None
+
+
+_WORKBOOK = (
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+    '<sheet name="tall" sheetId="1" r:id="rId1"/>'
+    '<sheet name="hidden" sheetId="2" state="hidden" r:id="rId2"/>'
+    '<sheet name="wide" sheetId="3" r:id="rId3"/>'
+    '<sheet name="empty" sheetId="4" r:id="rId4"/>'
+    '</sheets></workbook>'
+)
+_RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    + "".join(f'<Relationship Id="rId{i}" Target="worksheets/sheet{i}.xml"/>' for i in range(1, 5))
+    + '</Relationships>'
+)
+
+
+def _sheet(rows, cols=""):
+    data = "".join(f'<row r="{r}"{extra}><c r="{ref}{r}"><v>1</v></c></row>' for r, ref, extra in rows)
+    return ('<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'{cols}<sheetData>{data}</sheetData></worksheet>')
+
+
+def _write_xlsx(path):
+    # tall：A 列 100 行，默认行高 15 磅，其中 10 行隐藏 -> 1350 磅高、1 列宽
+    tall = _sheet([(r, "A", ' hidden="1"' if r <= 10 else "") for r in range(1, 101)])
+    # wide：20 列、每列 20 个字符宽（108.75 磅） -> 2175 磅宽、1 行高
+    wide = _sheet([(1, "T", "")], cols='<cols><col min="1" max="20" width="20"/></cols>')
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("xl/workbook.xml", _WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", _RELS)
+        zf.writestr("xl/worksheets/sheet1.xml", tall)
+        zf.writestr("xl/worksheets/sheet2.xml", _sheet([(r, "A", "") for r in range(1, 1000)]))
+        zf.writestr("xl/worksheets/sheet3.xml", wide)
+        zf.writestr("xl/worksheets/sheet4.xml", _sheet([]))
+    return str(path)
+
+
+def test_xlsx_estimate(tmp_path):
+    path = _write_xlsx(tmp_path / "a.xlsx")
+    # A4 可用区域约 494 × 734 磅：tall 2 页，wide 5 页；隐藏的工作表和空表不算
+    assert xlsx_page_estimate(path) == 2 + 5
+    # 缩小到 50%：tall 1 页，wide 3 页
+    assert xlsx_page_estimate(path, zoom=50) == 1 + 3
+    # 132 列针式打印纸（约 979 × 684 磅）：tall 2 页，wide 3 页
+    assert xlsx_page_estimate(path, paper_size=132) == 2 + 3
+    assert xlsx_page_estimate(path, fit_to_page=True) == 2
+
+
+def test_page_counter_cache_hits_and_misses(tmp_path):
+    pdf = _write(tmp_path / "a.pdf", text_pdf_bytes(["1", "2"]))
+    xlsx = _write_xlsx(tmp_path / "b.xlsx")
+    db = str(tmp_path / "cache" / "pages.db")
+
+    counter = PageCounter(db)
+    assert counter.count(pdf) == 2
+    assert counter.count(xlsx) == 7
+    assert counter.count(pdf) == 2
+    assert (counter.hits, counter.misses) == (1, 2)
+    # 页面设置不同是另一条缓存
+    assert counter.count(xlsx, paper_size=132) == 5
+    assert counter.misses == 3
+    # 不支持的类型和不存在的文件不计入
+    assert counter.count(str(tmp_path / "c.xls")) is None
+    assert counter.count(str(tmp_path / "missing.pdf")) is None
+    assert counter.misses == 3
+    counter.close()
+
+    # 重新打开：缓存从 SQLite 读回来
+    counter = PageCounter(db)
+    assert counter.count(pdf) == 2
+    assert counter.count(xlsx, paper_size=132) == 5
+    assert (counter.hits, counter.misses) == (2, 0)
+
+    # 文件变了（大小不同）重新计算
+    _write(tmp_path / "a.pdf", text_pdf_bytes(["1", "2", "3"]))
+    assert counter.count(pdf) == 3
+    assert counter.misses == 1
+    counter.close()
+
+
+def test_page_counter_does_not_cache_unreadable_files(tmp_path):
+    path = _write(tmp_path / "bad.pdf", b"this is not a pdf")
+    counter = PageCounter()
+    assert counter.count(path) is None
+    assert counter.count(path) is None
+    assert (counter.hits, counter.misses) == (0, 2)
+    counter.close()
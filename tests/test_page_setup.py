@@ -0,0 +1,124 @@
+import logging
+
+import pytest
+
+from fake_backends import FakeExcelApplication, FakePageSetup
+from page_setup import FALLBACK_PAPER_SIZE, PageSetupCache
+
+DOT_MATRIX = {"PaperSize": 132, "Zoom": 75, "FitToPagesWide": False, "FitToPagesTall": False, "Orientation": 1}
+A4_FIT = {"PaperSize": 9, "Zoom": False, "FitToPagesWide": 1, "FitToPagesTall": 1, "Orientation": 1}
+
+
+def _open(app, name):
+    return app.Workbooks.Open(name)
+
+
+def test_properties_already_at_target_are_not_written():
+    app = FakeExcelApplication(sheet_count=2)
+    cache = PageSetupCache(fingerprint=None)
+    wb = _open(app, "a.xlsx")
+    assert cache.apply(app, wb, "a.xlsx", "DotMatrix", dict(FakePageSetup.DEFAULTS)) == 0
+    assert app.com_writes == 0
+    assert app.driver_calls == 0
+
+    # A4 和方向已经是目标值，只写 Zoom / FitToPagesWide / FitToPagesTall
+    wb = _open(app, "b.xlsx")
+    assert cache.apply(app, wb, "b.xlsx", "DotMatrix", A4_FIT) == 6
+    assert app.com_writes == 6
+    for sheet in wb.Sheets:
+        assert sheet.PageSetup.Zoom is False
+        assert sheet.PageSetup.FitToPagesWide == 1
+
+
+def test_unsupported_paper_probed_once_then_a4(caplog):
+    app = FakeExcelApplication(sheet_count=3, unsupported_papers={132})
+    cache = PageSetupCache(fingerprint=None)
+    with caplog.at_level(logging.WARNING):
+        first = _open(app, "a.xlsx")
+        cache.apply(app, first, "a.xlsx", "DotMatrix", DOT_MATRIX)
+        # 试写一次 132 失败，然后三个表只写 Zoom
+        assert app.com_writes == 1 + 3
+        assert cache.paper_supported("DotMatrix", 132) is False
+
+        app.com_writes = 0
+        second = _open(app, "b.xlsx")
+        cache.apply(app, second, "b.xlsx", "DotMatrix", DOT_MATRIX)
+    # 之后的工作簿直接用 A4，不再试 132
+    assert app.com_writes == 3
+    assert len([r for r in caplog.records if "不支持纸张" in r.getMessage()]) == 1
+    for wb in (first, second):
+        for sheet in wb.Sheets:
+            assert sheet.PageSetup.PaperSize == FALLBACK_PAPER_SIZE
+            assert sheet.PageSetup.Zoom == 75
+
+    # 换一台打印机要重新试
+    other = _open(app, "c.xlsx")
+    cache.apply(app, other, "c.xlsx", "LaserJet", DOT_MATRIX)
+    assert cache.paper_supported("LaserJet", 132) is False
+
+
+def test_supported_paper_probe_is_not_written_twice():
+    app = FakeExcelApplication(sheet_count=2)
+    cache = PageSetupCache(fingerprint=lambda path: "template-1")
+    first = _open(app, "a.xlsx")
+    # 试写第一个表的 132 成功：这个表不再写 PaperSize，另一个表在批量里写；每个表各写 PaperSize + Zoom
+    assert cache.apply(app, first, "a.xlsx", "DotMatrix", DOT_MATRIX) == 4
+    assert app.com_writes == 4
+    # 试写一次直接和驱动通信，批量写入重新开启 PrintCommunication 时再通信一次
+    assert app.driver_calls == 2
+    assert cache.paper_supported("DotMatrix", 132) is True
+    for sheet in first.Sheets:
+        assert sheet.PageSetup.PaperSize == 132
+        assert sheet.PageSetup.Zoom == 75
+
+    # 同模板的下一个工作簿命中缓存，两个表的纸张都要写
+    app.com_writes = 0
+    second = _open(app, "b.xlsx")
+    assert cache.apply(app, second, "b.xlsx", "DotMatrix", DOT_MATRIX) == 4
+    assert app.com_writes == 4
+    assert all(sheet.PageSetup.PaperSize == 132 for sheet in second.Sheets)
+
+
+def test_same_template_is_a_cache_hit_without_reads():
+    app = FakeExcelApplication(sheet_count=2)
+    cache = PageSetupCache(fingerprint=lambda path: "template-1")
+    first = _open(app, "1001/a.xlsx")
+    assert cache.apply(app, first, "1001/a.xlsx", "A4print", A4_FIT) == 6
+    assert cache.template_misses == 1
+    assert app.com_reads > 0
+
+    app.com_reads = 0
+    second = _open(app, "1002/a.xlsx")
+    assert cache.apply(app, second, "1002/a.xlsx", "A4print", A4_FIT) == 6
+    assert cache.template_hits == 1
+    assert app.com_reads == 0
+    for sheet in second.Sheets:
+        assert sheet.PageSetup.FitToPagesTall == 1
+
+    # 目标不同（另一种打印机设置）不能用同一条缓存
+    third = _open(app, "1003/a.xlsx")
+    cache.apply(app, third, "1003/a.xlsx", "A4print", dict(A4_FIT, Orientation=2))
+    assert cache.template_misses == 2
+
+
+def test_writes_batched_while_print_communication_off():
+    app = FakeExcelApplication(sheet_count=3)
+    cache = PageSetupCache(fingerprint=None)
+    wb = _open(app, "a.xlsx")
+    assert cache.apply(app, wb, "a.xlsx", "A4print", A4_FIT) == 9
+    # 九次写入都在 PrintCommunication 关闭时缓存，重新开启时只和驱动通信一次
+    assert app.com_writes == 9
+    assert app.driver_calls == 1
+    assert app.pending_driver_writes == 0
+    assert app.PrintCommunication is True
+
+
+def test_print_communication_restored_when_a_write_fails():
+    app = FakeExcelApplication(sheet_count=1, unsupported_papers={132})
+    cache = PageSetupCache(fingerprint=None)
+    # 缓存里记着 132 可用（例如换了驱动），批量写入时失败
+    cache._paper_supported[("DotMatrix", 132)] = True
+    wb = _open(app, "a.xlsx")
+    with pytest.raises(RuntimeError):
+        cache.apply(app, wb, "a.xlsx", "DotMatrix", DOT_MATRIX)
+    assert app.PrintCommunication is True
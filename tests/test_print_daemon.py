@@ -0,0 +1,208 @@
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+
+import pytest
+
+import excel_session
+import print_daemon
+from excel_session import close_excel_session, configure_excel_session, get_excel_session
+from fake_backends import FakeExcelBackend
+from print_daemon import CANCELLED, DONE, FAILED, DaemonClient, PrintDaemon
+
+posix_only = pytest.mark.skipif(sys.platform == "win32", reason="UNIX socket 和文件权限")
+
+
+@pytest.fixture
+def service_dir():
+    # UNIX socket 路径有长度限制，不用 pytest 的 tmp_path
+    base = tempfile.mkdtemp(prefix="apd")
+    yield os.path.join(base, "svc")
+    for root, dirs, files in os.walk(base, topdown=False):
+        for name in files:
+            os.unlink(os.path.join(root, name))
+        for name in dirs:
+            os.rmdir(os.path.join(root, name))
+    os.rmdir(base)
+
+
+@pytest.fixture
+def excel(monkeypatch):
+    backend = FakeExcelBackend()
+    monkeypatch.setattr(excel_session, "_backend", None)
+    configure_excel_session(backend=backend)
+    return backend
+
+
+def _start(daemon):
+    daemon.start()
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def _files(tmp_path, *names):
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(b"x")
+        paths.append(str(path))
+    return paths
+
+
+def test_submit_cancel_status_shutdown(tmp_path, service_dir, excel):
+    gate = threading.Event()
+    options_seen = []
+
+    def print_func(path, kind, **options):
+        options_seen.append(options)
+        gate.wait(5)
+        if path.endswith("bad.xlsx"):
+            return False
+        with get_excel_session().workbook(path) as wb:
+            wb.PrintOut()
+        return True
+
+    daemon = PrintDaemon(print_func, name="t", directory=service_dir, worker_exit=close_excel_session)
+    thread = _start(daemon)
+    first, second, bad = _files(tmp_path, "1.xlsx", "2.xlsx", "bad.xlsx")
+
+    with DaemonClient("t", directory=service_dir, timeout=5) as client:
+        ids = client.submit([first, second, bad], options={"monthly": True})
+        assert len(ids) == 3
+        # 第一个正在打印（卡在 gate），第二个还在排队，可以取消
+        assert client.cancel(ids[1])
+        assert not client.cancel(ids[1])
+        gate.set()
+        jobs = client.wait(ids, interval=0.01, timeout=5)
+        assert [jobs[i]["state"] for i in ids] == [DONE, CANCELLED, FAILED]
+        assert client.status(ids[0])["jobs"][0]["path"] == first
+        assert client.shutdown()
+
+    thread.join(5)
+    assert not thread.is_alive()
+    assert options_seen == [{"monthly": True}, {"monthly": True}]
+    # Excel 只启动一次，打印线程退出时关掉
+    assert excel.launches == 1
+    assert excel.instances[0].printed == [first]
+    assert excel.instances[0].quit_called
+    # 停止后连接信息和 socket 都删掉了
+    assert not os.path.exists(os.path.join(service_dir, "t.json"))
+
+
+@posix_only
+def test_private_dir_secret_and_socket(service_dir):
+    daemon = PrintDaemon(lambda path, kind: True, name="t", directory=service_dir)
+    thread = _start(daemon)
+    try:
+        assert stat.S_IMODE(os.stat(service_dir).st_mode) == 0o700
+        for name in ("daemon.key", "t.json", "t.sock"):
+            assert stat.S_IMODE(os.stat(os.path.join(service_dir, name)).st_mode) == 0o600
+        with open(os.path.join(service_dir, "daemon.key")) as f:
+            secret = f.read()
+        assert len(secret) == 64 and secret != "auto_printer"
+    finally:
+        with DaemonClient("t", directory=service_dir, timeout=5) as client:
+            client.shutdown()
+        thread.join(5)
+
+    # 再次启动沿用同一个密钥
+    assert print_daemon.load_secret(service_dir) == secret.encode("ascii")
+
+
+def _raw_connect(service_dir, name="t"):
+    with open(os.path.join(service_dir, f"{name}.json")) as f:
+        endpoint = json.load(f)
+    family = socket.AF_UNIX if endpoint["family"] == "unix" else socket.AF_INET
+    conn = socket.socket(family, socket.SOCK_STREAM)
+    conn.settimeout(5)
+    address = endpoint["address"] if endpoint["family"] == "unix" else tuple(endpoint["address"])
+    conn.connect(address)
+    return conn, conn.makefile("rwb")
+
+
+def test_wrong_secret_and_malformed_messages_are_rejected(tmp_path, service_dir):
+    printed = []
+    daemon = PrintDaemon(lambda path, kind: printed.append(path) or True, name="t", directory=service_dir)
+    thread = _start(daemon)
+    path, = _files(tmp_path, "a.pdf")
+    try:
+        # 密钥不对：不处理任何请求，直接断开
+        conn, stream = _raw_connect(service_dir)
+        with conn, stream:
+            assert "challenge" in print_daemon.recv_message(stream)
+            print_daemon.send_message(stream, {"auth": "0" * 64})
+            # 服务端读完认证就关闭连接，不回复 {"ok": True}
+            assert print_daemon.recv_message(stream) is None
+
+        # 不是 JSON：断开连接，服务继续运行
+        conn, stream = _raw_connect(service_dir)
+        with conn, stream:
+            print_daemon.recv_message(stream)
+            stream.write(b"\x80\x04pickle\n")
+            stream.flush()
+            assert print_daemon.recv_message(stream) is None
+
+        with DaemonClient("t", directory=service_dir, timeout=5) as client:
+            assert client._call(op="submit", paths="a.pdf") == {"ok": False, "error": "paths 必须是字符串列表"}
+            assert not client._call(op="eval")["ok"]
+            ids = client.submit([path])
+            client.wait(ids, interval=0.01, timeout=5)
+    finally:
+        with DaemonClient("t", directory=service_dir, timeout=5) as client:
+            client.shutdown()
+        thread.join(5)
+    assert printed == [path]
+
+
+def test_malformed_requests_get_error_replies(tmp_path, service_dir):
+    printed = []
+    daemon = PrintDaemon(lambda path, kind: printed.append(path) or True, name="t", directory=service_dir)
+    thread = _start(daemon)
+    path, = _files(tmp_path, "a.pdf")
+    try:
+        conn, stream = _raw_connect(service_dir)
+        with conn, stream:
+            challenge = print_daemon.recv_message(stream)["challenge"]
+            secret = print_daemon.load_secret(service_dir)
+            print_daemon.send_message(stream, {"auth": print_daemon._sign(secret, challenge)})
+            assert print_daemon.recv_message(stream) == {"ok": True}
+
+            # 认证之后每个请求都有回复，连接不断开
+            for line in (b"[1, 2]\n", b"not json\n"):
+                stream.write(line)
+                stream.flush()
+                reply = print_daemon.recv_message(stream)
+                assert reply["ok"] is False and "无法解析" in reply["error"]
+            for request in ({"op": "status", "job": [1]}, {"op": "status", "job": {"id": 1}},
+                            {"op": "status", "job": True}, {"op": "cancel", "job": "1"}, {"op": "cancel"}):
+                print_daemon.send_message(stream, request)
+                assert print_daemon.recv_message(stream) == {"ok": False, "error": "job 必须是任务编号（整数）"}
+
+            print_daemon.send_message(stream, {"op": "submit", "paths": [path]})
+            ids = print_daemon.recv_message(stream)["jobs"]
+            print_daemon.send_message(stream, {"op": "status", "job": ids[0]})
+            assert print_daemon.recv_message(stream)["jobs"][0]["id"] == ids[0]
+    finally:
+        with DaemonClient("t", directory=service_dir, timeout=5) as client:
+            client.shutdown()
+        thread.join(5)
+
+
+def test_handle_never_raises(service_dir):
+    def broken_status(job_id=None):
+        raise RuntimeError("boom")
+
+    daemon = PrintDaemon(lambda path, kind: True, name="t", directory=service_dir)
+    assert daemon.handle(["status"]) == {"ok": False, "error": "请求必须是 JSON 对象"}
+    daemon.status = broken_status
+    assert daemon.handle({"op": "status"}) == {"ok": False, "error": "处理请求失败: boom"}
+
+
+def test_client_without_running_service(service_dir):
+    with pytest.raises(OSError):
+        DaemonClient("t", directory=service_dir)
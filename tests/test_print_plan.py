@@ -0,0 +1,128 @@
+import os
+
+import pytest
+
+from print_plan import build_plan, estimate_duration, format_duration, group_by_paper, load_plan, save_plan
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "src"
+    for rel in ("1001/a.pdf", "1001/b.xlsx", "1001/~$b.xlsx", "1001/sub/c.pdf", "1001/sub/deep/d.pdf",
+                "1002/月结单_e.pdf", "1002/note.txt", "f.pdf", "empty/"):
+        path = root / rel
+        if rel.endswith("/"):
+            path.mkdir(parents=True, exist_ok=True)
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 10)
+    if hasattr(os, "symlink"):
+        # 和 os.walk 一样：符号链接目录出现在 dirs 里，但不进入
+        os.symlink(str(root / "1002"), str(root / "1001" / "link"), target_is_directory=True)
+    return str(root)
+
+
+def _walk(root, topdown):
+    return [(path, sorted(dirs), sorted(files)) for path, dirs, files in os.walk(root, topdown=topdown)]
+
+
+def _plan_order(plan):
+    return [(d["path"], sorted(d["dirs"]), sorted([job["name"] for job in d["files"]] + d["temp"]))
+            for d in plan["directories"]]
+
+
+@pytest.mark.parametrize("topdown", [False, True])
+def test_plan_order_matches_os_walk(tree, topdown):
+    plan = build_plan(tree, topdown=topdown)
+    assert _plan_order(plan) == _walk(tree, topdown)
+    # 目录里的文件顺序也和 os.walk 一致
+    walked = {path: files for path, _, files in os.walk(tree)}
+    for directory in plan["directories"]:
+        names = [job["name"] for job in directory["files"]]
+        assert names == [n for n in walked[directory["path"]] if not n.startswith("~$")]
+
+
+def test_plan_totals_and_classification(tree):
+    plan = build_plan(tree)
+    assert plan["totals"] == {"files": 7, "pdf": 5, "excel": 1, "other": 1, "temp": 1, "monthly": 1, "bytes": 70}
+    jobs = {job["name"]: job for d in plan["directories"] for job in d["files"]}
+    assert jobs["月结单_e.pdf"]["monthly"] is True
+    assert jobs["note.txt"]["kind"] == "other"
+    clinic = next(d for d in plan["directories"] if d["name"] == "1001")
+    assert clinic["temp"] == ["~$b.xlsx"]
+
+
+def test_page_counts_and_estimate(tree):
+    calls = []
+
+    def page_count(path, kind, monthly):
+        calls.append(os.path.basename(path))
+        return 3 if kind == "pdf" else None
+
+    plan = build_plan(tree, page_count=page_count)
+    # 其他类型的文件不统计页数
+    assert "note.txt" not in calls
+    assert plan["totals"]["pages"] == 15
+
+    total = estimate_duration(plan, seconds_per_kind={"pdf": 1.0, "excel": 2.0}, delay_seconds=0.5,
+                              seconds_per_clinic=10, seconds_per_page=2)
+    # PDF 5 × (1 + 0.5 + 3 × 2) + Excel (2 + 0.5 + 1 × 2，页数未知按 1 页) + other (0 + 0.5 + 1 × 2) + 两个诊所目录 × 10
+    assert total == pytest.approx(5 * 7.5 + 4.5 + 2.5 + 20)
+    assert plan["estimated_seconds"] == round(total, 1)
+
+
+def test_save_and_load_round_trip(tree, tmp_path):
+    plan = build_plan(tree)
+    estimate_duration(plan)
+    path = str(tmp_path / "logs" / "plan.json")
+    save_plan(plan, path)
+    assert load_plan(path) == plan
+
+
+def test_format_duration():
+    assert format_duration(5) == "5 秒"
+    assert format_duration(125) == "2 分 5 秒"
+    assert format_duration(3 * 3600 + 120) == "3 小时 2 分"
+
+
+def _paper_plan():
+    # d = 针式打印纸，A = 月结单（A4）；中间夹一个没有文件的目录
+    layout = [("1001", "dAdA"), ("empty", ""), ("1002", "Ad"), ("1003", "Ad")]
+    directories = []
+    for name, keys in layout:
+        files = [{"name": f"{name}_{i}_{k}.pdf", "kind": "pdf", "monthly": k == "A"} for i, k in enumerate(keys)]
+        directories.append({"path": name, "name": name, "dirs": [], "files": files, "temp": []})
+    return {"directories": directories}
+
+
+def _sequence(plan):
+    return ["|".join("A" if job["monthly"] else "d" for job in d["files"]) for d in plan["directories"]]
+
+
+def test_group_by_paper_clinic_scope():
+    plan = _paper_plan()
+    original = {d["name"]: [job["name"] for job in d["files"]] for d in plan["directories"]}
+    result = group_by_paper(plan, "clinic")
+    assert result == {"scope": "clinic", "before": 6, "after": 4, "saved": 2}
+    assert plan["paper_switches"] == result
+    assert _sequence(plan) == ["d|d|A|A", "", "A|d", "A|d"]
+    # 目录顺序不变，同一种纸的文件保持原来的先后
+    assert [d["name"] for d in plan["directories"]] == ["1001", "empty", "1002", "1003"]
+    first = [job["name"] for job in plan["directories"][0]["files"]]
+    assert first == [original["1001"][i] for i in (0, 2, 1, 3)]
+
+
+def test_group_by_paper_run_scope_joins_directories():
+    plan = _paper_plan()
+    result = group_by_paper(plan, "run")
+    assert result == {"scope": "run", "before": 6, "after": 3, "saved": 3}
+    # 每个目录先用上一个目录最后的纸，最后用下一个目录会先用到的纸（跳过空目录）
+    assert _sequence(plan) == ["d|d|A|A", "", "A|d", "d|A"]
+
+
+def test_group_by_paper_custom_key():
+    plan = _paper_plan()
+    result = group_by_paper(plan, "clinic", key=lambda job: job["kind"])
+    # 全是 PDF：不需要换纸，顺序不变
+    assert result["before"] == result["after"] == 0
+    assert _sequence(plan) == ["d|A|d|A", "", "A|d", "A|d"]
@@ -0,0 +1,113 @@
+import os
+
+from fake_backends import FakePrinterEnumBackend, VirtualClock
+from printer_catalog import PrinterCatalog
+
+PRINTERS = {
+    "EPSON LQ-630K": ("USB001", [("A4", 210000, 297000), ("241x93", 241000, 93000)]),
+    "A4Print": ("Ne01", [("A4", 210000, 297000)]),
+    "Brother A4print Color": ("IP_10.0.0.9", [("A4", 210000, 297000)]),
+    "Microsoft Print to PDF": ("PORTPROMPT", [("Letter", 215900, 279400)]),
+}
+
+
+def _catalog(printers=PRINTERS, **options):
+    backend = FakePrinterEnumBackend(dict(printers))
+    clock = VirtualClock(1000.0)
+    return PrinterCatalog(backend, clock=clock, **options), backend, clock
+
+
+def linear_excel_name(printers, target_name):
+    """原来 get_excel_printer_name 的做法：按枚举顺序逐个比较名称片段"""
+    for name, (port, _) in printers.items():
+        if target_name.lower() in name.lower():
+            return f"{name} on {port}:"
+    return None
+
+
+def test_fragment_lookup_matches_linear_search():
+    catalog, backend, _ = _catalog(min_refresh=0)
+    fragments = {"a4", "A4PRINT", "print", "epson", "lq", "color", "pdf", " ", "missing", "brother a4"}
+    for name in PRINTERS:
+        lower = name.lower()
+        fragments.update(lower[i:i + 3] for i in range(len(lower) - 2))
+    for fragment in sorted(fragments):
+        assert catalog.excel_name(fragment) == linear_excel_name(PRINTERS, fragment), fragment
+
+
+def test_enumerates_once_within_ttl_and_again_after_expiry():
+    catalog, backend, clock = _catalog(ttl=600)
+    for _ in range(10):
+        assert catalog.find("a4print") == "A4Print"
+    assert backend.list_calls == 1
+
+    clock.sleep(599)
+    catalog.printers()
+    assert backend.list_calls == 1
+
+    clock.sleep(2)
+    catalog.printers()
+    assert backend.list_calls == 2
+
+
+def test_expired_data_is_kept_when_enumeration_fails():
+    catalog, backend, clock = _catalog(ttl=600, min_refresh=5)
+    catalog.printers()
+    backend.fail = True
+    clock.sleep(601)
+    assert catalog.find("epson") == "EPSON LQ-630K"
+    calls = backend.list_calls
+    # 失败后 min_refresh 秒内不再重试
+    catalog.find("epson")
+    assert backend.list_calls == calls
+
+
+def test_refresh_on_miss_is_limited_by_min_refresh():
+    catalog, backend, clock = _catalog(min_refresh=5)
+    assert catalog.find("label") is None
+    # 刚加载过，查不到也不马上重新枚举
+    assert backend.list_calls == 1
+
+    clock.sleep(5)
+    backend.printers["Zebra Label"] = ("USB002", [])
+    assert catalog.find("label") == "Zebra Label"
+    assert backend.list_calls == 2
+
+    for _ in range(5):
+        assert catalog.find("missing") is None
+    assert backend.list_calls == 2
+
+    clock.sleep(5)
+    assert catalog.find("missing") is None
+    assert backend.list_calls == 3
+
+
+def test_disk_cache_round_trip(tmp_path):
+    cache_path = os.path.join(str(tmp_path), "printer_catalog.json")
+    catalog, backend, clock = _catalog(cache_path=cache_path)
+    catalog.printers()
+    assert catalog.form("EPSON LQ-630K", "241X93")["width"] == 241000
+    assert os.path.exists(cache_path)
+
+    # 新的进程：有效期内直接读磁盘缓存，不枚举打印机和纸张
+    backend2 = FakePrinterEnumBackend(dict(PRINTERS))
+    catalog2 = PrinterCatalog(backend2, cache_path=cache_path, clock=clock)
+    assert catalog2.printers() == {name: port for name, (port, _) in PRINTERS.items()}
+    assert catalog2.excel_name("a4print") == "A4Print on Ne01:"
+    assert catalog2.form("EPSON LQ-630K", "241x93") == {"name": "241x93", "width": 241000, "height": 93000}
+    assert backend2.list_calls == 0
+    assert backend2.form_calls == 0
+
+    # 缓存过期后重新枚举
+    clock.sleep(catalog2.ttl)
+    backend3 = FakePrinterEnumBackend(dict(PRINTERS))
+    PrinterCatalog(backend3, cache_path=cache_path, clock=clock).printers()
+    assert backend3.list_calls == 1
+
+
+def test_forms_are_enumerated_once_per_printer():
+    catalog, backend, _ = _catalog()
+    for _ in range(3):
+        assert catalog.form("A4Print", "a4")["name"] == "A4"
+        assert catalog.form("A4Print", "B5") is None
+    assert backend.form_calls == 1
@@ -0,0 +1,93 @@
+import configparser
+
+import pytest
+
+from fake_backends import VirtualClock
+from rate_scheduler import RateScheduler, TokenBucket, parse_rate, rate_scheduler_from_config
+
+
+def _scheduler(rates, default=None, **kwargs):
+    clock = VirtualClock()
+    return RateScheduler(rates, default=default, clock=clock, sleep=clock.sleep, **kwargs), clock
+
+
+def test_bucket_refills_at_rate_up_to_burst():
+    clock = VirtualClock()
+    bucket = TokenBucket(60, 2, clock=clock)
+    assert bucket.wait_time(2) == 0
+    bucket.consume(2)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.sleep(0.5)
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    # 空闲再久也只攒 burst 页
+    clock.sleep(100)
+    assert bucket.wait_time(2) == 0
+    assert bucket.consume(2) == pytest.approx(0)
+
+
+def test_burst_then_paced_by_rate():
+    scheduler, clock = _scheduler({"dot": (60, 2)})
+    waits = [scheduler.acquire("DotMatrix") for _ in range(4)]
+    # 前两页用掉突发额度，之后每页等 1 秒
+    assert waits == pytest.approx([0, 0, 1, 1])
+    assert clock() == pytest.approx(2)
+
+
+def test_large_job_admitted_with_debt_paid_by_next_job():
+    scheduler, clock = _scheduler({"dot": (60, 2)})
+    # 5 页超过突发页数：令牌够 min(5, 2) 就放行，欠 3 页
+    assert scheduler.acquire("DotMatrix", 5) == 0
+    assert scheduler.decisions[-1]["tokens"] == pytest.approx(-3)
+    # 下一个任务要先补上欠账再攒够自己的 1 页
+    assert scheduler.acquire("DotMatrix", 1) == pytest.approx(4)
+    assert scheduler.decisions[-1]["tokens"] == pytest.approx(0)
+
+
+def test_printers_have_separate_buckets():
+    scheduler, clock = _scheduler({"dot": (60, 1), "laser": (600, 1)})
+    scheduler.acquire("DotMatrix")
+    # 针式打印机没有令牌了，不影响激光打印机
+    assert scheduler.acquire("LaserJet") == 0
+    assert scheduler.acquire("DotMatrix") == pytest.approx(1)
+    assert scheduler.acquire("LaserJet") == 0
+    # 匹配不到、也没有默认速度的打印机不限速，不记录
+    assert scheduler.acquire("PDF Writer", 100) == 0
+    assert scheduler.bucket("PDF Writer") is None
+    assert [d["printer"] for d in scheduler.decisions] == ["DotMatrix", "LaserJet", "DotMatrix", "LaserJet"]
+    assert scheduler.seconds_per_page("dotmatrix") == pytest.approx(1)
+    assert scheduler.seconds_per_page("PDF Writer") == 0
+
+
+def test_default_rate_for_unmatched_printers():
+    scheduler, _ = _scheduler({"dot": (60, 1)}, default=(30, 1))
+    scheduler.acquire("Other")
+    assert scheduler.acquire("Other") == pytest.approx(2)
+
+
+def test_decisions_log_and_callback():
+    seen = []
+    scheduler, clock = _scheduler({"dot": (60, 1)}, on_decision=seen.append)
+    clock.sleep(10)
+    scheduler.acquire("DotMatrix", 1)
+    scheduler.acquire("DotMatrix", 3)
+    assert seen == scheduler.decisions
+    first, second = scheduler.decisions
+    assert first == {"printer": "DotMatrix", "pages": 1, "requested": 10, "admitted": 10, "waited": 0, "tokens": 0}
+    assert second["requested"] == 10
+    assert second["admitted"] == pytest.approx(11)
+    assert second["waited"] == pytest.approx(1)
+    assert second["tokens"] == pytest.approx(-2)
+    # 页数至少按 1 页算
+    scheduler.acquire("DotMatrix", 0)
+    assert scheduler.decisions[-1]["pages"] == 1
+
+
+def test_config_parsing():
+    assert parse_rate("30, 4") == (30.0, 4.0)
+    assert parse_rate("30") == (30.0, 1)
+    config = configparser.ConfigParser()
+    assert rate_scheduler_from_config(config) is None
+    config.read_string("[printer_rates]\nDotMatrix = 30, 4\ndefault = 120\n")
+    scheduler = rate_scheduler_from_config(config)
+    assert scheduler.rates == {"dotmatrix": (30.0, 4.0)}
+    assert scheduler.default == (120.0, 1)
@@ -0,0 +1,112 @@
+import logging
+
+import pytest
+
+from fake_backends import SimulatedSpoolerBackend, VirtualClock
+from spooler import SpoolerTracker
+
+
+def _tracker(backend, clock, **options):
+    options.setdefault("poll_interval", 0.1)
+    return SpoolerTracker(backend, clock=clock, sleep=clock.sleep, **options)
+
+
+def test_tracked_job_released_when_queue_has_room():
+    clock = VirtualClock()
+    backend = SimulatedSpoolerBackend(seconds_per_page=1.0, spool_delay=0.3, clock=clock)
+    tracker = _tracker(backend, clock, high_water=1)
+    before = tracker.snapshot()
+    job_id = backend.submit(pages=2)
+    assert tracker.find_new_job(before, appear_timeout=4) == job_id
+    assert clock() == pytest.approx(0.3, abs=0.1)
+    tracker.wait_for_slot(job_id)
+    # 两页打完（0.3 + 2 秒）就放行，不等固定的 4 秒
+    assert clock() == pytest.approx(2.3, abs=0.1)
+    assert backend.queue_depth() == 0
+
+
+def test_high_water_keeps_queue_fed():
+    clock = VirtualClock()
+    backend = SimulatedSpoolerBackend(seconds_per_page=1.0, spool_delay=0.0, clock=clock)
+    tracker = _tracker(backend, clock, high_water=2)
+    for _ in range(5):
+        before = tracker.snapshot()
+        backend.submit(pages=1)
+        tracker.track(before, appear_timeout=4)
+        assert backend.queue_depth() < 2
+    # 打印机一直有活干：总耗时约等于 5 页的打印时间
+    assert clock() == pytest.approx(4.0, abs=0.2)
+
+
+def test_job_finished_between_polls_counts_as_done():
+    clock = VirtualClock()
+    # 0.3 秒后进队列，0.05 秒打完；每 0.5 秒检查一次，永远看不到这个任务
+    backend = SimulatedSpoolerBackend(seconds_per_page=0.05, spool_delay=0.3, clock=clock)
+    tracker = _tracker(backend, clock, high_water=2, poll_interval=0.5, settle_time=1.0)
+    before = tracker.snapshot()
+    backend.submit(pages=1)
+    assert tracker.track(before, appear_timeout=4) == 0
+    # settle_time 后队列低于上限，不再等满 appear_timeout
+    assert clock() == pytest.approx(1.0)
+
+
+def test_busy_queue_without_new_job_waits_for_appear_timeout_then_slot():
+    clock = VirtualClock()
+    backend = SimulatedSpoolerBackend(seconds_per_page=5.0, clock=clock)
+    tracker = _tracker(backend, clock, high_water=2)
+    backend.submit(pages=1)
+    backend.submit(pages=1)
+    before = tracker.snapshot()
+    # 队列满，新任务一直没进队列：不能当成已经打完
+    assert tracker.find_new_job(before, appear_timeout=4) is None
+    assert clock() == pytest.approx(4.0, abs=0.1)
+    tracker.wait_for_slot()
+    assert clock() == pytest.approx(5.0, abs=0.1)
+
+
+class StuckBackend:
+    """队列一直满，任务状态是脱机"""
+
+    def __init__(self, status=0x20):
+        self.status = status
+        self.status_calls = 0
+
+    def job_ids(self):
+        return {1, 2, 3}
+
+    def queue_depth(self):
+        return 3
+
+    def job_status(self, job_id):
+        self.status_calls += 1
+        return self.status
+
+
+def test_stuck_queue_warns_once_and_times_out(caplog):
+    clock = VirtualClock()
+    backend = StuckBackend()
+    tracker = _tracker(backend, clock, high_water=2, job_timeout=30)
+    with caplog.at_level(logging.WARNING):
+        waited = tracker.wait_for_slot(job_id=3)
+    assert waited == pytest.approx(30, abs=0.1)
+    assert tracker.waited == waited
+    assert backend.status_calls == 1
+    assert len([r for r in caplog.records if "状态异常" in r.getMessage()]) == 1
+    assert any("等待超时" in r.getMessage() for r in caplog.records)
+
+
+class BrokenBackend:
+    def job_ids(self):
+        raise OSError("打印机不存在")
+
+    def queue_depth(self):
+        raise OSError("打印机不存在")
+
+
+def test_unreadable_queue_falls_back_to_fixed_delay():
+    clock = VirtualClock()
+    tracker = _tracker(BrokenBackend(), clock)
+    before = tracker.snapshot()
+    assert before == set()
+    assert tracker.track(before, appear_timeout=4) == 0
+    assert clock() == pytest.approx(4.0, abs=0.1)
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import threading
+
+from spill_queue import SpillQueue
+from watch_pipeline import WatchPipeline
+
+FAST = {"coalesce_window": 0.01, "debounce_interval": 0.01, "quiet_seconds": 0.02, "probe": lambda path: True}
+
+
+async def _drain(pipeline, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while pipeline._pending or len(pipeline.spill) or pipeline._in_flight:
+        assert loop.time() < deadline, "流水线没有处理完"
+        await asyncio.sleep(0.01)
+
+
+def _touch(tmp_path, name):
+    path = os.path.join(str(tmp_path), name)
+    with open(path, "wb") as f:
+        f.write(b"x")
+    return path
+
+
+def test_only_successful_prints_are_recorded(tmp_path):
+    recorded = []
+    good = _touch(tmp_path, "good.pdf")
+    bad = _touch(tmp_path, "bad.pdf")
+    broken = _touch(tmp_path, "broken.pdf")
+
+    def print_func(path, kind):
+        if path == broken:
+            raise RuntimeError("打印机脱机")
+        return path == good
+
+    async def run():
+        pipeline = WatchPipeline(print_func, on_done=recorded.append, **FAST)
+        await pipeline.start()
+        for path in (good, bad, broken):
+            pipeline.submit(path)
+        await _drain(pipeline)
+        await pipeline.shutdown()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+    assert recorded == [good]
+    assert pipeline.printed == 1
+    assert pipeline.failed == 2
+
+
+def test_shutdown_during_poll_keeps_ready_files(tmp_path):
+    printed = []
+    ready = _touch(tmp_path, "ready.pdf")
+    polling = threading.Event()
+    release = threading.Event()
+
+    def probe(path):
+        # 第一次探测卡住，模拟 poll 还在线程池里执行时停止
+        polling.set()
+        return release.wait(5)
+
+    async def run():
+        options = dict(FAST, probe=probe, quiet_seconds=0)
+        pipeline = WatchPipeline(lambda path, kind: printed.append(path) or True, **options)
+        await pipeline.start()
+        pipeline.submit(ready)
+        await asyncio.get_running_loop().run_in_executor(None, polling.wait, 5)
+        stopping = asyncio.create_task(pipeline.shutdown())
+        await asyncio.sleep(0.05)
+        assert not stopping.done()
+        release.set()
+        await stopping
+        return pipeline
+
+    pipeline = asyncio.run(run())
+    # poll 判定写完的文件照常打印，没有丢掉
+    assert printed == [ready]
+    assert pipeline.printed == 1
+
+
+def test_shutdown_saves_unstable_and_queued_files(tmp_path):
+    spill_path = str(tmp_path / "spill.db")
+    # 同一组按文件名排序，max_in_flight=1 时只放行 a_unstable.pdf
+    unstable = _touch(tmp_path, "a_unstable.pdf")
+    queued = _touch(tmp_path, "b_queued.pdf")
+
+    async def run():
+        options = dict(FAST, probe=lambda path: False, max_in_flight=1)
+        pipeline = WatchPipeline(lambda path, kind: True, spill_path=spill_path, **options)
+        await pipeline.start()
+        pipeline.submit(unstable)
+        pipeline.submit(queued)
+        while not pipeline._in_flight:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        await pipeline.shutdown()
+
+    asyncio.run(run())
+    # 没写完的文件排回队尾，和还在排队的文件一起保存
+    spill = SpillQueue(spill_path)
+    try:
+        assert [spill.get(), spill.get(), spill.get()] == [queued, unstable, None]
+    finally:
+        spill.close()
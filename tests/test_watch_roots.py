@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from watch_roots import WatchRoot, WatchRoots
+
+
+def _roots(*specs):
+    return WatchRoots([WatchRoot(f"r{i}", path, **options) for i, (path, options) in enumerate(specs)])
+
+
+def _p(*parts):
+    return os.path.abspath(os.path.join(os.sep, *parts))
+
+
+def test_siblings_merged_into_parent():
+    roots = _roots((_p("data", "print", "a"), {}), (_p("data", "print", "b"), {}), (_p("other", "c"), {}))
+    assert roots.watch_points() == [(_p("other", "c"), True), (_p("data", "print"), True)]
+    # 上级目录里其他子目录的文件不处理
+    assert roots.find(_p("data", "print", "x", "1.pdf")) is None
+    assert roots.find(_p("data", "print", "a", "sub", "1.pdf")).name == "r0"
+
+
+def test_siblings_under_filesystem_root_not_merged():
+    roots = _roots((_p("a"), {}), (_p("b"), {}))
+    assert roots.watch_points() == [(_p("a"), True), (_p("b"), True)]
+
+
+def test_non_recursive_siblings_not_merged():
+    roots = _roots((_p("data", "a"), {"recursive": False}), (_p("data", "b"), {}))
+    assert sorted(roots.watch_points()) == [(_p("data", "a"), False), (_p("data", "b"), True)]
+
+
+def test_parent_that_is_a_non_recursive_root_not_merged():
+    roots = _roots((_p("data"), {"recursive": False}), (_p("data", "a"), {}), (_p("data", "b"), {}))
+    assert sorted(roots.watch_points()) == [(_p("data"), False), (_p("data", "a"), True), (_p("data", "b"), True)]
+
+
+def test_poll_roots_have_no_watch_point():
+    roots = _roots((_p("data", "a"), {"poll": True}), (_p("data", "b"), {}))
+    assert roots.watch_points() == [(_p("data", "b"), True)]
+
+
+def test_nested_in_recursive_root_rejected():
+    with pytest.raises(ValueError):
+        _roots((_p("data"), {}), (_p("data", "a"), {}))
@@ -0,0 +1,180 @@
+import itertools
+import os
+import time
+
+from watch_snapshot import SnapshotIndex, open_snapshots
+
+# 每次比对前把目录的修改时间拨回到一个不同的、足够早的时间，快照才会记录（太新的目录不记录）
+_AGES = itertools.count(1)
+
+
+def _settle(root):
+    mtime = time.time() - 3600 + next(_AGES)
+    for path, _, _ in os.walk(root):
+        os.utime(path, (mtime, mtime))
+
+
+def _write(path, data=b"x"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def _tree(tmp_path):
+    root = tmp_path / "watch"
+    files = [_write(root / "a.pdf", b"A"), _write(root / "1001" / "b.xlsx", b"BB"),
+             _write(root / "1001" / "sub" / "c.pdf", b"CCC")]
+    _settle(root)
+    return root, files
+
+
+def _catch_up(root, db):
+    """模拟一次启动：打开快照、比对、关闭"""
+    index = SnapshotIndex(str(root), db)
+    try:
+        return index.catch_up(), index.last_catch_up
+    finally:
+        index.close()
+
+
+def test_first_run_only_records_a_baseline(tmp_path):
+    root, files = _tree(tmp_path)
+    db = str(tmp_path / "snapshot.db")
+    index = SnapshotIndex(str(root), db)
+    assert not index.initialized
+    # 第一次监听不打印已有的文件
+    assert index.catch_up() == []
+    assert index.last_catch_up["baseline"] is True
+    assert index.last_catch_up["files"] == 3
+    assert all(index.known(path) for path in files)
+    index.close()
+
+    new, stats = _catch_up(root, db)
+    assert new == []
+    assert stats["baseline"] is False
+    assert (stats["new"], stats["moved"], stats["updated"], stats["removed"]) == (0, 0, 0, 0)
+
+
+def test_new_files_reported_until_recorded(tmp_path):
+    root, files = _tree(tmp_path)
+    db = str(tmp_path / "snapshot.db")
+    _catch_up(root, db)
+
+    # 停机期间放进来的文件，包括新建的子目录里的
+    added = [_write(root / "1001" / "d.pdf"), _write(root / "1002" / "e.pdf")]
+    _settle(root)
+    new, stats = _catch_up(root, db)
+    assert new == sorted(added)
+    assert stats["new"] == 2
+
+    # 没打印完（没有 record）下次启动还会交给流水线
+    index = SnapshotIndex(str(root), db)
+    assert index.catch_up() == sorted(added)
+    for path in added:
+        index.record(path)
+    index.close()
+    assert _catch_up(root, db)[0] == []
+
+
+def test_rename_while_stopped_is_not_reprinted(tmp_path):
+    root, files = _tree(tmp_path)
+    db = str(tmp_path / "snapshot.db")
+    _catch_up(root, db)
+
+    renamed = str(root / "a_renamed.pdf")
+    moved = str(root / "1002" / "b.xlsx")
+    os.rename(files[0], renamed)
+    os.mkdir(root / "1002")
+    os.rename(files[1], moved)
+    _settle(root)
+    new, stats = _catch_up(root, db)
+    assert new == []
+    assert (stats["moved"], stats["removed"], stats["new"]) == (2, 0, 0)
+
+    index = SnapshotIndex(str(root), db)
+    assert index.known(renamed) and index.known(moved)
+    assert not index.known(files[0]) and not index.known(files[1])
+    assert len(index) == 3
+    index.close()
+
+
+def test_delete_and_recreate_with_same_name_is_new(tmp_path):
+    root, files = _tree(tmp_path)
+    db = str(tmp_path / "snapshot.db")
+    _catch_up(root, db)
+
+    # 先写好新文件再替换，保证 inode 不同（删掉后立即新建可能复用同一个 inode）
+    replacement = _write(root / "a.pdf.tmp", b"new content")
+    os.remove(files[0])
+    os.rename(replacement, files[0])
+    # 原地修改（inode 不变）只更新快照
+    with open(files[2], "ab") as f:
+        f.write(b"more")
+    _settle(root)
+    new, stats = _catch_up(root, db)
+    assert new == [files[0]]
+    assert stats["updated"] == 1
+
+    # 删掉的文件从快照里移除
+    os.remove(files[1])
+    _settle(root)
+    new, stats = _catch_up(root, db)
+    assert new == [files[0]]
+    assert stats["removed"] == 1
+    index = SnapshotIndex(str(root), db)
+    assert not index.known(files[1])
+    index.close()
+
+
+def test_unchanged_directory_reuses_the_snapshot(tmp_path):
+    root, files = _tree(tmp_path)
+    index = SnapshotIndex(str(root))
+    index.catch_up()
+    before = index.scan()[0][files[2]]
+
+    # 原地改写不改变目录的修改时间：目录没变，文件直接沿用快照，不逐个 stat
+    sub = root / "1001" / "sub"
+    dir_mtime = os.stat(sub).st_mtime_ns
+    with open(files[2], "ab") as f:
+        f.write(b"more")
+    os.utime(sub, ns=(dir_mtime, dir_mtime))
+    live, dirs = index.scan()
+    assert live[files[2]] == before
+    assert dirs[str(sub)] == dir_mtime
+
+    # 目录变了（新建了文件）就重新 stat
+    _write(sub / "d.pdf")
+    _settle(root)
+    live, _ = index.scan()
+    assert live[files[2]][0] == os.path.getsize(files[2])
+
+
+def test_recent_directories_are_not_trusted(tmp_path):
+    root, files = _tree(tmp_path)
+    index = SnapshotIndex(str(root))
+    fresh = root / "1003"
+    _write(fresh / "f.pdf")
+    # 刚修改过的目录不记录修改时间，下次还会逐个 stat
+    _, dirs = index.scan()
+    assert str(root / "1001") in dirs
+    assert str(fresh) not in dirs
+
+
+def test_shared_connection_keeps_roots_apart(tmp_path):
+    first, _ = _tree(tmp_path / "one")
+    second, _ = _tree(tmp_path / "two")
+    db = str(tmp_path / "snapshot.db")
+    snapshots = open_snapshots([str(first), str(second)], db, recursive=[True, False])
+    for snapshot in snapshots:
+        snapshot.catch_up()
+    # 不包括子目录时只有目录本身的文件
+    assert [len(s) for s in snapshots] == [3, 1]
+    for snapshot in reversed(snapshots):
+        snapshot.close()
+
+    _write(second / "g.pdf")
+    _settle(second)
+    assert _catch_up(first, db)[0] == []
+    index = SnapshotIndex(str(second), db, recursive=False)
+    assert index.catch_up() == [str(second / "g.pdf")]
+    index.close()
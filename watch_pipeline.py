@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from file_stability import StabilityTracker, DEFAULT_POLL_INTERVAL
+from spill_queue import SpillQueue, DEFAULT_MEMORY_LIMIT
+
+# 各阶段的默认并发 / 队列上限
+DEFAULT_PRINT_CONCURRENCY = 1
+DEFAULT_PRINT_QUEUE_SIZE = 64
+DEFAULT_CLASSIFY_QUEUE_SIZE = 256
+# 同一个窗口（秒）里到达的事件合并成一组：重复的路径只留一个，组内按目录和文件名排序
+DEFAULT_COALESCE_WINDOW = 0.5
+# 同时在等待写完 / 分类 / 打印的文件上限，其余的在 SpillQueue 里排队
+DEFAULT_MAX_IN_FLIGHT = 256
+
+
+def default_accept(path):
+    """过滤阶段：跳过 Excel 临时文件"""
+    return not os.path.basename(path).startswith("~$")
+
+
+def batch_order(path):
+    """同一组文件的处理顺序：先按目录，再按文件名"""
+    directory, name = os.path.split(path)
+    return directory, name.lower(), name
+
+
+def default_classify(path):
+    """分类阶段：返回文件类型，不需要打印的文件返回 None"""
+    lower = path.lower()
+    if lower.endswith(".pdf"):
+        return "pdf"
+    if lower.endswith((".xls", ".xlsx")):
+        return "excel"
+    return None
+
+
+class FairQueue(asyncio.Queue):
+    """
+    按来源轮流出队的 asyncio 队列：key(item) 是来源，每个来源一个先进先出队列，出队时各来源轮流，
+    weight(来源) 表示一轮里连续取几个（默认 1）；一个来源积压再多也不会挡住其他来源
+    没有积压的来源不占内存，来源再多也只和排队的任务数有关
+    """
+
+    def __init__(self, maxsize=0, key=None, weight=None):
+        self._key = key or (lambda item: None)
+        self._weight = weight or (lambda source: 1)
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        # asyncio.Queue.empty() 直接看 self._queue，没有积压的来源会被删掉，空字典就是空队列
+        self._queue = OrderedDict()
+        self._size = 0
+        self._served = 0
+
+    def _qsize(self):
+        return self._size
+
+    def _put(self, item):
+        self._queue.setdefault(self._key(item), deque()).append(item)
+        self._size += 1
+
+    def _get(self):
+        source, items = next(iter(self._queue.items()))
+        item = items.popleft()
+        self._size -= 1
+        self._served += 1
+        if not items:
+            del self._queue[source]
+            self._served = 0
+        elif self._served >= self._weight(source):
+            # 这个来源本轮用完，排到最后
+            self._queue.move_to_end(source)
+            self._served = 0
+        return item
+
+    def backlog(self):
+        """每个来源排队的任务数"""
+        return {source: len(items) for source, items in self._queue.items()}
+
+
+class WatchPipeline:
+    """
+    监听目录的 asyncio 打印流水线：
+        watchdog 线程 -> 合并 -> 排队(SpillQueue) -> 放行 -> 防抖(等文件写完) -> 分类 -> 打印
+    阻塞的 COM / lp 调用在有界线程池里执行，每个阶段的并发和队列长度都是固定的
+    合并：watchdog 线程只把路径记进字典，一个窗口（coalesce_window）里同一个路径的 created / modified 只算一次，
+          整个窗口只唤醒一次事件循环；窗口结束时这一组按目录和文件名排好序交给排队
+    背压：同时在流水线里的文件不超过 max_in_flight，打印跟不上时其余的在 SpillQueue 里等，
+          内存里最多 spill_memory 个，超出的写进 spill_path（SQLite），停止时没处理完的也保存在里面，下次启动接着处理
+    监听多个目录时传入 source(path) -> 来源（例如所属的监听目录），打印队列改为 FairQueue，各来源轮流打印；
+    这时打印队列不限长度（积压的路径本来就在 _in_flight 里），避免一个来源占满队列后挡住其他来源
+    """
+
+    def __init__(self, print_func, accept=default_accept, classify=default_classify,
+                 print_concurrency=DEFAULT_PRINT_CONCURRENCY, print_queue_size=DEFAULT_PRINT_QUEUE_SIZE,
+                 classify_queue_size=DEFAULT_CLASSIFY_QUEUE_SIZE, debounce_interval=DEFAULT_POLL_INTERVAL,
+                 worker_exit=None, on_done=None, source=None, source_weight=None,
+                 coalesce_window=DEFAULT_COALESCE_WINDOW, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 spill_path=None, spill_memory=DEFAULT_MEMORY_LIMIT, **stability_options):
+        # print_func(path, kind) 在线程池里执行，返回 True 表示打印成功
+        self.print_func = print_func
+        self.accept = accept
+        self.classify = classify
+        self.print_concurrency = print_concurrency
+        self.debounce_interval = debounce_interval
+        self.coalesce_window = coalesce_window
+        self.max_in_flight = max(1, max_in_flight)
+        # worker_exit 在每个打印线程里执行一次，用来释放线程自己的资源（例如 Excel 会话）
+        self.worker_exit = worker_exit
+        # on_done(path) 在文件处理完（打印成功或不需要打印）后调用，例如记入监听目录的快照
+        self.on_done = on_done
+        self.tracker = StabilityTracker(**stability_options)
+
+        self.loop = None
+        self.printed = 0
+        self.failed = 0
+        self.events = 0
+        self.batches = 0
+        # watchdog 线程写、事件循环线程取走；值是 None，只用字典的去重和插入顺序
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._coalesce_wakeup = asyncio.Event()
+        self._admit_wakeup = asyncio.Event()
+        self.spill = SpillQueue(spill_path, spill_memory, key=source)
+        self._classify_queue = asyncio.Queue(maxsize=classify_queue_size)
+        if source is None:
+            self._print_queue = asyncio.Queue(maxsize=print_queue_size)
+        else:
+            self._print_queue = FairQueue(key=lambda item: source(item[0]), weight=source_weight)
+        self._in_flight = set()
+        self._wakeup = asyncio.Event()
+        # 停止时通知防抖阶段做完当前这一轮后退出
+        self._stopping = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=print_concurrency, thread_name_prefix="printer")
+        self._tasks = []
+        self._closed = asyncio.Event()
+
+    def _add_pending(self, path):
+        """记下路径，返回是否需要唤醒合并阶段（窗口里的第一个事件），以及是否已经攒满一组"""
+        with self._pending_lock:
+            first = not self._pending
+            self._pending[path] = None
+            self.events += 1
+            return first, len(self._pending) == self.spill.memory_limit
+
+    def submit_threadsafe(self, path):
+        """watchdog 线程调用：只记下路径，一个窗口只唤醒一次事件循环，不做任何阻塞操作"""
+        first, full = self._add_pending(path)
+        if first:
+            self.loop.call_soon_threadsafe(self._coalesce_wakeup.set)
+        elif full:
+            # 一个窗口里的新路径太多时不等窗口结束，先交给排队（写磁盘），字典不会无限增长
+            self.loop.call_soon_threadsafe(self._flush_pending)
+
+    def submit(self, path):
+        """在事件循环线程内提交文件"""
+        first, full = self._add_pending(path)
+        if first:
+            self._coalesce_wakeup.set()
+        elif full:
+            self._flush_pending()
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._tasks.append(asyncio.create_task(self._coalesce_stage(), name="coalesce"))
+        self._tasks.append(asyncio.create_task(self._admit_stage(), name="admit"))
+        self._tasks.append(asyncio.create_task(self._debounce_stage(), name="debounce"))
+        self._tasks.append(asyncio.create_task(self._classify_stage(), name="classify"))
+        for i in range(self.print_concurrency):
+            self._tasks.append(asyncio.create_task(self._print_stage(), name=f"print-{i}"))
+
+    async def _coalesce_stage(self):
+        while True:
+            await self._coalesce_wakeup.wait()
+            # 等一个窗口，这期间到达的事件都合并进同一组
+            await asyncio.sleep(self.coalesce_window)
+            self._coalesce_wakeup.clear()
+            self._flush_pending()
+
+    def _flush_pending(self):
+        """过滤当前这组路径，按顺序交给排队"""
+        with self._pending_lock:
+            paths, self._pending = self._pending, {}
+        if not paths:
+            return
+        group = []
+        for path in sorted(paths, key=batch_order):
+            # 已经在流水线里的文件（重复的 created / modified 事件）只刷新防抖计时
+            if path in self._in_flight:
+                self.tracker.add(path)
+            elif self.accept(path):
+                group.append(path)
+        if group:
+            self.batches += 1
+            # 还在排队的路径不会重复加入
+            self.spill.put_many(group)
+            self._admit_wakeup.set()
+
+    async def _admit_stage(self):
+        """从排队里放行文件，流水线里的文件数到上限时等有文件处理完"""
+        while True:
+            while len(self._in_flight) >= self.max_in_flight or not len(self.spill):
+                self._admit_wakeup.clear()
+                await self._admit_wakeup.wait()
+            path = self.spill.get()
+            if path is None:
+                continue
+            if path in self._in_flight:
+                self.tracker.add(path)
+                continue
+            self._in_flight.add(path)
+            self.tracker.add(path)
+            self._wakeup.set()
+
+    def _leave(self, path):
+        self._in_flight.discard(path)
+        self._admit_wakeup.set()
+
+    async def _debounce_stage(self):
+        # 停止时不能直接取消：poll 已经把写完的文件移出 tracker，取消后这些文件既不打印也不保存
+        while not self._stopping.is_set():
+            if not len(self.tracker):
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                if self._stopping.is_set():
+                    break
+
+            # stat / 独占打开探测都是阻塞调用，放到默认线程池，不占打印线程
+            ready = await self.loop.run_in_executor(None, self.tracker.poll)
+            for path in ready:
+                await self._classify_queue.put(path)
+
+            # 放弃等待的文件（被删除或一直没写完）移出流水线
+            for path in self.tracker.take_abandoned():
+                self._leave(path)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.debounce_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _classify_stage(self):
+        while True:
+            path = await self._classify_queue.get()
+            try:
+                kind = self.classify(path)
+                if kind is None:
+                    self._leave(path)
+                    await self._done(path)
+                else:
+                    await self._print_queue.put((path, kind))
+            finally:
+                self._classify_queue.task_done()
+
+    async def _print_stage(self):
+        while True:
+            path, kind = await self._print_queue.get()
+            try:
+                result = await self.loop.run_in_executor(self._executor, self.print_func, path, kind)
+                # 只有明确返回成功才记为已处理，失败的文件下次启动时还会重新打印
+                if not result:
+                    self.failed += 1
+                    logging.warning(f"⚠️ 打印失败，下次启动时重试: {path}")
+                else:
+                    self.printed += 1
+                    await self._done(path)
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"❌ 打印失败: {path} - {e}")
+            finally:
+                self._leave(path)
+                self._print_queue.task_done()
+
+    async def _done(self, path):
+        if self.on_done is None:
+            return
+        # 写快照要 stat / fsync，放到默认线程池
+        try:
+            await self.loop.run_in_executor(None, self.on_done, path)
+        except Exception as e:
+            logging.warning(f"⚠️ 记录已处理文件失败: {path} - {e}")
+
+    async def wait_closed(self):
+        await self._closed.wait()
+
+    async def shutdown(self):
+        """
+        停止流水线：已收到的事件先交给排队，不再放行新文件，等已经进入分类 / 打印队列的文件全部打印完
+        还没写完和还在排队的文件不再等待，有 spill_path 时保存在里面，下次启动接着处理
+        """
+        for task in self._tasks[:2]:
+            # 合并、放行
+            task.cancel()
+        # 防抖阶段做完当前的 poll 并把写完的文件交给分类后自己退出，之后 tracker 里剩下的才是没写完的
+        self._stopping.set()
+        self._wakeup.set()
+        await asyncio.gather(self._tasks[2], return_exceptions=True)
+        self._flush_pending()
+        unstable = self.tracker.take_pending()
+        if unstable:
+            logging.warning(f"⚠️ 还有 {len(unstable)} 个文件未写入完成，本次不再打印")
+            # 放回排队：有 spill_path 时和其他排队的文件一起保存
+            for path in unstable:
+                self._in_flight.discard(path)
+            self.spill.put_many(unstable)
+        queued = len(self.spill)
+        if queued:
+            kept = "已保存，下次启动时继续打印" if self.spill.conn is not None else "本次不再打印"
+            logging.warning(f"⚠️ 还有 {queued} 个文件在排队，{kept}")
+
+        await self._classify_queue.join()
+        await self._print_queue.join()
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.spill.close()
+
+        if self.worker_exit:
+            await self._run_worker_exit()
+        self._executor.shutdown(wait=True)
+        self._closed.set()
+
+    async def _run_worker_exit(self):
+        # 每个打印线程各执行一次：用 Barrier 让每个线程都占住一个任务，保证不会被同一个线程执行两次
+        barrier = threading.Barrier(self.print_concurrency)
+
+        def exit_worker():
+            try:
+                barrier.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+            self.worker_exit()
+
+        futures = [self.loop.run_in_executor(self._executor, exit_worker) for _ in range(self.print_concurrency)]
+        await asyncio.gather(*futures, return_exceptions=True)
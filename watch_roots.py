@@ -0,0 +1,187 @@
+"""
+一个 auto_printer 进程监听多个目录：config.ini 里每个 [watch:名称] 是一个监听目录和它的规则
+所有目录共用一个 Observer、一个打印线程池（各目录轮流打印）和一个快照数据库
+"""
+import os
+
+from watch_pipeline import default_accept, default_classify
+from watch_snapshot import open_snapshots
+
+SECTION_PREFIX = "watch:"
+DEFAULT_KINDS = ("pdf", "excel")
+# 所有目录共用的打印线程数（每个线程一个 Excel 实例）
+DEFAULT_WORKERS = 1
+
+
+class WatchRoot:
+    """一个监听目录和它的规则"""
+
+    def __init__(self, name, path, kinds=DEFAULT_KINDS, recursive=True, poll=False, printer=None, weight=1):
+        self.name = name
+        self.path = os.path.abspath(path)
+        # 这个目录里打印哪些类型的文件
+        self.kinds = tuple(kinds)
+        self.recursive = recursive
+        # 网络共享目录用轮询代替文件系统通知
+        self.poll = poll
+        # 为空时用默认打印机
+        self.printer = printer or None
+        # 公平调度的权重：一轮里连续打印几个文件
+        self.weight = max(1, int(weight))
+        self.snapshot = None
+
+    def __repr__(self):
+        return f"WatchRoot({self.name!r}, {self.path!r})"
+
+
+class WatchRoots:
+    """
+    按路径找到所属的监听目录（从文件所在目录逐级往上查字典，和目录数量无关）
+    目录不能嵌套在另一个包括子目录的监听目录里，否则同一个文件会属于两个目录
+    """
+
+    def __init__(self, roots, workers=DEFAULT_WORKERS):
+        self.workers = max(1, workers)
+        self.roots = {}
+        for root in roots:
+            if root.path in self.roots:
+                raise ValueError(f"监听目录重复: {root.name} 和 {self.roots[root.path].name} 都是 {root.path}")
+            self.roots[root.path] = root
+        for root in self.roots.values():
+            parent = self._find_dir(os.path.dirname(root.path))
+            if parent is not None and parent.recursive:
+                raise ValueError(f"监听目录 {root.name} ({root.path}) 在 {parent.name} ({parent.path}) 里面")
+
+    def __iter__(self):
+        return iter(self.roots.values())
+
+    def __len__(self):
+        return len(self.roots)
+
+    def _find_dir(self, directory):
+        """directory 本身或者它的上级目录中的监听目录"""
+        while True:
+            root = self.roots.get(directory)
+            if root is not None:
+                return root
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None
+            directory = parent
+
+    def find(self, path):
+        """文件或目录所属的监听目录，不属于任何目录（或者在不包括子目录的目录的子目录里）时返回 None"""
+        root = self.roots.get(path) or self._find_dir(os.path.dirname(path))
+        if root is None:
+            return None
+        if not root.recursive and path != root.path and os.path.dirname(path) != root.path:
+            return None
+        return root
+
+    def accept(self, path):
+        """流水线的过滤阶段：不属于任何监听目录的文件（合并监听上级目录时的其他子目录）不处理"""
+        return default_accept(path) and self.find(path) is not None
+
+    def classify(self, path):
+        """流水线的分类阶段：按所属目录的 kinds 过滤"""
+        kind = default_classify(path)
+        root = self.find(path)
+        if kind is None or root is None or kind not in root.kinds:
+            return None
+        return kind
+
+    def source(self, path):
+        """打印队列的来源（WatchPipeline 的 source 参数）"""
+        root = self.find(path)
+        return root.path if root else None
+
+    def weight(self, source):
+        root = self.roots.get(source)
+        return root.weight if root else 1
+
+    def watch_points(self):
+        """
+        原生 Observer 的监听点 [(路径, 是否包括子目录), ...]
+        同一个上级目录下的多个监听目录合并成监听上级目录（Windows 上每个监听点一个线程），事件再按路径分给各目录
+        合并后上级目录里的其他子目录也会产生事件，所以只在 _can_merge 允许时合并，否则每个目录单独监听
+        """
+        groups = {}
+        for root in self:
+            if not root.poll:
+                groups.setdefault(os.path.dirname(root.path), []).append(root)
+        points = {}
+        for parent, roots in groups.items():
+            if self._can_merge(parent, roots):
+                points[parent] = True
+            else:
+                for root in roots:
+                    points[root.path] = root.recursive
+        # 已经被上级监听点覆盖的不再单独监听
+        result = []
+        for path in sorted(points, key=len):
+            if not any(points[p] and path.startswith(p.rstrip("\\/") + os.sep) for p, _ in result):
+                result.append((path, points[path]))
+        return result
+
+    def _can_merge(self, parent, roots):
+        """
+        同一个上级目录下的几个监听目录能否合并成递归监听上级目录：
+            - 至少两个目录，而且都包括子目录（不包括子目录的目录合并后会收到整棵子树的事件）
+            - 上级目录不是盘符或共享的根目录（否则会递归监听整个 D:\\）
+            - 上级目录本身不是监听目录（它的规则和监听方式另算）
+        """
+        if len(roots) < 2 or not all(root.recursive for root in roots):
+            return False
+        if os.path.dirname(parent) == parent:
+            return False
+        return parent not in self.roots
+
+    def open_snapshots(self, db_path):
+        roots = list(self)
+        snapshots = open_snapshots([root.path for root in roots], db_path, [root.recursive for root in roots])
+        for root, snapshot in zip(roots, snapshots):
+            root.snapshot = snapshot
+
+    def record(self, path):
+        """文件处理完后记入所属目录的快照（WatchPipeline 的 on_done 参数）"""
+        root = self.find(path)
+        if root is not None and root.snapshot is not None:
+            root.snapshot.record(path)
+
+    def close(self):
+        # 第一个快照持有共用的数据库连接，最后关闭
+        for root in reversed(list(self)):
+            if root.snapshot is not None:
+                root.snapshot.close()
+
+
+def watch_roots_from_config(config, default_poll=False):
+    """
+    读取 config.ini 里的 [watch:名称]，没有配置时返回 None
+        path = 目录（必填）
+        kinds = pdf, excel        printer = 打印机名称片段（为空时用默认打印机）
+        recursive = true          poll = false          weight = 1
+    [watch] 里的 workers 是共用的打印线程数
+    """
+    roots = []
+    for section in config.sections():
+        if not section.startswith(SECTION_PREFIX):
+            continue
+        options = config[section]
+        kinds = [k.strip().lower() for k in options.get("kinds", ",".join(DEFAULT_KINDS)).split(",") if k.strip()]
+        unknown = set(kinds) - set(DEFAULT_KINDS)
+        if unknown:
+            raise ValueError(f"[{section}] kinds 只能是 pdf / excel: {', '.join(sorted(unknown))}")
+        roots.append(WatchRoot(
+            name=section[len(SECTION_PREFIX):].strip(),
+            path=options["path"],
+            kinds=kinds,
+            recursive=options.getboolean("recursive", fallback=True),
+            poll=options.getboolean("poll", fallback=default_poll),
+            printer=options.get("printer", "").strip(),
+            weight=options.getint("weight", fallback=1),
+        ))
+    if not roots:
+        return None
+    workers = config.getint("watch", "workers", fallback=DEFAULT_WORKERS)
+    return WatchRoots(roots, workers=workers)
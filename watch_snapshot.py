@@ -0,0 +1,274 @@
+"""
+监听目录的快照索引：记录已经处理过的文件 (路径, 大小, 修改时间, inode)，保存在 SQLite 里
+监听程序启动时先和实际目录树比对一次，只把停机期间新放进来的文件交给流水线，之后随事件增量更新
+"""
+import os
+import sqlite3
+import threading
+import time
+
+# 修改时间比扫描时刻早这么多的目录才记录（FAT 的时间精度是 2 秒）
+DIR_MTIME_MARGIN_NS = 2_000_000_000
+
+
+class SnapshotIndex:
+    """
+    一个监听目录（包括子目录）的快照，多个目录可以共用一个数据库文件
+    整张快照启动时读进内存，比对和查询都是字典操作；每次变化都写回数据库
+    db_path 为 None 时只保存在内存里；监听很多目录时用 open_snapshots 共用一个连接
+    """
+
+    def __init__(self, root, db_path=None, conn=None, lock=None, recursive=True):
+        self.root = os.path.abspath(root)
+        # False 时只看目录本身，不进入子目录
+        self.recursive = recursive
+        # 共用连接时也共用锁，事务不会交叉
+        self._lock = lock or threading.Lock()
+        self._entries = {}
+        self._dirs = {}
+        self._owns_conn = conn is None
+        self.conn = conn
+        # 这个目录是否已经建立过快照；没有时第一次比对只建立快照，不打印已有的文件
+        self.initialized = False
+        self.last_catch_up = None
+        if db_path and self.conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            # FULL：记录丢了会在下次启动时重复打印
+            self.conn.execute("PRAGMA synchronous=FULL")
+        if self.conn is not None:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot ("
+                " root TEXT NOT NULL,"
+                " path TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " inode INTEGER NOT NULL,"
+                " PRIMARY KEY (root, path))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS dirs ("
+                " root TEXT NOT NULL,"
+                " path TEXT NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " PRIMARY KEY (root, path))"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS roots (root TEXT PRIMARY KEY, scanned REAL NOT NULL)")
+            self.initialized = self.conn.execute(
+                "SELECT 1 FROM roots WHERE root = ?", (self.root,)).fetchone() is not None
+            rows = self.conn.execute("SELECT path, size, mtime_ns, inode FROM snapshot WHERE root = ?", (self.root,))
+            self._entries = {path: (size, mtime_ns, inode) for path, size, mtime_ns, inode in rows}
+            self._dirs = dict(self.conn.execute("SELECT path, mtime_ns FROM dirs WHERE root = ?", (self.root,)))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def known(self, path):
+        return path in self._entries
+
+    def scan(self):
+        """
+        遍历整个目录树（os.scandir，不跟随符号链接），返回 ({文件: (大小, 修改时间, inode)}, {目录: 修改时间})
+            - 目录的修改时间和上次一样时，目录里没有增删改名，文件直接沿用快照里的状态，不再逐个 stat
+              （修改时间太新的目录不记录，避免同一个时间刻度里的变化被漏掉）
+            - Windows 上 DirEntry.inode() 要多一次系统调用，大小和修改时间都没变的文件沿用快照里的 inode
+        """
+        live = {}
+        dirs = {}
+        known = self._entries
+        known_dirs = self._dirs
+        trusted_before = time.time_ns() - DIR_MTIME_MARGIN_NS
+        try:
+            stack = [(self.root, os.stat(self.root).st_mtime_ns)]
+        except OSError:
+            return live, dirs
+        while stack:
+            directory, dir_mtime = stack.pop()
+            unchanged = known_dirs.get(directory) == dir_mtime
+            if dir_mtime < trusted_before:
+                dirs[directory] = dir_mtime
+            try:
+                it = os.scandir(directory)
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive:
+                                stack.append((entry.path, entry.stat(follow_symlinks=False).st_mtime_ns))
+                            continue
+                        if unchanged:
+                            state = known.get(entry.path)
+                            if state is not None:
+                                live[entry.path] = state
+                                continue
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                        old = known.get(entry.path)
+                        if old is not None and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                            inode = old[2]
+                        else:
+                            inode = entry.inode()
+                    except OSError:
+                        # 遍历过程中被删除的文件
+                        continue
+                    live[entry.path] = (st.st_size, st.st_mtime_ns, inode)
+        return live, dirs
+
+    def catch_up(self):
+        """
+        启动时调用：比对快照和实际目录，返回需要打印的新文件（按路径排序）
+            - 快照里没有的路径，或者同名但 inode 不同（删掉后重新放了一个）的文件算新文件，打印完再记入快照
+            - 停机期间改名 / 移动的文件（旧路径消失，新路径的 inode、大小、修改时间都相同）只更新快照
+            - 原地修改过的文件（inode 相同）只更新快照；已经不存在的文件从快照里删除
+            - 第一次监听这个目录时只建立快照，不打印已有的文件（和原来只处理启动后新建的文件一致）
+        """
+        start = time.perf_counter()
+        live, dirs = self.scan()
+        new = []
+        updates = {}
+        moved = 0
+        with self._lock:
+            known = self._entries
+            # 比对期间刚记入快照的文件不在 live 里，但还存在，不能删掉
+            removed = [path for path in known if path not in live and not os.path.lexists(path)]
+            if not self.initialized:
+                updates = live
+            else:
+                vanished = {}
+                for path in removed:
+                    size, mtime_ns, inode = known[path]
+                    if inode:
+                        vanished[(inode, size, mtime_ns)] = path
+                for path, state in live.items():
+                    old = known.get(path)
+                    if old == state:
+                        continue
+                    if old is None:
+                        if state[2] and (state[2], state[0], state[1]) in vanished:
+                            updates[path] = state
+                            moved += 1
+                        else:
+                            new.append(path)
+                    elif old[2] == state[2]:
+                        updates[path] = state
+                    else:
+                        new.append(path)
+
+            for path in removed:
+                del known[path]
+            known.update(updates)
+            self._dirs = dirs
+            self._write_many(updates, removed, dirs)
+
+        new.sort()
+        self.last_catch_up = {
+            "files": len(live),
+            "new": len(new),
+            "moved": moved,
+            "updated": len(updates) - moved,
+            "removed": len(removed) - moved,
+            "baseline": not self.initialized,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        self.initialized = True
+        return new
+
+    def _write_many(self, updates, removed, dirs):
+        self._transaction([
+            ("DELETE FROM dirs WHERE root = ?", [(self.root,)]),
+            ("INSERT INTO dirs (root, path, mtime_ns) VALUES (?, ?, ?)",
+             [(self.root, path, mtime_ns) for path, mtime_ns in dirs.items()]),
+            ("DELETE FROM snapshot WHERE root = ? AND path = ?", [(self.root, path) for path in removed]),
+            ("INSERT OR REPLACE INTO snapshot (root, path, size, mtime_ns, inode) VALUES (?, ?, ?, ?, ?)",
+             [(self.root, path) + state for path, state in updates.items()]),
+            ("INSERT OR REPLACE INTO roots (root, scanned) VALUES (?, ?)", [(self.root, time.time())]),
+        ])
+
+    def _transaction(self, statements):
+        """[(SQL, 参数列表), ...] 在一个事务里执行，只 fsync 一次"""
+        if self.conn is None:
+            return
+        self.conn.execute("BEGIN")
+        try:
+            for sql, rows in statements:
+                self.conn.executemany(sql, rows)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def record(self, path):
+        """文件处理完（已打印或不需要打印）后记入快照"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.discard(path)
+            return
+        state = (st.st_size, st.st_mtime_ns, st.st_ino)
+        with self._lock:
+            self._entries[path] = state
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO snapshot (root, path, size, mtime_ns, inode) VALUES (?, ?, ?, ?, ?)",
+                    (self.root, path) + state,
+                )
+
+    def discard(self, path, directory=False):
+        """文件（directory=True 时是整个目录）被删除"""
+        with self._lock:
+            paths = self._under(path) if directory else [path] if path in self._entries else []
+            for p in paths:
+                del self._entries[p]
+            if paths:
+                self._transaction([("DELETE FROM snapshot WHERE root = ? AND path = ?",
+                                    [(self.root, p) for p in paths])])
+
+    def move(self, src, dest, directory=False):
+        """文件或目录改名 / 移动，返回快照里是否有旧路径（没有说明文件还没处理过）"""
+        with self._lock:
+            paths = self._under(src) if directory else [src] if src in self._entries else []
+            if not paths:
+                return False
+            moves = [(p, dest + p[len(src):]) for p in paths]
+            for old, new in moves:
+                self._entries[new] = self._entries.pop(old)
+            self._transaction([("UPDATE OR REPLACE snapshot SET path = ? WHERE root = ? AND path = ?",
+                                [(new, self.root, old) for old, new in moves])])
+            return True
+
+    def _under(self, directory):
+        prefix = directory.rstrip("\\/") + os.sep
+        return [p for p in self._entries if p.startswith(prefix)]
+
+    def close(self):
+        if self.conn is not None and self._owns_conn:
+            self.conn.close()
+        self.conn = None
+
+
+def open_snapshots(roots, db_path=None, recursive=None):
+    """
+    多个监听目录的快照共用一个数据库连接和锁，目录再多也只打开一个数据库文件；先关闭其他的，最后关闭第一个
+    recursive 是和 roots 一一对应的列表，None 表示都包括子目录
+    """
+    snapshots = []
+    for i, root in enumerate(roots):
+        options = {"recursive": recursive[i] if recursive is not None else True}
+        if not snapshots:
+            snapshots.append(SnapshotIndex(root, db_path, **options))
+        else:
+            first = snapshots[0]
+            snapshots.append(SnapshotIndex(root, conn=first.conn, lock=first._lock, **options))
+    return snapshots
+
+
+def format_catch_up(stats, root):
+    """把 catch_up() 的统计（SnapshotIndex.last_catch_up）整理成一行提示"""
+    if stats["baseline"]:
+        return f"📸 第一次监听 {root}，已记录 {stats['files']} 个现有文件（不打印），用时 {stats['seconds']} 秒"
+    return (f"📸 启动比对 {root}: {stats['files']} 个文件, 新文件 {stats['new']} 个, 移动 {stats['moved']} 个, "
+            f"修改 {stats['updated']} 个, 删除 {stats['removed']} 个, 用时 {stats['seconds']} 秒")